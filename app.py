@@ -5,7 +5,8 @@ import uuid
 import logging
 import time
 from datetime import datetime, timezone
-from functools import wraps
+from functools import wraps, lru_cache
+from contextlib import contextmanager
 import secrets
 import flask
 from flask import (
@@ -17,30 +18,56 @@ from flask import (
     make_response,
     flash,
     jsonify,
+    send_file,
 )
 import stb
+import requests
 import waitress
 from werkzeug.utils import secure_filename
-from collections import OrderedDict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 import threading
+import queue
+import hashlib
+import sqlite3
+import re
+import io
+from urllib.parse import quote, urlparse, parse_qsl
+import sys
+import tempfile
+import atexit
+import signal
+try:
+    from PIL import Image # Optional, the image proxy only resizes thumbnails when Pillow is installed
+except ImportError:
+    Image = None
+try:
+    import orjson # Optional, faster JSON encoding and decoding
+except ImportError:
+    orjson = None
+
+
+# Item fields holding image URLs
+IMAGE_FIELDS = (
+    "screenshot_uri", "poster_path", "cover_big", "logo",
+    "cover", "poster", "backdrop_path", "icon", "image"
+)
 
+# Bumped when fix_screenshot_urls changes, so stored catalogs are normalized again
+IMAGE_URL_VERSION = 1
 
-def fix_screenshot_urls(items, portal_url):
+@lru_cache(maxsize=256)
+def get_image_base_url(portal_url):
     """
-    Fix screenshot URLs by replacing relative paths with absolute paths.
+    Derives the base URL relative image paths of a portal are resolved against.
 
     Args:
-        items (list): List of items with screenshot_uri, poster_path, etc.
-        portal_url (str): Portal URL to use for creating absolute URLs.
+        portal_url (str): Portal URL.
 
     Returns:
-        list: List of items with fixed screenshot URLs.
+        str: Base URL without trailing slash.
     """
-    if not items:
-        return items
-
-    # Extract base URL from portal URL
     # First remove any query parameters
     base_url = portal_url.split('?')[0] if '?' in portal_url else portal_url
 
@@ -59,34 +86,50 @@ def fix_screenshot_urls(items, portal_url):
         base_url = base_url.split('/load.php')[0]
 
     # Remove trailing slashes
-    base_url = base_url.rstrip('/')
+    return base_url.rstrip('/')
 
-    # Debug log the base URL
-    logger.debug(f"Base URL for fixing screenshot URLs: {base_url}")
+def fix_screenshot_urls(items, portal_url, previous_base_url=None):
+    """
+    Fix screenshot URLs by replacing relative paths with absolute paths.
 
-    image_fields = [
-        "screenshot_uri", "poster_path", "cover_big", "logo",
-        "cover", "poster", "backdrop_path", "icon", "image"
-    ]
+    Items are changed in place. Content stored in the catalog is already fixed
+    when it is written, so this is only needed for content that isn't.
+
+    Args:
+        items (list): List of items with screenshot_uri, poster_path, etc.
+        portal_url (str): Portal URL to use for creating absolute URLs.
+        previous_base_url (str, optional): Image base URL of the portal's old address.
+            Absolute URLs under it are moved to the current base URL.
+
+    Returns:
+        list: List of items with fixed screenshot URLs.
+    """
+    if not items:
+        return items
+
+    base_url = get_image_base_url(portal_url)
+    if previous_base_url == base_url:
+        previous_base_url = None
 
     for item in items:
         if not isinstance(item, dict):
             continue
 
         # Process all image fields
-        for field in image_fields:
-            if field in item and item[field] and isinstance(item[field], str):
-                image_url = item[field].strip()
-                if image_url and not image_url.startswith(('http://', 'https://')):
+        for field in IMAGE_FIELDS:
+            image_url = item.get(field)
+            if image_url and isinstance(image_url, str):
+                image_url = image_url.strip()
+                if previous_base_url and image_url.startswith(previous_base_url + '/'):
+                    # Made absolute against the portal's old address
+                    item[field] = base_url + image_url[len(previous_base_url):]
+                elif image_url and not image_url.startswith(('http://', 'https://')):
                     # Handle relative paths
                     if image_url.startswith('/'):
                         item[field] = base_url + image_url
                     else:
                         item[field] = base_url + '/' + image_url
 
-                    # Debug log the fixed URL
-                    logger.debug(f"Fixed {field} URL: {item[field]}")
-
     return items
 
 # region Caching and Rate Limiting Classes
@@ -402,6 +445,11 @@ defaultSettings = {
     "hdhr name": "STB-Proxy",
     "hdhr id": str(uuid.uuid4().hex),
     "hdhr tuners": "1",
+    "image cache size mb": "500",
+    "vod proxy": "false",
+    "warm next episode": "false",
+    "vod cache": "false",
+    "vod cache size gb": "50",
 }
 
 # Default portal settings dictionary. Used when creating a new portal or when a portal setting is missing.
@@ -422,6 +470,10 @@ defaultPortal = {
     "enabled series": [],
     "custom vod names": {},
     "custom series names": {},
+    "requests per second": "10",
+    "request burst": "20",
+    "max concurrent requests": "8",
+    "mirror urls": [],
 }
 
 # Add after the imports at the top
@@ -515,6 +567,182 @@ ffprobe_path = get_ffprobe_path()  # Get ffprobe path once at startup
 
 #endregion
 
+# region Serialization
+
+def dumps_compact(data):
+    """
+    Encodes data as compact JSON text (no indentation or spaces).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data).decode("utf-8")
+        except TypeError:
+            pass # Falls back for what orjson refuses, like non-string keys
+    return json.dumps(data, separators=(",", ":"))
+
+def loads_json(text):
+    """
+    Decodes JSON text or bytes.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+#endregion
+
+# region Persistence
+
+WRITE_BEHIND_DELAY = 1.0 # Seconds a deferred write waits for further changes to the same file
+WRITE_BEHIND_MAX_DELAY = 5.0 # A file changed continuously is still written at least this often
+
+def write_atomic(file_path, data):
+    """
+    Writes a file so that it is either fully replaced or left untouched: the data goes
+    to a temporary file in the same directory, is fsynced, then renamed over the target.
+
+    Args:
+        file_path (str): Path of the file to write.
+        data (str or bytes): File contents.
+    """
+    directory = os.path.dirname(file_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno()) # Data on disk before the rename makes it visible
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself; directories cannot be opened on Windows
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    except OSError:
+        pass
+
+class WriteBehind:
+    """
+    Deferred, coalescing file writer. A write is held for WRITE_BEHIND_DELAY seconds and
+    replaced by any newer write to the same file in the meantime, so bursts of changes
+    (alerts, MAC rotation) cost one disk write. Pending data is served by read() so
+    readers never see a stale file, and everything is flushed on shutdown.
+    """
+
+    def __init__(self, delay=WRITE_BEHIND_DELAY, max_delay=WRITE_BEHIND_MAX_DELAY):
+        self.delay = delay
+        self.max_delay = max_delay
+        self.pending = {} # {path: [data, due, deadline]}
+        self.writing = {} # {path: data} taken from pending but not yet on disk
+        self.condition = threading.Condition()
+        self.io_lock = threading.Lock() # Keeps writes of the same file in order
+        self.thread = None
+        self.writes = 0
+        self.coalesced = 0
+
+    def write(self, file_path, data):
+        """
+        Schedules data to be written to a file.
+
+        Args:
+            file_path (str): Path of the file to write.
+            data (str or bytes): File contents, already encoded.
+        """
+        with self.condition:
+            now = time.monotonic()
+            entry = self.pending.get(file_path)
+            if entry:
+                entry[0] = data
+                entry[1] = min(now + self.delay, entry[2])
+                self.coalesced += 1
+            else:
+                self.pending[file_path] = [data, now + self.delay, now + self.max_delay]
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="write-behind")
+                self.thread.start()
+            self.condition.notify()
+
+    def read(self, file_path):
+        """
+        Returns:
+            str or bytes: Data waiting to be written to the file, or None.
+        """
+        with self.condition:
+            entry = self.pending.get(file_path)
+            if entry:
+                return entry[0]
+            return self.writing.get(file_path)
+
+    def flush(self, file_path=None):
+        """
+        Writes pending data now, for one file or all of them.
+        """
+        with self.io_lock:
+            with self.condition:
+                if file_path is None:
+                    batch = list(self.pending)
+                else:
+                    batch = [file_path] if file_path in self.pending else []
+                batch = self._take(batch)
+            self._write(batch)
+
+    def stats(self):
+        with self.condition:
+            return {"pending": len(self.pending), "writes": self.writes, "coalesced": self.coalesced}
+
+    def _take(self, paths):
+        batch = []
+        for path in paths:
+            data = self.pending.pop(path)[0]
+            self.writing[path] = data
+            batch.append((path, data))
+        return batch
+
+    def _write(self, batch):
+        for path, data in batch:
+            try:
+                write_atomic(path, data)
+                self.writes += 1
+            except Exception as e:
+                logger.error(f"Error writing {path}: {e}")
+            finally:
+                with self.condition:
+                    if self.writing.get(path) is data:
+                        del self.writing[path]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                now = time.monotonic()
+                wait = min(entry[1] for entry in self.pending.values()) - now
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+            with self.io_lock:
+                with self.condition:
+                    now = time.monotonic()
+                    batch = self._take([path for path, entry in self.pending.items() if entry[1] <= now])
+                self._write(batch)
+
+write_behind = WriteBehind()
+atexit.register(write_behind.flush) # Pending writes survive a normal shutdown
+
+#endregion
+
 # region Alert Management Functions
 
 def load_alerts():
@@ -524,6 +752,10 @@ def load_alerts():
     Returns:
         list: List of alert dictionaries.
     """
+    pending = write_behind.read(alerts_file)
+    if pending is not None:
+        return loads_json(pending) # Newer than the file on disk
+
     try:
         with open(alerts_file) as f:
             return json.load(f)
@@ -535,21 +767,20 @@ def load_alerts():
             logger.info(f"Created directory: {directory}")
 
         # Create empty alerts file
-        with open(alerts_file, "w") as f:
-            json.dump([], f)
-            logger.info(f"Created empty alerts file: {alerts_file}")
+        write_atomic(alerts_file, "[]")
+        logger.info(f"Created empty alerts file: {alerts_file}")
 
         return [] # Return empty list
 
 def save_alerts(alerts):
     """
-    Saves alerts to alerts.json file.
+    Saves alerts to alerts.json file. The write is deferred so that bursts of
+    alerts are written once.
 
     Args:
         alerts (list): List of alert dictionaries to save.
     """
-    with open(alerts_file, "w") as f:
-        json.dump(alerts, f, indent=4) # Save with indentation for readability
+    write_behind.write(alerts_file, dumps_compact(alerts))
 
 def add_alert(alert_type, source, message, status="active"):
     """
@@ -581,14 +812,16 @@ def add_alert(alert_type, source, message, status="active"):
 
 # region Configuration File Management Functions
 
-def save_json(file_path, data, message):
+def save_json(file_path, data, message, defer=False):
     """
-    Saves data to a JSON file and prints a message to the console.
+    Saves data to a JSON file atomically and prints a message to the console.
 
     Args:
         file_path (str): Path to the JSON file.
         data (dict or list): Data to be saved as JSON.
         message (str): Message to print to the console after saving.
+        defer (bool, optional): Hand the write to the write-behind queue instead of
+            blocking on disk. Only for files whose readers check write_behind.read().
     """
     # Create directory if it doesn't exist
     directory = os.path.dirname(file_path)
@@ -596,9 +829,12 @@ def save_json(file_path, data, message):
         os.makedirs(directory)
         logger.info(f"Created directory: {directory}")
 
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4) # Save with indentation for readability
-        print(message)
+    text = dumps_compact(data) # Compact, portal channel lists are large
+    if defer:
+        write_behind.write(file_path, text)
+    else:
+        write_atomic(file_path, text)
+    print(message)
 
 def ensure_cache_directory(portal_id, portal_name):
     """
@@ -704,8 +940,43 @@ def loadConfig():
 
     global config # Update the global config variable
     config = data
+    configurePortalNetwork(portalsOut) # Apply request budgets and mirrors for each portal
     return data
 
+# Portal URLs mirrors were last registered for: {portal ID: URL}
+portal_network_urls = {}
+
+def configurePortalNetwork(portals):
+    """
+    Applies each portal's request budget to its stb scheduler and registers its mirror URLs.
+    Mirrors of portals that were removed or whose URL changed are forgotten.
+
+    Args:
+        portals (dict): Dictionary of portal configurations.
+    """
+    current_urls = {portal.get("url") for portal in portals.values()}
+    for portal_id, old_url in list(portal_network_urls.items()):
+        if portals.get(portal_id, {}).get("url") != old_url:
+            del portal_network_urls[portal_id]
+            if old_url not in current_urls: # Another portal may still use the URL
+                stb.unregisterMirrors(old_url)
+
+    for portal_id, portal in portals.items():
+        url = portal.get("url")
+        if not url:
+            continue
+        try:
+            stb.configureScheduler(
+                url,
+                rate=float(portal.get("requests per second", defaultPortal["requests per second"])),
+                burst=int(portal.get("request burst", defaultPortal["request burst"])),
+                max_in_flight=int(portal.get("max concurrent requests", defaultPortal["max concurrent requests"])),
+            )
+        except (TypeError, ValueError) as e:
+            logger.error(f"Invalid request budget for portal {portal.get('name', portal_id)}: {e}")
+        stb.registerMirrors(url, portal.get("mirror urls", []))
+        portal_network_urls[portal_id] = url
+
 def getPortals():
     """
     Returns the portals configuration from the global config.
@@ -723,7 +994,8 @@ def savePortals(portals):
         portals (dict): Dictionary of portal configurations to save.
     """
     config["portals"] = portals # Update global config
-    save_json(configFile, config, "Portals saved") # Save to file
+    save_json(configFile, config, "Portals saved", defer=True) # Save to file, config is only read at startup
+    configurePortalNetwork(portals) # Portal URLs, budgets or mirrors may have changed
 
 def getSettings():
     """
@@ -742,7 +1014,7 @@ def saveSettings(settings):
         settings (dict): Dictionary of settings to save.
     """
     config["settings"] = settings # Update global config
-    save_json(configFile, config, "Settings saved") # Save to file
+    save_json(configFile, config, "Settings saved", defer=True) # Save to file
 
 #endregion
 
@@ -755,9 +1027,15 @@ def getChannelGroups():
     Returns:
         dict: Dictionary of channel groups.
     """
+    groups_path = os.path.join(basePath, "channel_groups.json")
     try:
-        with open(os.path.join(basePath, "channel_groups.json")) as f:
+        pending = write_behind.read(groups_path)
+        if pending is not None:
+            return loads_json(pending) # Already converted and named when it was saved
+
+        with open(groups_path) as f:
             groups = json.load(f)
+            changed = False
 
             # Convert old format to new format if needed
             if groups and isinstance(next(iter(groups.values())), list):
@@ -769,7 +1047,7 @@ def getChannelGroups():
                         "order": len(new_groups) + 1
                     }
                 groups = new_groups
-                saveChannelGroups(groups) # Save in new format
+                changed = True
 
             # Add channel names to existing channels if missing
             portals = getPortals()
@@ -777,6 +1055,7 @@ def getChannelGroups():
                 if "channels" in group_data:
                     for channel in group_data["channels"]:
                         if isinstance(channel, dict) and "channelName" not in channel:
+                            changed = True
                             portal_id = channel.get("portalId")
                             if portal_id in portals:
                                 portal = portals[portal_id]
@@ -789,7 +1068,8 @@ def getChannelGroups():
                                 except Exception:
                                     channel["channelName"] = "Unknown Channel"
 
-            saveChannelGroups(groups) # Save with updated channel names
+            if changed:
+                saveChannelGroups(groups) # Save in new format or with updated channel names
     except FileNotFoundError:
         # Create default group if file doesn't exist
         groups = {
@@ -810,8 +1090,50 @@ def saveChannelGroups(channel_groups):
     Args:
         channel_groups (dict): Dictionary of channel groups to save.
     """
-    with open(os.path.join(basePath, "channel_groups.json"), "w") as f:
-        json.dump(channel_groups, f, indent=4) # Save with indentation for readability
+    write_behind.write(os.path.join(basePath, "channel_groups.json"), dumps_compact(channel_groups))
+
+# Channel logos per portal, reloaded when the portal's channel file changes: {portal ID: (mtime, {channel ID: logo URL})}
+channel_logos = {}
+
+def getChannelLogos(portal_id):
+    """
+    Gets the logo URLs of a portal's channels from its saved channel list.
+
+    Args:
+        portal_id (str): ID of the portal.
+
+    Returns:
+        dict: Channel ID -> absolute logo URL.
+    """
+    portal = getPortals().get(portal_id)
+    if not portal:
+        return {}
+    channels_path = os.path.join(parent_folder, f"{portal.get('name')}.json")
+    try:
+        mtime = os.path.getmtime(channels_path)
+    except OSError:
+        return {}
+    cached = channel_logos.get(portal_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    logos = {}
+    base_url = get_image_base_url(portal.get("url", ""))
+    try:
+        with open(channels_path) as f:
+            channels = json.load(f)
+        for channel in channels if isinstance(channels, list) else []:
+            logo = channel.get("logo") if isinstance(channel, dict) else None
+            if not logo or not isinstance(logo, str):
+                continue
+            if not logo.startswith(("http://", "https://")):
+                # Portals give bare file names for logos stored under misc/logos
+                logo = base_url + (logo if logo.startswith("/") else "/stalker_portal/misc/logos/320/" + logo)
+            logos[str(channel.get("id"))] = logo
+    except Exception as e:
+        logger.error(f"Error loading channel logos for portal {portal_id}: {e}")
+    channel_logos[portal_id] = (mtime, logos)
+    return logos
 
 #endregion
 
@@ -839,6 +1161,24 @@ def authorise(f):
         return make_response("Could not verify your login!", 401, {"WWW-Authenticate": 'Basic realm="Login Required"'}) # Authentication failed, return 401
     return decorated
 
+def requestPriority(priority):
+    """
+    Decorator that runs a route's stb.* calls with the given scheduler priority.
+
+    Args:
+        priority (int): One of the stb.PRIORITY_* constants.
+
+    Returns:
+        function: Decorator for route handlers.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            with stb.requestPriority(priority):
+                return f(*args, **kwargs)
+        return decorated
+    return decorator
+
 #endregion
 
 # region Utility Functions
@@ -861,6 +1201,186 @@ def moveMac(portalId, mac):
         add_alert("error", f"Portal {portalId}", f"Error moving MAC {mac}: {str(e)}")
         raise # Re-raise the exception after logging the alert
 
+def getPortalProxy(portal, mac=None, background=False):
+    """
+    Picks a proxy from a portal's proxy pool. The "proxy" setting may hold several
+    comma-separated proxies; see stb.selectProxy() for how one is chosen.
+
+    Args:
+        portal (dict): Portal configuration.
+        mac (str, optional): MAC address the request is made for (sticky assignment).
+        background (bool, optional): True for catalog/prefetch traffic, spread across the pool.
+
+    Returns:
+        str: Proxy URL, or None if the portal has no proxy.
+    """
+    return stb.selectProxy(portal.get("proxy", ""), mac, background)
+
+# Concurrent catalog requests allowed per MAC
+CATALOG_REQUESTS_PER_MAC = 2
+# Seconds a MAC that failed to authenticate is left out of catalog work
+MAC_FAILURE_COOLDOWN = 300
+
+class MacPool:
+    """
+    Distributes background catalog work across all MACs of a portal.
+
+    MACs with a live stream are never handed out: catalog sessions re-authenticate
+    their MAC, which would invalidate the token the stream plays with. Each MAC
+    runs at most CATALOG_REQUESTS_PER_MAC catalog requests at a time, and the least
+    busy MAC is picked first.
+    """
+    def __init__(self, per_mac=CATALOG_REQUESTS_PER_MAC):
+        self.per_mac = per_mac
+        self.in_use = {} # {(portal_id, mac): catalog requests running}
+        self.failed_until = {} # {(portal_id, mac): time the MAC may be used again}
+        self.condition = threading.Condition()
+
+    def _candidates(self, portal_id, portal):
+        """
+        Returns the MACs that may take catalog work now, least busy first. Caller must hold the condition.
+        """
+        streaming = {entry["mac"] for entry in occupied.get(portal_id, [])}
+
+        now = time.time()
+        candidates = []
+        for mac in portal.get("macs", {}):
+            key = (portal_id, mac)
+            if self.failed_until.get(key, 0) > now:
+                continue # Recently failed to authenticate
+            if mac in streaming:
+                continue # A new session would end its live stream
+            if self.in_use.get(key, 0) >= self.per_mac:
+                continue
+            candidates.append(mac)
+        return sorted(candidates, key=lambda mac: self.in_use.get((portal_id, mac), 0))
+
+    def pick(self, portal_id, portal, avoid=()):
+        """
+        Picks a MAC for a single interactive catalog request without reserving it.
+        Falls back to the first MAC if every MAC is busy, rather than making the user wait.
+
+        Args:
+            portal_id (str): ID of the portal.
+            portal (dict): Portal configuration.
+            avoid (iterable, optional): MACs not to use, e.g. one streaming a VOD item.
+
+        Returns:
+            str: MAC address, or None if the portal has no MACs left.
+        """
+        macs = [mac for mac in portal.get("macs", {}) if mac not in avoid]
+        if not macs:
+            return None
+        with self.condition:
+            candidates = [mac for mac in self._candidates(portal_id, portal) if mac not in avoid]
+        return candidates[0] if candidates else macs[0]
+
+    @contextmanager
+    def acquire(self, portal_id, portal, timeout=None):
+        """
+        Reserves a MAC for one catalog request, waiting until one is available.
+
+        Yields:
+            str: MAC address.
+
+        Raises:
+            TimeoutError: If no MAC became available within the timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        with self.condition:
+            while True:
+                candidates = self._candidates(portal_id, portal)
+                if candidates:
+                    mac = candidates[0]
+                    break
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"No MAC available for catalog work on portal {portal.get('name', portal_id)}")
+                # Live streams ending are not signalled, so re-check periodically
+                self.condition.wait(min(remaining, 5) if remaining is not None else 5)
+            key = (portal_id, mac)
+            self.in_use[key] = self.in_use.get(key, 0) + 1
+        try:
+            yield mac
+        finally:
+            with self.condition:
+                self.in_use[key] -= 1
+                self.condition.notify_all()
+
+    def all_failed(self, portal_id, portal):
+        """
+        Checks whether every MAC of a portal is left out after failing to authenticate.
+        """
+        now = time.time()
+        with self.condition:
+            return all(self.failed_until.get((portal_id, mac), 0) > now for mac in portal.get("macs", {}))
+
+    def mark_failed(self, portal_id, mac):
+        """
+        Leaves a MAC out of catalog work for MAC_FAILURE_COOLDOWN seconds.
+        """
+        with self.condition:
+            self.failed_until[(portal_id, mac)] = time.time() + MAC_FAILURE_COOLDOWN
+        logger.warning(f"MAC {mac} of portal {portal_id} failed, leaving it out of catalog work for {MAC_FAILURE_COOLDOWN}s")
+
+    def stats(self, portal_id, portal):
+        with self.condition:
+            now = time.time()
+            return {mac: {
+                "catalog_requests": self.in_use.get((portal_id, mac), 0),
+                "live_streams": sum(1 for entry in occupied.get(portal_id, []) if entry["mac"] == mac),
+                "cooldown": max(0, round(self.failed_until.get((portal_id, mac), 0) - now)),
+            } for mac in portal.get("macs", {})}
+
+mac_pool = MacPool()
+
+def resolveMirrorUrls(mirrors, url, proxy=None):
+    """
+    Resolves the mirror URLs entered for a portal to load.php endpoints.
+
+    Args:
+        mirrors (str): Comma, space or newline separated mirror URLs.
+        url (str): The portal's primary load.php URL (excluded from the result).
+        proxy (str, optional): Portal proxy pool, used for endpoint discovery.
+
+    Returns:
+        list: Load.php endpoints of the mirrors that could be resolved.
+    """
+    resolved = []
+    for entry in stb.parseProxies(mirrors): # Same separators as the proxy pool
+        mirror = entry if entry.endswith(".php") else stb.getUrl(entry, stb.selectProxy(proxy))
+        if not mirror:
+            logger.error(f"Error getting URL for mirror {entry}")
+            flash(f"Error getting URL for mirror {entry}", "danger") # Skip mirrors that could not be resolved
+            continue
+        if mirror != url and mirror not in resolved:
+            resolved.append(mirror)
+    return resolved
+
+# Seconds between two rounds of mirror probes and connection warm-up
+PORTAL_MONITOR_INTERVAL = 60
+
+def portalMonitor():
+    """
+    Background loop keeping portal connections fast. Measures the latency and availability
+    of every portal's mirrors, so that stb can route requests to the fastest healthy one,
+    and re-opens keep-alive connections (and DNS entries) of portals that went idle.
+    The first round runs at startup.
+    """
+    while True:
+        try:
+            for portal in getPortals().values():
+                if portal.get("enabled") != "true" or not portal.get("url"):
+                    continue
+                proxy = getPortalProxy(portal, background=True)
+                if portal.get("mirror urls"):
+                    stb.probeMirrors(portal["url"], proxy) # Probing also keeps mirror connections warm
+                else:
+                    stb.warmConnections([portal["url"]], proxy)
+        except Exception as e:
+            logger.error(f"Error in portal monitor: {e}")
+        time.sleep(PORTAL_MONITOR_INTERVAL)
+
 #endregion
 
 # region Route Handlers - Web UI
@@ -912,31 +1432,34 @@ def portalsAdd():
     macs = list(set(request.form["macs"].split(","))) # Split MACs from form, remove duplicates
     streamsPerMac = request.form["streams per mac"]
     proxy = request.form["proxy"]
+    mirrors = request.form.get("mirrors", "")
 
     # Ensure URL ends with .php, if not, attempt to retrieve it using stb.getUrl
     if not url.endswith(".php"):
-        url = stb.getUrl(url, proxy)
+        url = stb.getUrl(url, stb.selectProxy(proxy))
         if not url:
             logger.error(f"Error getting URL for Portal({name})")
             flash(f"Error getting URL for Portal({name})", "danger") # Flash error message to UI
             return redirect("/portals", code=302)
+    mirrorUrls = resolveMirrorUrls(mirrors, url, proxy)
 
     macsd = {} # Dictionary to store successful MACs and their expiry dates
     ids = {} # Dictionary to store device IDs and signatures for each MAC
     gotchannels = False # Flag to indicate if channel data has been retrieved
 
     for mac in macs:
-        token = stb.getToken(url, mac, proxy) # Get token for MAC address
+        macProxy = stb.selectProxy(proxy, mac) # Proxy from the pool assigned to this MAC
+        token = stb.getToken(url, mac, macProxy) # Get token for MAC address
         if token:
             device_id = stb.generate_device_id(mac) # Generate device IDs
             device_id2 = device_id
             timestamp = int(time.time())
             signature = stb.generate_signature(mac, token, [str(timestamp)]) # Generate signature
-            profile = stb.getProfile(url, mac, token, device_id, device_id2, signature, timestamp, proxy) # Get profile data
+            profile = stb.getProfile(url, mac, token, device_id, device_id2, signature, timestamp, macProxy) # Get profile data
             print(profile) # Print profile data for debugging
             if 'block_msg' in profile and profile['block_msg']:
                 logger.info(profile['block_msg']) # Log block message if present
-            expiry = stb.getExpires(url, mac, token, proxy) # Get expiry date
+            expiry = stb.getExpires(url, mac, token, macProxy) # Get expiry date
             if 'expire_billing_date' in profile and profile['expire_billing_date'] and not expiry:
                 expiry = profile['expire_billing_date'] # Use profile expiry if available and not expiry from getExpires
             if 'created' in profile and profile['created'] and not expiry:
@@ -951,12 +1474,12 @@ def portalsAdd():
                 }
                 if not gotchannels:
                     # Get all channels and genres
-                    allChannels = stb.getAllChannels(url, mac, token, proxy) # Get all channels for the first successful MAC
-                    allGenre = stb.getGenreNames(url, mac, token, proxy) # Get genre names
+                    allChannels = stb.getAllChannels(url, mac, token, macProxy) # Get all channels for the first successful MAC
+                    allGenre = stb.getGenreNames(url, mac, token, macProxy) # Get genre names
 
                     # Get VOD and Series categories
-                    vodCategories = stb.getVodCategories(url, mac, token, proxy) # Get VOD categories
-                    seriesCategories = stb.getSeriesCategories(url, mac, token, proxy) # Get Series categories
+                    vodCategories = stb.getVodCategories(url, mac, token, macProxy) # Get VOD categories
+                    seriesCategories = stb.getSeriesCategories(url, mac, token, macProxy) # Get Series categories
 
                     # Save all data to files and invalidate cache
                     savePortalData(name, allChannels, allGenre, vodCategories, seriesCategories, portalId=id) # Save channel, genre, VOD, and Series data to files
@@ -977,6 +1500,7 @@ def portalsAdd():
             "ids": ids,
             "streams per mac": streamsPerMac,
             "proxy": proxy,
+            "mirror urls": mirrorUrls,
         }
 
         # Apply default portal settings if any are missing
@@ -1031,7 +1555,7 @@ def refreshPortalToken(portalId):
             timestamp = ids.get("timestamp")
 
             # Get a new token
-            token = stb.getToken(url, mac, proxy)
+            token = stb.getToken(url, mac, stb.selectProxy(proxy, mac))
             if token:
                 # Token refreshed successfully
                 logger.info(f"Token refreshed successfully for MAC {mac} on portal {name}")
@@ -1066,15 +1590,17 @@ def portalUpdate():
     newmacs = list(set(request.form["macs"].split(","))) # Split MACs from form, remove duplicates
     streamsPerMac = request.form["streams per mac"]
     proxy = request.form["proxy"]
+    mirrors = request.form.get("mirrors", "")
     retest = request.form.get("retest", None) # Check if retest was requested
 
     # Ensure URL ends with .php, if not, attempt to retrieve it using stb.getUrl
     if not url.endswith(".php"):
-        url = stb.getUrl(url, proxy)
+        url = stb.getUrl(url, stb.selectProxy(proxy))
         if not url:
             logger.error(f"Error getting URL for Portal({name})")
             flash(f"Error getting URL for Portal({name})", "danger") # Flash error message
             return redirect("/portals", code=302)
+    mirrorUrls = resolveMirrorUrls(mirrors, url, proxy)
 
     portals = getPortals()
     oldmacs = portals[id]["macs"] # Get existing MACs for the portal
@@ -1085,23 +1611,24 @@ def portalUpdate():
 
     for mac in newmacs:
         if retest or mac not in oldmacs.keys(): # Retest MAC if requested or if it's a new MAC
-            token = stb.getToken(url, mac, proxy) # Get token for MAC
+            macProxy = stb.selectProxy(proxy, mac) # Proxy from the pool assigned to this MAC
+            token = stb.getToken(url, mac, macProxy) # Get token for MAC
             if token:
                 ids = portals[id]["ids"][mac] # Get stored device IDs and signature for MAC
-                stb.getProfile(url, mac, token, ids["device_id"], ids["device_id2"], ids["signature"], ids["timestamp"], proxy) # Get profile (primarily to keep session alive)
-                expiry = stb.getExpires(url, mac, token, proxy) # Get expiry date
+                stb.getProfile(url, mac, token, ids["device_id"], ids["device_id2"], ids["signature"], ids["timestamp"], macProxy) # Get profile (primarily to keep session alive)
+                expiry = stb.getExpires(url, mac, token, macProxy) # Get expiry date
                 if expiry:
                     macsout[mac] = expiry # Store MAC and expiry
 
                     # If retest is requested, fetch and save channel, VOD, and Series data
                     if retest and not gotchannels:
                         # Get all channels and genres
-                        allChannels = stb.getAllChannels(url, mac, token, proxy) # Get all channels for the first successful MAC
-                        allGenre = stb.getGenreNames(url, mac, token, proxy) # Get genre names
+                        allChannels = stb.getAllChannels(url, mac, token, macProxy) # Get all channels for the first successful MAC
+                        allGenre = stb.getGenreNames(url, mac, token, macProxy) # Get genre names
 
                         # Get VOD and Series categories
-                        vodCategories = stb.getVodCategories(url, mac, token, proxy) # Get VOD categories
-                        seriesCategories = stb.getSeriesCategories(url, mac, token, proxy) # Get Series categories
+                        vodCategories = stb.getVodCategories(url, mac, token, macProxy) # Get VOD categories
+                        seriesCategories = stb.getSeriesCategories(url, mac, token, macProxy) # Get Series categories
 
                         # Save all data to files
                         savePortalData(name, allChannels, allGenre, vodCategories, seriesCategories) # Save channel, genre, VOD, and Series data to files
@@ -1128,6 +1655,7 @@ def portalUpdate():
             "macs": macsout,
             "streams per mac": streamsPerMac,
             "proxy": proxy,
+            "mirror urls": mirrorUrls,
         })
         savePortals(portals) # Save updated portal config
         logger.info(f"Portal({name}) updated!")
@@ -1532,6 +2060,7 @@ def player_page(portalId, channelId):
                            portal_name=portalName)
 
 @app.route("/play/<portalId>/<channelId>", methods=["GET"])
+@requestPriority(stb.PRIORITY_LIVE)
 def channel(portalId, channelId):
     """
     Handles channel playback requests. Retrieves stream link, manages MAC occupation, performs stream testing,
@@ -1707,7 +2236,7 @@ def channel(portalId, channelId):
     url = portal.get("url")
     macs = list(portal["macs"].keys())
     streamsPerMac = int(portal.get("streams per mac"))
-    proxy = portal.get("proxy")
+    proxy = getPortalProxy(portal)
     web = request.args.get("web") # Check for 'web' parameter for web preview mode
     ip = request.remote_addr # Get client IP address
 
@@ -1794,6 +2323,7 @@ def channel(portalId, channelId):
         if streamsPerMac == 0 or isMacFree(): # Check if MAC is free or streams per mac is unlimited
             logger.info(f"Trying Portal({portalId}):MAC({mac}):Channel({channelId})") # Log MAC attempt
             freeMac = True # Mark free MAC as found
+            proxy = getPortalProxy(portal, mac) # Proxy from the pool assigned to this MAC, also used by ffprobe/ffmpeg
 
             # Check link cache first
             cached_link, cached_ffmpegcmd = link_cache.get(f"{portalId}:{channelId}")
@@ -1927,11 +2457,11 @@ def channel(portalId, channelId):
                     if fallbackPortalId in portals and portals[fallbackPortalId]["enabled"] == "true": # Check if fallback portal is enabled
                         url = portals[fallbackPortalId].get("url")
                         macs = list(portals[fallbackPortalId]["macs"].keys())
-                        proxy = portals[fallbackPortalId].get("proxy")
                         for mac in macs:
                             channels = None
                             cmd = None
                             link = None
+                            proxy = getPortalProxy(portals[fallbackPortalId], mac) # Proxy from the fallback portal's pool
                             if streamsPerMac == 0 or isMacFree(): # Check if MAC is free or streams per mac is unlimited
                                 # Check link cache first for fallback
                                 cached_link, cached_ffmpegcmd = link_cache.get(fallback_key)
@@ -2019,6 +2549,30 @@ def streaming():
     """
     return jsonify(occupied) # Return occupied streams as JSON
 
+@app.route("/api/scheduler", methods=["GET"])
+@authorise
+def scheduler_stats():
+    """
+    Returns request scheduler statistics (budget, load, per-priority counters) for each portal host.
+    """
+    return jsonify(stb.getSchedulerStats())
+
+@app.route("/api/proxies", methods=["GET"])
+@authorise
+def proxy_stats():
+    """
+    Returns health statistics (latency, failures, ejection) for each portal proxy.
+    """
+    return jsonify(stb.getProxyStats())
+
+@app.route("/api/mirrors", methods=["GET"])
+@authorise
+def mirror_stats():
+    """
+    Returns health statistics (latency, failures, ejection) for each portal mirror.
+    """
+    return jsonify(stb.getMirrorStats())
+
 @app.route("/log")
 @authorise
 def log():
@@ -2514,10 +3068,13 @@ def get_group_channels(group_id):
 
     if "channels" in group_data:
         for idx, channel in enumerate(group_data["channels"]):
+            # Logos are served through the image cache instead of hot-linking the portal
+            portal_id = channel.get("portalId")
+            logo = getChannelLogos(portal_id).get(str(channel.get("channelId"))) if portal_id else None
             channel_info = {
                 "id": channel.get("channelId", ""),
                 "name": channel.get("channelName", "Unknown Channel"),
-                "logo": f"/static/logos/{channel.get('channelId')}.png",
+                "logo": imageProxyUrl(portal_id, logo, "small"),
                 "category": channel.get("category", ""),
                 "position": idx
             }
@@ -2615,6 +3172,18 @@ def check_channel_status(url, mac, token, proxy):
         add_alert("error", "Channel Check", f"Error checking channel {url}: {str(e)}") # Placeholder alert
         return False
 
+def portalApiArgs(args):
+    """
+    Maps arguments to the values the portal API expects: the "*" category is "all".
+
+    Args:
+        args (tuple): Positional arguments for an stb function.
+
+    Returns:
+        list: The arguments to send.
+    """
+    return ["all" if arg == "*" else arg for arg in args]
+
 def tryWithTokenRefresh(func, url, mac, token, proxy=None, *args, **kwargs):
     """
     Always refresh the token before executing a function and add a small delay to avoid
@@ -2642,13 +3211,7 @@ def tryWithTokenRefresh(func, url, mac, token, proxy=None, *args, **kwargs):
     signature = None
     timestamp = None
 
-    # Check for "*" in arguments and replace with "all" for API calls
-    modified_args = []
-    for arg in args:
-        if arg == "*":
-            modified_args.append("all")
-        else:
-            modified_args.append(arg)
+    modified_args = portalApiArgs(args)
 
     for portal_id, portal in portals.items():
         if portal.get("url") == url and mac in portal.get("macs", {}):
@@ -2671,9 +3234,7 @@ def tryWithTokenRefresh(func, url, mac, token, proxy=None, *args, **kwargs):
     else:
         logger.warning(f"Token refresh failed, using existing token")
 
-    # Add a small delay to avoid flooding the server with requests
-    import time
-    time.sleep(0.5)  # 500ms delay between requests
+    # Request pacing is handled by the portal's stb scheduler
 
     max_retries = 2
     retry_count = 0
@@ -2788,11 +3349,74 @@ def ensure_cache_directory(portal_id, portal_name):
         # Fall back to a simple path if there's an error
         return os.path.join(basePath, "cache", portal_id)
 
+# Query parameters that switch the category item endpoints to paged responses
+ITEM_PAGE_PARAMS = ("offset", "limit", "sort", "order", "year", "min_rating", "genre", "added_since")
+
+def wantsItemPage():
+    """
+    Checks whether a category items request asked for paging, sorting or filtering.
+    """
+    return any(param in request.args for param in ITEM_PAGE_PARAMS)
+
+def categoryItemsPage(portal, portalId, kind, categoryId):
+    """
+    Builds a paged response for a cached category from the request's query parameters.
+
+    Query parameters:
+        offset (int, optional): Number of items to skip.
+        limit (int, optional): Page size.
+        sort (str, optional): name, year, rating or added.
+        order (str, optional): asc (default) or desc.
+        year (str, optional): Release year, or a range like 1990-1999.
+        min_rating (float, optional): Minimum rating.
+        genre (str, optional): Text the genre must contain.
+        added_since (str, optional): Only items added since this date (YYYY-MM-DD).
+
+    Returns:
+        JSON: {"total", "offset", "limit", "items"}, or an error for invalid parameters.
+    """
+    sort = request.args.get("sort")
+    if sort and sort not in ITEM_SORT_FIELDS:
+        return jsonify({"error": f"Invalid sort field, expected one of: {', '.join(ITEM_SORT_FIELDS)}"}), 400
+
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+    min_rating = request.args.get("min_rating", type=float)
+
+    # Year may be a single year or a range
+    year = None
+    year_param = request.args.get("year", "").strip()
+    if year_param:
+        match = re.fullmatch(r"(\d{4})(?:\s*-\s*(\d{4}))?", year_param)
+        if not match:
+            return jsonify({"error": "Invalid year, expected YYYY or YYYY-YYYY"}), 400
+        year = (int(match.group(1)), int(match.group(2) or match.group(1)))
+
+    total, items = catalog.query_items(
+        portalId, kind, categoryId,
+        sort=sort,
+        descending=request.args.get("order", "asc").lower() == "desc",
+        year=year,
+        min_rating=min_rating,
+        genre=request.args.get("genre", "").strip() or None,
+        added_since=request.args.get("added_since", "").strip() or None,
+        offset=offset,
+        limit=limit,
+    )
+    return jsonify({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "items": items,
+    })
+
 @app.route("/api/portal/<portalId>/vod/category/<categoryId>/items", methods=["GET"])
 @authorise
 def getVodCategoryItems(portalId, categoryId):
     """
-    Returns VOD items for a category. First tries to load from cached JSON file,
+    Returns VOD items for a category. First tries the catalog store,
     then falls back to fetching from the portal API.
 
     Args:
@@ -2809,16 +3433,15 @@ def getVodCategoryItems(portalId, categoryId):
     portal = portals[portalId]
     force_refresh = request.args.get("refresh", "false").lower() == "true"
 
-    # Path to cached VOD items file
-    vod_items_path = get_vod_items_path(portalId, categoryId)
-
     # Try to load from cache unless force refresh is requested
-    if not force_refresh and os.path.exists(vod_items_path):
+    if not force_refresh:
         try:
-            items = load_json_content(vod_items_path)
+            # Paged requests are answered straight from the catalog store
+            if wantsItemPage() and (catalog.has_items(portalId, "vod", categoryId) or catalog.get_items(portalId, "vod", categoryId)):
+                return categoryItemsPage(portal, portalId, "vod", categoryId)
+
+            items = catalog.get_items(portalId, "vod", categoryId)
             if items:
-                # Fix any relative screenshot URLs
-                items = fix_screenshot_urls(items, portal["url"])
                 logger.info(f"Serving VOD items for portal {portalId}, category {categoryId} from cache")
                 return jsonify(items)
         except Exception as e:
@@ -2832,17 +3455,16 @@ def getVodCategoryItems(portalId, categoryId):
         if not macs:
             return jsonify({"error": "No MACs available"}), 400
 
-        mac = macs[0]
+        mac = mac_pool.pick(portalId, portal) # Least busy MAC not needed for live streams
 
         # Get token - portal["macs"][mac] might be a string (expiry date) rather than a dict
         # Always get a fresh token to avoid attribute errors
-        token = stb.getToken(url, mac, portal["proxy"])
+        proxy = getPortalProxy(portal, mac)
+        token = stb.getToken(url, mac, proxy)
         if not token:
             logger.error(f"Failed to obtain token for portal {portalId}, MAC {mac}")
             return jsonify({"error": "Failed to authenticate with portal"}), 500
 
-        proxy = portal["proxy"]
-
         # Try to get items using tryWithTokenRefresh
         items = tryWithTokenRefresh(stb.getOrderedList, url, mac, token, proxy, "vod", categoryId)
 
@@ -2856,12 +3478,11 @@ def getVodCategoryItems(portalId, categoryId):
             logger.warning(f"No VOD items found for category {categoryId}")
             return jsonify([]) # Return empty list
 
-        # Fix any relative screenshot URLs
-        items = fix_screenshot_urls(items, url)
-
-        # Save items to cache file
-        save_content_json(vod_items_path, items)
+        # Save items to the catalog store, which also makes relative image URLs absolute
+        catalog.put_items(portalId, "vod", categoryId, items)
 
+        if wantsItemPage():
+            return categoryItemsPage(portal, portalId, "vod", categoryId)
         return jsonify(items)
     except Exception as e:
         logger.error(f"Error fetching VOD items: {str(e)}")
@@ -2872,7 +3493,7 @@ def getVodCategoryItems(portalId, categoryId):
 @authorise
 def getSeriesCategoryItems(portalId, categoryId):
     """
-    Returns Series items for a category. First tries to load from cached JSON file,
+    Returns Series items for a category. First tries the catalog store,
     then falls back to fetching from the portal API.
 
     Args:
@@ -2888,21 +3509,18 @@ def getSeriesCategoryItems(portalId, categoryId):
 
     portal = portals[portalId]
     url = portal["url"]
-    macs = list(portal["macs"].keys())
-    proxy = portal["proxy"]
     portal_name = portal["name"]
     force_refresh = request.args.get("refresh", "false").lower() == "true"
 
-    # Path to cached Series items file
-    series_items_path = get_series_items_path(portalId, categoryId)
-
     # Try to load from cache unless force refresh is requested
-    if not force_refresh and os.path.exists(series_items_path):
+    if not force_refresh:
         try:
-            items = load_json_content(series_items_path)
+            # Paged requests are answered straight from the catalog store
+            if wantsItemPage() and (catalog.has_items(portalId, "series", categoryId) or catalog.get_items(portalId, "series", categoryId)):
+                return categoryItemsPage(portal, portalId, "series", categoryId)
+
+            items = catalog.get_items(portalId, "series", categoryId)
             if items:
-                # Fix any relative screenshot URLs
-                items = fix_screenshot_urls(items, url)
                 logger.info(f"Serving Series items for portal {portalId}, category {categoryId} from cache")
                 return jsonify(items)
         except Exception as e:
@@ -2920,8 +3538,9 @@ def getSeriesCategoryItems(portalId, categoryId):
     # Fetch from portal API
     logger.info(f"Fetching Series items for portal {portalId}, category {categoryId} from API")
     try:
-        # Get token for the first available MAC
-        mac = macs[0]
+        # Spread catalog requests across the portal's MACs
+        mac = mac_pool.pick(portalId, portal) # Least busy MAC not needed for live streams
+        proxy = getPortalProxy(portal, mac)
 
         # Always get a fresh token to avoid attribute errors since portal["macs"][mac] might be a string (expiry date)
         token = stb.getToken(url, mac, proxy)
@@ -2952,9 +3571,6 @@ def getSeriesCategoryItems(portalId, categoryId):
                             items = list(items)
                         except Exception:
                             items = [items] if items else []
-
-                # Fix any relative screenshot URLs
-                items = fix_screenshot_urls(items, url)
             except Exception as e:
                 if "Authorization failed" in str(e) or "Failed to refresh token" in str(e):
                     # If we can't refresh the token, return an auth error
@@ -2990,9 +3606,6 @@ def getSeriesCategoryItems(portalId, categoryId):
                                 items = list(items)
                             except Exception:
                                 items = [items] if items else []
-
-                    # Fix any relative screenshot URLs
-                    items = fix_screenshot_urls(items, url)
                 except Exception as e2:
                     if "Authorization failed" in str(e2) or "Failed to refresh token" in str(e2):
                         # If we can't refresh the token, return an auth error
@@ -3081,9 +3694,11 @@ def getSeriesCategoryItems(portalId, categoryId):
                 "type": "general_error"
             }), 500
 
-        # Save items to cache file if we have valid items
+        # Save items to the catalog store if we have valid items
         if items:
-            save_content_json(series_items_path, items)
+            catalog.put_items(portalId, "series", categoryId, items)
+            if wantsItemPage():
+                return categoryItemsPage(portal, portalId, "series", categoryId)
 
         return jsonify(items)
     except Exception as e:
@@ -3094,7 +3709,7 @@ def getSeriesCategoryItems(portalId, categoryId):
 @authorise
 def getSeriesSeasons(portalId, seriesId):
     """
-    Returns seasons for a series. First tries to load from cached JSON file,
+    Returns seasons for a series. First tries the catalog store,
     then falls back to fetching from the portal API.
 
     Args:
@@ -3112,16 +3727,11 @@ def getSeriesSeasons(portalId, seriesId):
     url = portal["url"]
     force_refresh = request.args.get("refresh", "false").lower() == "true"
 
-    # Path to cached seasons file
-    seasons_path = get_seasons_path(portalId, seriesId)
-
     # Try to load from cache unless force refresh is requested
-    if not force_refresh and os.path.exists(seasons_path):
+    if not force_refresh:
         try:
-            seasons = load_json_content(seasons_path)
+            seasons = catalog.get_seasons(portalId, seriesId)
             if seasons:
-                # Fix any relative screenshot URLs
-                seasons = fix_screenshot_urls(seasons, url)
                 logger.info(f"Serving seasons for portal {portalId}, series {seriesId} from cache")
                 return jsonify(seasons)
         except Exception as e:
@@ -3135,16 +3745,15 @@ def getSeriesSeasons(portalId, seriesId):
         if not macs:
             return jsonify({"error": "No MACs available"}), 400
 
-        mac = macs[0]
+        mac = mac_pool.pick(portalId, portal) # Least busy MAC not needed for live streams
 
         # Get token - always get a fresh token to avoid attribute errors
-        token = stb.getToken(url, mac, portal["proxy"])
+        proxy = getPortalProxy(portal, mac)
+        token = stb.getToken(url, mac, proxy)
         if not token:
             logger.error(f"Failed to obtain token for portal {portalId}, MAC {mac}")
             return jsonify({"error": "Failed to authenticate with portal"}), 500
 
-        proxy = portal["proxy"]
-
         # Try to get seasons using tryWithTokenRefresh
         seasons = tryWithTokenRefresh(stb.getSeriesSeasons, url, mac, token, proxy, seriesId)
 
@@ -3158,11 +3767,8 @@ def getSeriesSeasons(portalId, seriesId):
             logger.warning(f"No seasons found for series {seriesId}")
             return jsonify([]) # Return empty list
 
-        # Fix any relative screenshot URLs
-        seasons = fix_screenshot_urls(seasons, url)
-
-        # Save seasons to cache file
-        save_content_json(seasons_path, seasons)
+        # Save seasons to the catalog store, which also makes relative image URLs absolute
+        catalog.put_seasons(portalId, seriesId, seasons)
 
         return jsonify(seasons)
     except Exception as e:
@@ -3174,7 +3780,7 @@ def getSeriesSeasons(portalId, seriesId):
 @authorise
 def getSeasonEpisodes(portalId, seriesId, seasonId):
     """
-    Returns episodes for a season. First tries to load from cached JSON file,
+    Returns episodes for a season. First tries the catalog store,
     then falls back to fetching from the portal API.
 
     Args:
@@ -3192,19 +3798,13 @@ def getSeasonEpisodes(portalId, seriesId, seasonId):
     portal = portals[portalId]
     url = portal["url"]
     macs = list(portal["macs"].keys())
-    proxy = portal["proxy"]
     force_refresh = request.args.get("refresh", "false").lower() == "true"
 
-    # Path to cached episodes file
-    episodes_path = get_episodes_path(portalId, seriesId, seasonId)
-
     # Try to load from cache unless force refresh is requested
-    if not force_refresh and os.path.exists(episodes_path):
+    if not force_refresh:
         try:
-            episodes = load_json_content(episodes_path)
+            episodes = catalog.get_episodes(portalId, seriesId, seasonId)
             if episodes:
-                # Fix any relative screenshot URLs
-                episodes = fix_screenshot_urls(episodes, url)
                 logger.info(f"Serving episodes for portal {portalId}, series {seriesId}, season {seasonId} from cache")
                 return jsonify(episodes)
         except Exception as e:
@@ -3216,8 +3816,9 @@ def getSeasonEpisodes(portalId, seriesId, seasonId):
         if not macs:
             return jsonify({"error": "No MACs available"}), 400
 
-        # Get token for the first available MAC
-        mac = macs[0]
+        # Spread catalog requests across the portal's MACs
+        mac = mac_pool.pick(portalId, portal) # Least busy MAC not needed for live streams
+        proxy = getPortalProxy(portal, mac)
 
         # Get token - always get a fresh token to avoid attribute errors
         token = stb.getToken(url, mac, proxy)
@@ -3241,9 +3842,6 @@ def getSeasonEpisodes(portalId, seriesId, seasonId):
             if not episodes:
                 logger.warning(f"No episodes found for series {seriesId}, season {seasonId}")
                 return jsonify([]) # Return empty list
-
-            # Fix any relative screenshot URLs
-            episodes = fix_screenshot_urls(episodes, url)
         except Exception as e:
             logger.error(f"Error fetching episodes: {e}")
             error_message = str(e)
@@ -3262,8 +3860,8 @@ def getSeasonEpisodes(portalId, seriesId, seasonId):
                 "type": "general_error"
             }), 500
 
-        # Save episodes to cache file
-        save_content_json(episodes_path, episodes)
+        # Save episodes to the catalog store, which also makes relative image URLs absolute
+        catalog.put_episodes(portalId, seriesId, seasonId, episodes)
 
         return jsonify(episodes)
     except Exception as e:
@@ -3272,6 +3870,64 @@ def getSeasonEpisodes(portalId, seriesId, seasonId):
         return jsonify({"error": f"Error fetching episodes: {str(e)}"}), 500
 
 
+@app.route("/api/search", methods=["GET"])
+@authorise
+def searchCatalog():
+    """
+    Searches the cached movies and series of all portals by title, original name,
+    actors, director, year and genre. Each word of the query matches as a prefix.
+
+    Query parameters: q (search text), portal (portal ID), type ("vod" or "series"),
+    field (one of the searchable fields), page (from 1) and per_page (up to 200).
+
+    Returns:
+        JSON: Total number of matches and the requested page of items.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "Missing search query"}), 400
+
+    content_type = request.args.get("type")
+    if content_type not in (None, "", "vod", "series"):
+        return jsonify({"error": "Invalid type, use vod or series"}), 400
+    field = request.args.get("field")
+    if field and field not in SEARCH_FIELDS:
+        return jsonify({"error": f"Invalid field, use one of {', '.join(SEARCH_FIELDS)}"}), 400
+    try:
+        page = max(1, int(request.args.get("page", 1)))
+        per_page = min(SEARCH_MAX_PER_PAGE, max(1, int(request.args.get("per_page", 50))))
+    except ValueError:
+        return jsonify({"error": "Invalid page or per_page"}), 400
+
+    portals = getPortals()
+    portal_id = request.args.get("portal")
+    if portal_id and portal_id not in portals:
+        return jsonify({"error": "Portal not found"}), 404
+    portal_ids = [portal_id] if portal_id else [pid for pid, portal in portals.items() if portal.get("enabled") == "true"]
+
+    try:
+        total, matches = catalog.search(query, portal_ids, content_type or None, field, per_page, (page - 1) * per_page)
+    except sqlite3.Error as e:
+        logger.error(f"Error searching catalog for '{query}': {e}")
+        return jsonify({"error": f"Search failed: {e}"}), 500
+
+    results = []
+    for match_portal_id, kind, category_id, item in matches:
+        portal = portals.get(match_portal_id, {})
+        item["portal_id"] = match_portal_id
+        item["portal_name"] = portal.get("name")
+        item["content_type"] = kind
+        item["category_id"] = category_id
+        results.append(item)
+
+    return jsonify({
+        "query": query,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "results": results,
+    })
+
 # region Deprecated Cache API Routes (Redirects to Unified API)
 
 @app.route("/api/cached/vod_categories/<portalId>", methods=["GET"])
@@ -3344,56 +4000,125 @@ def getCachedSeriesEpisodes(portalId, seriesId, seasonId):
     """
     return redirect(f"/api/cache/series/{portalId}/id/{seriesId}/season/{seasonId}", code=302)
 
-@app.route("/api/cached/all_movies/<portalId>", methods=["GET"])
-def getCachedAllMovies(portalId):
-    """
-    [DEPRECATED] This endpoint is deprecated.
-    The 'all movies' functionality should be implemented on the client-side
-    by fetching categories and combining movie items.
-    """
-    try:
-        # Get portal details
-        portals = getPortals()
-        if portalId not in portals:
-            return jsonify({"error": "Portal not found"}), 404
-
-        portal = portals[portalId]
-        portalName = portal.get("name")
-
-        # Get VOD categories and fetch all items
-        all_movies = []
+# Size of the chunks the all movies/all series responses are streamed in
+CACHED_ALL_CHUNK_SIZE = 64 * 1024
 
-        # Get categories via the unified cache API
-        categories_response = get_cached_content("vod", portalId, "categories")
-        if not isinstance(categories_response, flask.Response) or categories_response.status_code != 200:
-            return jsonify({"error": "Failed to fetch VOD categories"}), 500
+def getCachedSections(portal_id, kind, categories):
+    """
+    Lists the cached categories of a portal in category order with their item
+    counts, which the catalog store keeps up to date on every write.
 
-        categories = json.loads(categories_response.get_data(as_text=True))
+    Args:
+        portal_id (str): ID of the portal.
+        kind (str): "vod" or "series".
+        categories (list): Categories of the portal, in display order.
 
-        # Fetch items for each category
-        for category in categories:
-            if not isinstance(category, dict):
+    Returns:
+        list: (category_id, category_name, item_count) tuples.
+    """
+    counts = catalog.get_item_counts(portal_id, kind)
+    sections = []
+    for category in categories:
+        if not isinstance(category, dict) or not category.get("id"):
+            continue
+        category_id = str(category.get("id"))
+        if category_id not in counts:
+            items = catalog.get_items(portal_id, kind, category_id) # Imports a legacy JSON file if there is one
+            if not items:
                 continue
+            counts[category_id] = len(items)
+        sections.append((category_id, category.get("title", "Unknown"), counts[category_id]))
+    return sections
 
-            category_id = category.get("id")
-            if not category_id:
-                continue
+def iterCachedItems(portal_id, kind, sections, offset=0, limit=None):
+    """
+    Yields the cached items of a portal in category order, tagged with their category.
+    Categories before offset are skipped by their item count without being read.
 
-            # Get items via the unified cache API
-            items_response = get_cached_content("vod", portalId, f"category/{category_id}")
-            if not isinstance(items_response, flask.Response) or items_response.status_code != 200:
+    Args:
+        portal_id (str): ID of the portal.
+        kind (str): "vod" or "series".
+        sections (list): Categories as returned by getCachedSections.
+        offset (int): Number of items to skip.
+        limit (int, optional): Maximum number of items.
+    """
+    remaining = limit
+    for category_id, category_name, count in sections:
+        if offset >= count:
+            offset -= count
+            continue
+        for item in catalog.iter_items(portal_id, kind, category_id, start=offset, limit=-1 if remaining is None else remaining):
+            if not isinstance(item, dict):
                 continue
+            item["category_id"] = category_id
+            item["category_name"] = category_name
+            yield item
+            if remaining is not None:
+                remaining -= 1
+        offset = 0
+        if remaining is not None and remaining <= 0:
+            return
+
+def streamJsonArray(items):
+    """
+    Encodes items as a JSON array in chunks, so the full list is never built in memory.
+    """
+    chunk = ["["]
+    size = 1
+    separator = ""
+    for item in items:
+        encoded = separator + dumps_compact(item)
+        separator = ","
+        chunk.append(encoded)
+        size += len(encoded)
+        if size >= CACHED_ALL_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk, size = [], 0
+    chunk.append("]")
+    yield "".join(chunk)
 
-            items = json.loads(items_response.get_data(as_text=True))
+def cachedAllResponse(portalId, kind):
+    """
+    Streams every cached item of a portal for the all movies/all series endpoints.
 
-            # Add category info to each item
-            for item in items:
-                if isinstance(item, dict):
-                    item["category_id"] = category_id
-                    item["category_name"] = category.get("title", "Unknown")
-                    all_movies.append(item)
+    Query parameters:
+        offset (int, optional): Number of items to skip.
+        limit (int, optional): Maximum number of items to return.
+        format (str, optional): "json" (default) for a JSON array, "ndjson" for one item per line.
 
-        return jsonify(all_movies)
+    The total number of items is returned in the X-Total-Count header.
+    """
+    portals = getPortals()
+    if portalId not in portals:
+        return jsonify({"error": "Portal not found"}), 404
+
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(limit, 0)
+
+    categories = load_portal_categories(portals[portalId].get("name"))[0 if kind == "vod" else 1]
+    sections = getCachedSections(portalId, kind, categories)
+    items = iterCachedItems(portalId, kind, sections, offset, limit)
+
+    if request.args.get("format") == "ndjson":
+        response = Response((dumps_compact(item) + "\n" for item in items), mimetype="application/x-ndjson")
+    else:
+        response = Response(streamJsonArray(items), mimetype="application/json")
+    response.headers["X-Total-Count"] = str(sum(count for _, _, count in sections))
+    return response
+
+@app.route("/api/cached/all_movies/<portalId>", methods=["GET"])
+def getCachedAllMovies(portalId):
+    """
+    [DEPRECATED] This endpoint is deprecated.
+    The 'all movies' functionality should be implemented on the client-side
+    by fetching categories and combining movies items.
+
+    Supports offset/limit paging and format=ndjson, see cachedAllResponse.
+    """
+    try:
+        return cachedAllResponse(portalId, "vod")
     except Exception as e:
         logger.error(f"Error retrieving all cached movies: {e}")
         return jsonify({"error": str(e)}), 500
@@ -3404,50 +4129,11 @@ def getCachedAllSeries(portalId):
     [DEPRECATED] This endpoint is deprecated.
     The 'all series' functionality should be implemented on the client-side
     by fetching categories and combining series items.
+
+    Supports offset/limit paging and format=ndjson, see cachedAllResponse.
     """
     try:
-        # Get portal details
-        portals = getPortals()
-        if portalId not in portals:
-            return jsonify({"error": "Portal not found"}), 404
-
-        portal = portals[portalId]
-        portalName = portal.get("name")
-
-        # Get Series categories and fetch all items
-        all_series = []
-
-        # Get categories via the unified cache API
-        categories_response = get_cached_content("series", portalId, "categories")
-        if not isinstance(categories_response, flask.Response) or categories_response.status_code != 200:
-            return jsonify({"error": "Failed to fetch Series categories"}), 500
-
-        categories = json.loads(categories_response.get_data(as_text=True))
-
-        # Fetch items for each category
-        for category in categories:
-            if not isinstance(category, dict):
-                continue
-
-            category_id = category.get("id")
-            if not category_id:
-                continue
-
-            # Get items via the unified cache API
-            items_response = get_cached_content("series", portalId, f"category/{category_id}")
-            if not isinstance(items_response, flask.Response) or items_response.status_code != 200:
-                continue
-
-            items = json.loads(items_response.get_data(as_text=True))
-
-            # Add category info to each item
-            for item in items:
-                if isinstance(item, dict):
-                    item["category_id"] = category_id
-                    item["category_name"] = category.get("title", "Unknown")
-                    all_series.append(item)
-
-        return jsonify(all_series)
+        return cachedAllResponse(portalId, "series")
     except Exception as e:
         logger.error(f"Error retrieving all cached series: {e}")
         return jsonify({"error": str(e)}), 500
@@ -3456,25 +4142,67 @@ def getCachedAllSeries(portalId):
 
 # region Content Management Functions
 
-def ensure_content_directories():
+class ContentLayout:
     """
-    Ensures that the content directory structure exists.
-    Creates the main content directory and subdirectories for vod and series.
-
-    Returns:
-        tuple: Paths to the content directories (content_dir, vod_dir, series_dir)
+    Resolves the paths of the content files cached by versions before the catalog
+    database. The catalog store only reads them for its one-off legacy import, but
+    checks for them on every catalog miss, so each portal directory is listed once
+    and existence checks are set lookups instead of stat calls.
     """
-    content_dir = os.path.join(parent_folder, "content")
-    vod_dir = os.path.join(content_dir, "vod")
-    series_dir = os.path.join(content_dir, "series")
+    def __init__(self, content_dir):
+        self.vod_dir = os.path.join(content_dir, "vod")
+        self.series_dir = os.path.join(content_dir, "series")
+        self.lock = Lock()
+        self.listings = {} # Directory -> set of file names in it
 
-    # Create directories if they don't exist
-    for directory in [content_dir, vod_dir, series_dir]:
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-            logger.info(f"Created directory: {directory}")
+    def portal_dir(self, kind, portal_id):
+        return os.path.join(self.vod_dir if kind == "vod" else self.series_dir, portal_id)
+
+    @staticmethod
+    def safe_id(value):
+        # "*" means all, ids must not escape the portal directory
+        return "all" if value == "*" else str(value).replace(":", "_").replace("/", "_").replace("\\", "_")
+
+    def items_path(self, kind, portal_id, category_id):
+        safe_category_id = "all" if category_id == "*" else category_id
+        return os.path.join(self.portal_dir(kind, portal_id), f"category_{safe_category_id}.json")
+
+    def seasons_path(self, portal_id, series_id):
+        return os.path.join(self.portal_dir("series", portal_id), f"series_{self.safe_id(series_id)}_seasons.json")
+
+    def episodes_path(self, portal_id, series_id, season_id):
+        return os.path.join(self.portal_dir("series", portal_id),
+                            f"series_{self.safe_id(series_id)}_season_{self.safe_id(season_id)}_episodes.json")
+
+    def _listing(self, directory):
+        """
+        Returns the file names in a directory, listed on first use. Caller must hold the lock.
+        """
+        names = self.listings.get(directory)
+        if names is None:
+            try:
+                with os.scandir(directory) as entries:
+                    names = {entry.name for entry in entries}
+            except OSError:
+                names = set()
+            self.listings[directory] = names
+        return names
+
+    def exists(self, file_path):
+        """
+        Checks whether a content file exists, from the cached directory listing.
+        """
+        directory, name = os.path.split(file_path)
+        with self.lock:
+            return name in self._listing(directory)
+
+    def removed(self, file_path):
+        directory, name = os.path.split(file_path)
+        with self.lock:
+            if directory in self.listings:
+                self.listings[directory].discard(name)
 
-    return content_dir, vod_dir, series_dir
+content_layout = ContentLayout(content_folder)
 
 def get_vod_items_path(portal_id, category_id):
     """
@@ -3487,17 +4215,7 @@ def get_vod_items_path(portal_id, category_id):
     Returns:
         str: Path to the VOD items JSON file.
     """
-    _, vod_dir, _ = ensure_content_directories()
-    portal_vod_dir = os.path.join(vod_dir, portal_id)
-
-    # Create portal-specific directory if it doesn't exist
-    if not os.path.exists(portal_vod_dir):
-        os.makedirs(portal_vod_dir)
-
-    # Replace "*" with "all" for the "all categories" case to avoid invalid filename errors
-    safe_category_id = "all" if category_id == "*" else category_id
-
-    return os.path.join(portal_vod_dir, f"category_{safe_category_id}.json")
+    return content_layout.items_path("vod", portal_id, category_id)
 
 def get_series_items_path(portal_id, category_id):
     """
@@ -3510,17 +4228,7 @@ def get_series_items_path(portal_id, category_id):
     Returns:
         str: Path to the Series items JSON file.
     """
-    _, _, series_dir = ensure_content_directories()
-    portal_series_dir = os.path.join(series_dir, portal_id)
-
-    # Create portal-specific directory if it doesn't exist
-    if not os.path.exists(portal_series_dir):
-        os.makedirs(portal_series_dir)
-
-    # Replace "*" with "all" for the "all categories" case to avoid invalid filename errors
-    safe_category_id = "all" if category_id == "*" else category_id
-
-    return os.path.join(portal_series_dir, f"category_{safe_category_id}.json")
+    return content_layout.items_path("series", portal_id, category_id)
 
 def get_seasons_path(portal_id, series_id):
     """
@@ -3533,17 +4241,7 @@ def get_seasons_path(portal_id, series_id):
     Returns:
         str: Path to the seasons JSON file.
     """
-    _, _, series_dir = ensure_content_directories()
-    portal_series_dir = os.path.join(series_dir, portal_id)
-
-    # Create portal-specific directory if it doesn't exist
-    if not os.path.exists(portal_series_dir):
-        os.makedirs(portal_series_dir)
-
-    # Replace "*" with "all" for the "all series" case and sanitize other special characters
-    safe_series_id = "all" if series_id == "*" else series_id.replace(":", "_").replace("/", "_").replace("\\", "_")
-
-    return os.path.join(portal_series_dir, f"series_{safe_series_id}_seasons.json")
+    return content_layout.seasons_path(portal_id, series_id)
 
 def get_episodes_path(portal_id, series_id, season_id):
     """
@@ -3557,1074 +4255,3985 @@ def get_episodes_path(portal_id, series_id, season_id):
     Returns:
         str: Path to the episodes JSON file.
     """
-    _, _, series_dir = ensure_content_directories()
-    portal_series_dir = os.path.join(series_dir, portal_id)
-
-    # Create portal-specific directory if it doesn't exist
-    if not os.path.exists(portal_series_dir):
-        os.makedirs(portal_series_dir)
-
-    # Sanitize file path components
-    safe_series_id = "all" if series_id == "*" else series_id.replace(":", "_").replace("/", "_").replace("\\", "_")
-    safe_season_id = "all" if season_id == "*" else season_id.replace(":", "_").replace("/", "_").replace("\\", "_")
-
-    return os.path.join(portal_series_dir, f"series_{safe_series_id}_season_{safe_season_id}_episodes.json")
+    return content_layout.episodes_path(portal_id, series_id, season_id)
 
 def load_json_content(file_path, default=None):
     """
-    Loads content from a JSON file.
+    Loads content from a JSON content file, compact or indented.
 
     Args:
-        file_path (str): Path to the JSON file.
+        file_path (str): Path to the content file.
         default: Default value to return if file doesn't exist or can't be parsed.
 
     Returns:
-        The loaded JSON content or the default value.
+        The loaded content or the default value.
     """
     if default is None:
         default = []
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
+        with open(file_path, 'rb') as file:
+            return loads_json(file.read())
+    except (OSError, ValueError) as e:
         logger.debug(f"Could not load content from {file_path}: {e}")
         return default
 
-def save_content_json(file_path, content):
-    """
-    Saves content to a JSON file.
-
-    Args:
-        file_path (str): Path to the JSON file.
-        content: Content to save.
+#endregion
 
-    Returns:
-        bool: True if successful, False otherwise.
-    """
-    try:
-        directory = os.path.dirname(file_path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
+# region Catalog Store
+
+# Path to the catalog database
+catalog_db_path = os.path.join(content_folder, "catalog.db")
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+    portal_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    item_count INTEGER NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (portal_id, kind, category_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS items (
+    portal_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    item_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (portal_id, kind, category_id, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_by_id ON items (portal_id, kind, item_id);
+CREATE TABLE IF NOT EXISTS search_docs (
+    rowid INTEGER PRIMARY KEY,
+    portal_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category_id TEXT NOT NULL,
+    item_id TEXT,
+    name TEXT,
+    o_name TEXT,
+    actors TEXT,
+    director TEXT,
+    year TEXT,
+    genre TEXT
+);
+CREATE INDEX IF NOT EXISTS search_docs_by_category ON search_docs (portal_id, kind, category_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS items_search USING fts5(
+    name, o_name, actors, director, year, genre,
+    content='search_docs', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE TABLE IF NOT EXISTS portal_images (
+    portal_id TEXT PRIMARY KEY,
+    base_url TEXT NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seasons (
+    portal_id TEXT NOT NULL,
+    series_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    season_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (portal_id, series_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS episodes (
+    portal_id TEXT NOT NULL,
+    series_id TEXT NOT NULL,
+    season_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    episode_id TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (portal_id, series_id, season_id, position)
+) WITHOUT ROWID;
+"""
+
+# Bumped when a schema change needs existing data to be migrated
+CATALOG_SCHEMA_VERSION = 2
+
+# Searchable fields, as extracted from the stored item JSON
+SEARCH_FIELDS = {
+    "name": "json_extract(data, '$.name')",
+    "o_name": "json_extract(data, '$.o_name')",
+    "actors": "json_extract(data, '$.actors')",
+    "director": "json_extract(data, '$.director')",
+    "year": "json_extract(data, '$.year')",
+    "genre": "coalesce(json_extract(data, '$.genres_str'), json_extract(data, '$.genre'))",
+}
 
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(content, file, indent=4)
-        logger.info(f"Content saved to {file_path}")
-        return True
-    except Exception as e:
-        logger.error(f"Error saving content to {file_path}: {e}")
-        return False
+# Largest page the search API returns
+SEARCH_MAX_PER_PAGE = 200
 
-#endregion
+# Sortable fields of category listings, as extracted from the stored item JSON
+ITEM_SORT_FIELDS = {
+    "name": "json_extract(data, '$.name') COLLATE NOCASE",
+    "year": "CAST(substr(json_extract(data, '$.year'), 1, 4) AS INTEGER)",
+    "rating": "CAST(coalesce(nullif(json_extract(data, '$.rating_imdb'), ''), json_extract(data, '$.rating_kinopoisk')) AS REAL)",
+    "added": "json_extract(data, '$.added')",
+}
 
-# region Prefetch Content
+# Expression indexes over the sort fields, so filtering and sorting a category doesn't parse every item
+ITEM_SORT_INDEXES = "".join(
+    f"CREATE INDEX IF NOT EXISTS items_by_{field} ON items (portal_id, kind, category_id, {expression});\n"
+    for field, expression in ITEM_SORT_FIELDS.items())
+
+class CatalogStore:
+    """
+    SQLite database holding the cached VOD and Series catalog of every portal.
+
+    Category listings, seasons and episodes are stored one row per entry, the entry
+    itself as compact JSON, and are replaced in bulk. Each thread gets its own
+    connection and writes are serialised with a lock. Content cached as JSON files
+    by earlier versions is imported on first access and the file removed.
+
+    Category items are also indexed in an FTS5 table (search_docs holds the
+    extracted fields, items_search indexes them) that is kept in step with
+    every write.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.local = threading.local()
+        self.write_lock = Lock()
+        self.normalized = set() # (portal ID, image base URL) checked by normalize_images
+        self.normalizing = set() # Portal IDs being migrated in the background
+        self.normalize_lock = Lock()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        connection = self._connection()
+        with self.write_lock:
+            connection.executescript(CATALOG_SCHEMA + ITEM_SORT_INDEXES)
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version < 2:
+                # Catalogs stored before the search index existed
+                logger.info("Building catalog search index")
+                connection.execute("DELETE FROM search_docs")
+                connection.execute(self._search_docs_insert(""))
+                connection.execute("INSERT INTO items_search (items_search) VALUES ('rebuild')")
+            connection.execute(f"PRAGMA user_version = {CATALOG_SCHEMA_VERSION}")
+            connection.commit()
+
+    def _connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL") # Readers don't block the prefetch writer
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _write(self, statements):
+        """
+        Runs (sql, params or list of params) statements in one transaction.
+        """
+        connection = self._connection()
+        with self.write_lock, connection:
+            for sql, params in statements:
+                if isinstance(params, list):
+                    connection.executemany(sql, params)
+                else:
+                    connection.execute(sql, params)
 
-@app.route("/api/portal/<portalId>/prefetch", methods=["POST"])
-@authorise
-def prefetchPortalContent(portalId):
-    """
-    Prefetches and caches all content for a portal (VODs, Series, Seasons, Episodes).
-    This is a long-running operation that runs in the background.
+    @staticmethod
+    def _search_docs_insert(where):
+        fields = ", ".join(SEARCH_FIELDS)
+        values = ", ".join(SEARCH_FIELDS.values())
+        return (f"INSERT INTO search_docs (portal_id, kind, category_id, item_id, {fields}) "
+                f"SELECT portal_id, kind, category_id, item_id, {values} FROM items {where}")
 
-    Args:
-        portalId (str): ID of the portal.
+    @classmethod
+    def _unindex(cls, key):
+        """
+        Statements removing a category's items from the search index.
+        """
+        fields = ", ".join(SEARCH_FIELDS)
+        where = "WHERE portal_id = ? AND kind = ? AND category_id = ?"
+        return [
+            # External content FTS tables are told which values to remove
+            (f"INSERT INTO items_search (items_search, rowid, {fields}) SELECT 'delete', rowid, {fields} FROM search_docs {where}", key),
+            (f"DELETE FROM search_docs {where}", key),
+        ]
 
-    Returns:
-        JSON: Status message.
-    """
-    portals = getPortals()
-    if portalId not in portals:
-        return jsonify({"error": "Portal not found"}), 404
+    @classmethod
+    def _index(cls, key):
+        """
+        Statements adding a category's stored items to the search index.
+        """
+        fields = ", ".join(SEARCH_FIELDS)
+        where = "WHERE portal_id = ? AND kind = ? AND category_id = ?"
+        return [
+            (cls._search_docs_insert(where), key),
+            (f"INSERT INTO items_search (rowid, {fields}) SELECT rowid, {fields} FROM search_docs {where}", key),
+        ]
 
-    portal = portals[portalId]
-    portal_name = portal.get("name")
+    @staticmethod
+    def _rows(entries, id_key="id"):
+        return [(position, str(entry.get(id_key)) if isinstance(entry, dict) and entry.get(id_key) is not None else None,
+                 dumps_compact(entry)) for position, entry in enumerate(entries)]
 
-    # Start the prefetch process in a background thread
-    def prefetch_worker():
-        """Background worker function to prefetch all content"""
-        try:
-            logger.info(f"Starting content prefetch for portal {portal_name} ({portalId})")
+    @staticmethod
+    def _portal_url(portal_id):
+        portal = getPortals().get(portal_id)
+        return portal.get("url") if portal else None
 
-            url = portal["url"]
-            macs = list(portal["macs"].keys())
-            proxy = portal["proxy"]
+    def _fix_images(self, portal_id, entries):
+        """
+        Makes the image URLs of entries about to be stored absolute.
+        """
+        portal_url = self._portal_url(portal_id)
+        if portal_url:
+            fix_screenshot_urls(entries, portal_url)
+        return entries
 
-            if not macs:
-                logger.error(f"No MACs available for portal {portal_name}")
+    def _normalize_images(self, portal_id):
+        """
+        Starts normalize_images in the background if the image URLs stored for a
+        portal may not match its current address. Reads never wait for it.
+        """
+        portal_url = self._portal_url(portal_id)
+        if not portal_url or (portal_id, get_image_base_url(portal_url)) in self.normalized:
+            return
+        with self.normalize_lock:
+            if portal_id in self.normalizing:
                 return
+            self.normalizing.add(portal_id)
+        threading.Thread(target=self.normalize_images, args=(portal_id,), daemon=True).start()
+
+    def normalize_all(self):
+        """
+        Starts the image URL migration of every portal in the background.
+        """
+        for portal_id in getPortals():
+            self._normalize_images(portal_id)
 
-            mac = macs[0]
-            # Always get a fresh token to avoid attribute errors
-            token = stb.getToken(url, mac, proxy)
-            if not token:
-                logger.error(f"Failed to get token for portal {portal_name}")
+    def normalize_images(self, portal_id):
+        """
+        Makes the image URLs stored for a portal absolute, once per portal and base
+        URL. Catalogs written before URLs were fixed on write, or with an older
+        IMAGE_URL_VERSION, are migrated, and absolute URLs on the portal's previous
+        address are moved to the current one. Runs at startup and in the background.
+        """
+        try:
+            portal_url = self._portal_url(portal_id)
+            if not portal_url:
+                return
+            base_url = get_image_base_url(portal_url)
+            if (portal_id, base_url) in self.normalized:
                 return
 
-            # 1. Prefetch VOD categories
-            try:
-                vod_categories_path = os.path.join(parent_folder, f"{portal_name}_vod_categories.json")
-                with open(vod_categories_path, 'r') as file:
-                    vod_categories = json.load(file)
+            stored = self._query("SELECT base_url, version FROM portal_images WHERE portal_id = ?", (portal_id,))
+            if not stored or tuple(stored[0]) != (base_url, IMAGE_URL_VERSION):
+                previous_base_url = stored[0][0] if stored else None
+                started = time.time()
+                updated = 0
+                statements = []
+                for table, key_columns in (("items", ("kind", "category_id", "position")),
+                                           ("seasons", ("series_id", "position")),
+                                           ("episodes", ("series_id", "season_id", "position"))):
+                    changes = []
+                    for row in self._query(f"SELECT {', '.join(key_columns)}, data FROM {table} WHERE portal_id = ?", (portal_id,)):
+                        entry = loads_json(row[-1])
+                        data = dumps_compact(fix_screenshot_urls([entry], portal_url, previous_base_url)[0])
+                        if data != row[-1]:
+                            changes.append((data, portal_id) + tuple(row[:-1]) + (row[-1],))
+                    # Rows rewritten meanwhile (by a prefetch) are left alone, they were fixed on write
+                    condition = " AND ".join(f"{column} = ?" for column in key_columns)
+                    statements.append((f"UPDATE {table} SET data = ? WHERE portal_id = ? AND {condition} AND data = ?", changes))
+                    updated += len(changes)
+                statements.append(("INSERT OR REPLACE INTO portal_images (portal_id, base_url, version) VALUES (?, ?, ?)",
+                                   (portal_id, base_url, IMAGE_URL_VERSION)))
+                self._write(statements)
+                if updated:
+                    logger.info(f"Normalized {updated} image URLs of portal {portal_id} in {time.time() - started:.1f}s")
+            self.normalized.add((portal_id, base_url))
+        except Exception as e:
+            logger.error(f"Error normalizing image URLs of portal {portal_id}: {e}")
+        finally:
+            with self.normalize_lock:
+                self.normalizing.discard(portal_id)
 
-                # Filter to only include VOD categories
-                vod_categories = [category for category in vod_categories if category.get("type") == "VOD"]
+    def _import_legacy(self, file_path, put):
+        """
+        Imports a JSON file cached by an earlier version. Returns its content, or None.
+        """
+        if not content_layout.exists(file_path):
+            return None
+        content = load_json_content(file_path)
+        if not isinstance(content, list) or not content:
+            return None
+        put(content)
+        remove_content_file(file_path)
+        logger.info(f"Imported {file_path} into the catalog database")
+        return content
 
-                logger.info(f"Prefetching {len(vod_categories)} VOD categories for portal {portal_name}")
+    # Category listings
 
-                # Process each VOD category
-                for i, category in enumerate(vod_categories):
-                    try:
-                        category_id = category.get("id")
-                        if not category_id:
-                            continue
+    def put_items(self, portal_id, kind, category_id, items):
+        """
+        Replaces the cached listing of a category.
 
-                        logger.info(f"Prefetching VOD category {i+1}/{len(vod_categories)}: {category.get('title')} ({category_id})")
+        Args:
+            portal_id (str): ID of the portal.
+            kind (str): "vod" or "series".
+            category_id (str): ID of the category.
+            items (list): Items of the category, their image URLs are made absolute in place.
+        """
+        key = (portal_id, kind, str(category_id))
+        self._normalize_images(portal_id)
+        self._fix_images(portal_id, items)
+        self._write(self._unindex(key) + [
+            ("DELETE FROM items WHERE portal_id = ? AND kind = ? AND category_id = ?", key),
+            ("INSERT INTO items (portal_id, kind, category_id, position, item_id, data) VALUES (?, ?, ?, ?, ?, ?)",
+             [key + row for row in self._rows(items)]),
+            ("INSERT OR REPLACE INTO categories (portal_id, kind, category_id, item_count, updated) VALUES (?, ?, ?, ?, ?)",
+             key + (len(items), time.time())),
+        ] + self._index(key))
+
+    def get_items(self, portal_id, kind, category_id):
+        """
+        Returns the cached listing of a category.
 
-                        # Get the items
-                        vod_items = tryWithTokenRefresh(stb.getOrderedList, url, mac, token, proxy, "vod", category_id)
+        Returns:
+            list: Items of the category, or None if the category is not cached.
+        """
+        self._normalize_images(portal_id)
+        key = (portal_id, kind, str(category_id))
+        rows = self._query("SELECT data FROM items WHERE portal_id = ? AND kind = ? AND category_id = ? ORDER BY position", key)
+        if rows:
+            return [loads_json(row[0]) for row in rows]
+        legacy_path = get_vod_items_path(portal_id, category_id) if kind == "vod" else get_series_items_path(portal_id, category_id)
+        return self._import_legacy(legacy_path, lambda items: self.put_items(portal_id, kind, category_id, items))
+
+    def has_items(self, portal_id, kind, category_id):
+        """
+        Checks whether a category listing is cached.
+        """
+        return bool(self._query("SELECT 1 FROM categories WHERE portal_id = ? AND kind = ? AND category_id = ?",
+                                (portal_id, kind, str(category_id))))
 
-                        # Check if the response is valid
-                        if isinstance(vod_items, str) or not vod_items:
-                            logger.warning(f"Skipping VOD category {category_id}: invalid response")
-                            continue
+    def get_all_items(self, portal_id, kind):
+        """
+        Returns every cached item of a portal, in category order.
 
-                        # Save to cache
-                        vod_items_path = get_vod_items_path(portalId, category_id)
-                        save_content_json(vod_items_path, vod_items)
+        Returns:
+            list: (category_id, item) tuples.
+        """
+        self._normalize_images(portal_id)
+        rows = self._query("SELECT category_id, data FROM items WHERE portal_id = ? AND kind = ? ORDER BY category_id, position",
+                           (portal_id, kind))
+        return [(row[0], loads_json(row[1])) for row in rows]
 
-                        logger.info(f"Cached {len(vod_items)} VOD items for category {category_id}")
+    def query_items(self, portal_id, kind, category_id, sort=None, descending=False, year=None,
+                    min_rating=None, genre=None, added_since=None, offset=0, limit=None):
+        """
+        Returns one page of a cached category listing, filtered and sorted in SQL.
 
-                        # Add a small delay to avoid overwhelming the API
-                        time.sleep(0.5)
+        Args:
+            portal_id (str): ID of the portal.
+            kind (str): "vod" or "series".
+            category_id (str): ID of the category.
+            sort (str, optional): Field from ITEM_SORT_FIELDS, portal order if not given.
+            descending (bool): Sort in descending order.
+            year (tuple, optional): (first, last) release year.
+            min_rating (float, optional): Minimum IMDb (or Kinopoisk) rating.
+            genre (str, optional): Text the genre must contain.
+            added_since (str, optional): Only items added on or after this date (YYYY-MM-DD).
+            offset (int): Number of items to skip.
+            limit (int, optional): Page size, all items if not given.
 
-                    except Exception as e:
-                        logger.error(f"Error prefetching VOD category {category.get('id')}: {e}")
-                        continue
-            except Exception as e:
-                logger.error(f"Error prefetching VOD categories: {e}")
+        Returns:
+            tuple: (number of matching items, list of items)
+        """
+        self._normalize_images(portal_id)
+        where = ["portal_id = ?", "kind = ?", "category_id = ?"]
+        params = [portal_id, kind, str(category_id)]
+        if year:
+            where.append(f"{ITEM_SORT_FIELDS['year']} BETWEEN ? AND ?")
+            params.extend(year)
+        if min_rating is not None:
+            where.append(f"{ITEM_SORT_FIELDS['rating']} >= ?")
+            params.append(min_rating)
+        if genre:
+            where.append(f"{SEARCH_FIELDS['genre']} LIKE ?")
+            params.append(f"%{genre}%")
+        if added_since:
+            where.append(f"{ITEM_SORT_FIELDS['added']} >= ?")
+            params.append(added_since)
+        condition = " AND ".join(where)
+
+        order = "position"
+        if sort in ITEM_SORT_FIELDS:
+            # Items without the field go last (NULLs sort last when descending), ties keep the portal order.
+            # Written so that the items_by_<field> index gives the order
+            order = f"{ITEM_SORT_FIELDS[sort]} {'DESC' if descending else 'ASC NULLS LAST'}, position"
+        elif descending:
+            order = "position DESC"
+
+        total = self._query(f"SELECT COUNT(*) FROM items WHERE {condition}", params)[0][0]
+        rows = self._query(f"SELECT data FROM items WHERE {condition} ORDER BY {order} LIMIT ? OFFSET ?",
+                           params + [-1 if limit is None else limit, offset])
+        return total, [loads_json(row[0]) for row in rows]
+
+    def get_item_counts(self, portal_id, kind):
+        """
+        Returns the number of cached items of every category of a portal, as kept
+        up to date by put_items.
 
-            # 2. Prefetch Series categories and items
-            try:
-                # Try to load from series-specific file first
-                series_categories_path = os.path.join(parent_folder, f"{portal_name}_series_categories.json")
-                if os.path.exists(series_categories_path):
-                    with open(series_categories_path, 'r') as file:
-                        series_categories = json.load(file)
-                else:
-                    # Fall back to filtering VOD categories
-                    vod_categories_path = os.path.join(parent_folder, f"{portal_name}_vod_categories.json")
-                    with open(vod_categories_path, 'r') as file:
-                        all_categories = json.load(file)
-                        series_categories = [category for category in all_categories if category.get("type") == "Series"]
+        Returns:
+            dict: Category ID -> item count.
+        """
+        rows = self._query("SELECT category_id, item_count FROM categories WHERE portal_id = ? AND kind = ?", (portal_id, kind))
+        return dict(rows)
 
-                logger.info(f"Prefetching {len(series_categories)} Series categories for portal {portal_name}")
+    def iter_items(self, portal_id, kind, category_id, start=0, limit=-1):
+        """
+        Yields the items of a category one at a time, without loading the whole
+        listing into memory.
 
-                # Process each Series category
-                for i, category in enumerate(series_categories):
-                    try:
-                        category_id = category.get("id")
-                        if not category_id:
-                            continue
+        Args:
+            start (int): Position of the first item.
+            limit (int): Maximum number of items, -1 for all.
+        """
+        self._normalize_images(portal_id)
+        cursor = self._connection().execute(
+            "SELECT data FROM items WHERE portal_id = ? AND kind = ? AND category_id = ? AND position >= ? ORDER BY position LIMIT ?",
+            (portal_id, kind, str(category_id), start, limit))
+        try:
+            for row in cursor:
+                yield loads_json(row[0])
+        finally:
+            cursor.close()
 
-                        logger.info(f"Prefetching Series category {i+1}/{len(series_categories)}: {category.get('title')} ({category_id})")
+    def get_items_by_ids(self, portal_id, kind, item_ids):
+        """
+        Looks up cached items by id through the items_by_id index, without reading
+        whole categories.
 
-                        # First try with series type, then with vod type
-                        try:
-                            series_items = tryWithTokenRefresh(stb.getOrderedList, url, mac, token, proxy, "series", category_id)
+        Args:
+            portal_id (str): ID of the portal.
+            kind (str): "vod" or "series".
+            item_ids (list): Item IDs to look up.
 
-                            # Check if the response is a string
-                            if isinstance(series_items, str):
-                                # Try with VOD type instead
-                                series_items = tryWithTokenRefresh(stb.getOrderedList, url, mac, token, proxy, "vod", category_id)
+        Returns:
+            dict: Item ID -> item, for the ids found in the catalog.
+        """
+        self._normalize_images(portal_id)
+        found = {}
+        item_ids = list(dict.fromkeys(str(item_id) for item_id in item_ids))
+        for start in range(0, len(item_ids), 500): # Stay below SQLite's variable limit
+            chunk = item_ids[start:start + 500]
+            rows = self._query(f"SELECT item_id, data FROM items INDEXED BY items_by_id "
+                               f"WHERE portal_id = ? AND kind = ? AND item_id IN ({', '.join('?' for _ in chunk)})",
+                               [portal_id, kind] + chunk)
+            for item_id, data in rows:
+                found.setdefault(item_id, loads_json(data)) # First listing wins for items in several categories
+        return found
+
+    def delete_items(self, portal_id, kind, category_id):
+        """
+        Removes the cached listing of a category.
+        """
+        key = (portal_id, kind, str(category_id))
+        self._write(self._unindex(key) + [
+            ("DELETE FROM items WHERE portal_id = ? AND kind = ? AND category_id = ?", key),
+            ("DELETE FROM categories WHERE portal_id = ? AND kind = ? AND category_id = ?", key),
+        ])
 
-                            # Ensure items is a list
-                            if not isinstance(series_items, list):
-                                if series_items is None:
-                                    series_items = []
-                                else:
-                                    # Convert to list if possible
-                                    try:
-                                        series_items = list(series_items)
-                                    except:
-                                        series_items = [series_items] if series_items else []
-
-                            # Filter to only include Series items
-                            filtered_items = []
-                            for item in series_items:
-                                if isinstance(item, dict) and (
-                                    item.get("item_type") == "Series" or
-                                    item.get("type") == "Series"
-                                ):
-                                    filtered_items.append(item)
-                                elif isinstance(item, str):
-                                    # Skip string items
-                                    continue
+    def search(self, query, portal_ids=None, kind=None, field=None, limit=50, offset=0):
+        """
+        Full-text search over cached items. Every word of the query must match the
+        start of a word in the item (prefix matching), best matches first. Items
+        listed in several categories are returned once.
 
-                            series_items = filtered_items
+        Args:
+            query (str): Search text.
+            portal_ids (list, optional): Only search these portals.
+            kind (str, optional): "vod" or "series".
+            field (str, optional): Only search this field (see SEARCH_FIELDS).
+            limit (int): Page size.
+            offset (int): Number of results to skip.
 
-                        except Exception as e:
-                            logger.error(f"Error fetching series items for category {category_id}: {e}")
-                            series_items = []
+        Returns:
+            tuple: (total number of matches, list of (portal_id, kind, category_id, item) tuples)
+        """
+        terms = re.findall(r"\w+", query or "")
+        if not terms:
+            return 0, []
+        match = " ".join('"' + term + '"*' for term in terms)
+        if field in SEARCH_FIELDS:
+            match = f"{field} : ({match})"
+
+        where = ["items_search MATCH ?"]
+        params = [match]
+        if portal_ids:
+            where.append(f"d.portal_id IN ({', '.join('?' for _ in portal_ids)})")
+            params.extend(portal_ids)
+        if kind:
+            where.append("d.kind = ?")
+            params.append(kind)
+        source = f"FROM items_search JOIN search_docs d ON d.rowid = items_search.rowid WHERE {' AND '.join(where)}"
+
+        total = self._query(f"SELECT COUNT(DISTINCT d.portal_id || '|' || d.kind || '|' || d.item_id) {source}", params)[0][0]
+
+        # Walk the ranked matches and keep the first listing of each item; stops as soon
+        # as the page is filled instead of grouping every match of a broad query
+        page = []
+        seen = set()
+        cursor = self._connection().execute(
+            f"SELECT d.portal_id, d.kind, d.item_id, d.category_id {source} ORDER BY items_search.rank", params)
+        for portal_id, item_kind, item_id, category_id in cursor:
+            key = (portal_id, item_kind, item_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            if len(seen) > offset:
+                page.append((portal_id, item_kind, item_id, category_id))
+                if len(page) >= limit:
+                    break
+        cursor.close()
 
-                        # Check if we got valid items
-                        if not series_items:
-                            logger.warning(f"No Series items found for category {category_id}")
-                            continue
+        results = []
+        for portal_id, item_kind, item_id, category_id in page:
+            self._normalize_images(portal_id)
+            rows = self._query("SELECT data FROM items INDEXED BY items_by_id WHERE portal_id = ? AND kind = ? AND item_id = ? LIMIT 1",
+                               (portal_id, item_kind, item_id))
+            if rows:
+                results.append((portal_id, item_kind, category_id, loads_json(rows[0][0])))
+        return total, results
 
-                        # Save to cache
-                        series_items_path = get_series_items_path(portalId, category_id)
-                        save_content_json(series_items_path, series_items)
+    # Seasons and episodes
 
-                        logger.info(f"Cached {len(series_items)} Series items for category {category_id}")
+    def put_seasons(self, portal_id, series_id, seasons):
+        """
+        Replaces the cached seasons of a series.
+        """
+        key = (portal_id, str(series_id))
+        self._normalize_images(portal_id)
+        self._fix_images(portal_id, seasons)
+        self._write([
+            ("DELETE FROM seasons WHERE portal_id = ? AND series_id = ?", key),
+            ("INSERT INTO seasons (portal_id, series_id, position, season_id, data) VALUES (?, ?, ?, ?, ?)",
+             [key + row for row in self._rows(seasons)]),
+        ])
+
+    def get_seasons(self, portal_id, series_id):
+        """
+        Returns the cached seasons of a series, or None if they are not cached.
+        """
+        self._normalize_images(portal_id)
+        rows = self._query("SELECT data FROM seasons WHERE portal_id = ? AND series_id = ? ORDER BY position",
+                           (portal_id, str(series_id)))
+        if rows:
+            return [loads_json(row[0]) for row in rows]
+        return self._import_legacy(get_seasons_path(portal_id, str(series_id)),
+                                   lambda seasons: self.put_seasons(portal_id, series_id, seasons))
+
+    def put_episodes(self, portal_id, series_id, season_id, episodes):
+        """
+        Replaces the cached episodes of a season.
+        """
+        key = (portal_id, str(series_id), str(season_id))
+        self._normalize_images(portal_id)
+        self._fix_images(portal_id, episodes)
+        self._write([
+            ("DELETE FROM episodes WHERE portal_id = ? AND series_id = ? AND season_id = ?", key),
+            ("INSERT INTO episodes (portal_id, series_id, season_id, position, episode_id, data) VALUES (?, ?, ?, ?, ?, ?)",
+             [key + row for row in self._rows(episodes)]),
+        ])
+
+    def get_episodes(self, portal_id, series_id, season_id):
+        """
+        Returns the cached episodes of a season, or None if they are not cached.
+        """
+        self._normalize_images(portal_id)
+        rows = self._query("SELECT data FROM episodes WHERE portal_id = ? AND series_id = ? AND season_id = ? ORDER BY position",
+                           (portal_id, str(series_id), str(season_id)))
+        if rows:
+            return [loads_json(row[0]) for row in rows]
+        return self._import_legacy(get_episodes_path(portal_id, str(series_id), str(season_id)),
+                                   lambda episodes: self.put_episodes(portal_id, series_id, season_id, episodes))
+
+    def delete_episodes(self, portal_id, series_id, season_id):
+        """
+        Removes the cached episodes of a season.
+        """
+        self._write([("DELETE FROM episodes WHERE portal_id = ? AND series_id = ? AND season_id = ?",
+                      (portal_id, str(series_id), str(season_id)))])
 
-                        # 3. Prefetch seasons and episodes for each series
-                        logger.info(f"Prefetching seasons and episodes for {len(series_items)} series in category {category_id}")
+    def delete_series(self, portal_id, series_id):
+        """
+        Removes the cached seasons and episodes of a series.
+        """
+        key = (portal_id, str(series_id))
+        self._write([
+            ("DELETE FROM seasons WHERE portal_id = ? AND series_id = ?", key),
+            ("DELETE FROM episodes WHERE portal_id = ? AND series_id = ?", key),
+        ])
 
-                        for j, series in enumerate(series_items):
-                            try:
-                                series_id = series.get("id")
-                                if not series_id:
-                                    continue
+catalog = CatalogStore(catalog_db_path)
 
-                                logger.info(f"Prefetching series {j+1}/{len(series_items)}: {series.get('name', series.get('title', 'Unknown'))} ({series_id})")
+def lookup_cached_items(portal_id, portal_name, kind, item_ids):
+    """
+    Gets the cached metadata of selected movies or series.
 
-                                # Get seasons
-                                seasons = tryWithTokenRefresh(stb.getSeriesSeasons, url, mac, token, proxy, series_id)
+    Args:
+        portal_id (str): ID of the portal.
+        portal_name (str): Name of the portal.
+        kind (str): "vod" or "series".
+        item_ids (list): IDs of the items to look up.
 
-                                # Check if the response is valid
-                                if isinstance(seasons, str) or not seasons:
-                                    logger.warning(f"Skipping seasons for series {series_id}: invalid response")
-                                    continue
+    Returns:
+        dict: Item ID -> item, for the ids found in the cache.
+    """
+    found = catalog.get_items_by_ids(portal_id, kind, item_ids)
+    missing = {str(item_id) for item_id in item_ids} - set(found)
+    if not missing:
+        return found
+
+    # Categories still in legacy JSON files are imported on first read, so walk the
+    # ones not in the catalog yet until every id is found
+    vod_categories, series_categories = load_portal_categories(portal_name)
+    for category in vod_categories if kind == "vod" else series_categories:
+        category_id = category.get("id")
+        if not category_id or catalog.has_items(portal_id, kind, category_id):
+            continue
+        for item in catalog.get_items(portal_id, kind, category_id) or []:
+            if isinstance(item, dict) and str(item.get("id")) in missing:
+                found[str(item["id"])] = item
+                missing.discard(str(item["id"]))
+        if not missing:
+            break
+    return found
 
-                                # Save seasons to cache
-                                seasons_path = get_seasons_path(portalId, series_id)
-                                save_content_json(seasons_path, seasons)
+#endregion
 
-                                logger.info(f"Cached {len(seasons)} seasons for series {series_id}")
+# region Image Cache
 
-                                # Prefetch episodes for each season
-                                for season in seasons:
-                                    try:
-                                        season_id = season.get("id")
-                                        if not season_id:
-                                            continue
+# Folder for cached poster and logo images
+image_cache_folder = os.path.join(content_folder, "images")
 
-                                        # Get episodes
-                                        episodes = tryWithTokenRefresh(stb.getSeasonEpisodes, url, mac, token, proxy, series_id, season_id)
+# Thumbnail widths served by the image proxy, "original" serves the image as downloaded
+IMAGE_SIZES = {"small": 185, "medium": 342, "large": 780}
 
-                                        # Check if the response is valid
-                                        if isinstance(episodes, str) or not episodes:
-                                            logger.warning(f"Skipping episodes for season {season_id}: invalid response")
-                                            continue
+# Browsers may keep proxied images this long (seconds), cached images never change
+IMAGE_MAX_AGE = 30 * 24 * 3600
 
-                                        # Save episodes to cache
-                                        episodes_path = get_episodes_path(portalId, series_id, season_id)
-                                        save_content_json(episodes_path, episodes)
+# Seconds a failed download is remembered before it is tried again
+IMAGE_FAILURE_TTL = 600
 
-                                        logger.info(f"Cached {len(episodes)} episodes for season {season_id} of series {series_id}")
+# File extensions of cached images by content type
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+    "image/x-icon": "ico",
+    "image/vnd.microsoft.icon": "ico",
+    "image/bmp": "bmp",
+}
 
-                                        # Add a small delay to avoid overwhelming the API
-                                        time.sleep(0.5)
+class ImageCache:
+    """
+    Disk cache for poster and logo images fetched from portals.
 
-                                    except Exception as e:
-                                        logger.error(f"Error prefetching episodes for season {season.get('id')} of series {series_id}: {e}")
-                                        continue
+    Images are stored per source URL and size, thumbnails resized with Pillow when
+    it is installed (otherwise every size is the original image). The cache is kept
+    under the "image cache size mb" setting by evicting the least recently used
+    files; file modification times record use, so the order survives restarts.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = Lock()
+        self.entries = OrderedDict() # (key, size) -> (path, bytes), least recently used first
+        self.total = 0
+        self.loaded = False
+        self.failures = {} # Source URL -> time of the last failed download
 
-                                # Add a small delay to avoid overwhelming the API
-                                time.sleep(0.5)
+    def max_bytes(self):
+        try:
+            return int(getSettings().get("image cache size mb", defaultSettings["image cache size mb"])) * 1024 * 1024
+        except (TypeError, ValueError):
+            return int(defaultSettings["image cache size mb"]) * 1024 * 1024
 
-                            except Exception as e:
-                                logger.error(f"Error prefetching seasons for series {series.get('id')}: {e}")
-                                continue
+    @staticmethod
+    def key(src):
+        return hashlib.sha1(src.encode("utf-8")).hexdigest()
 
-                        # Add a small delay between categories
-                        time.sleep(1)
+    def _load(self):
+        """
+        Indexes the files already in the cache, oldest use first. Caller must hold the lock.
+        """
+        if self.loaded:
+            return
+        files = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                stem, _, extension = name.rpartition(".")
+                key, _, size = stem.partition("_")
+                if not extension or not size or extension == "tmp":
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, (key, size), path, stat.st_size))
+        for _, entry_key, path, size in sorted(files):
+            self.entries[entry_key] = (path, size)
+            self.total += size
+        self.loaded = True
+        logger.info(f"Image cache holds {len(self.entries)} images ({self.total // (1024 * 1024)} MB)")
+
+    def _lookup(self, key, size):
+        with self.lock:
+            self._load()
+            entry = self.entries.get((key, size))
+            if entry is None:
+                return None
+            self.entries.move_to_end((key, size))
+        try:
+            os.utime(entry[0]) # Record the use for the LRU order after a restart
+            return entry[0]
+        except OSError:
+            with self.lock:
+                if self.entries.pop((key, size), None):
+                    self.total -= entry[1]
+            return None
 
-                    except Exception as e:
-                        logger.error(f"Error prefetching Series category {category.get('id')}: {e}")
-                        continue
-            except Exception as e:
-                logger.error(f"Error prefetching Series categories: {e}")
+    def _store(self, key, size, data, content_type):
+        extension = IMAGE_EXTENSIONS.get(content_type, "img")
+        path = os.path.join(self.folder, key[:2], f"{key}_{size}.{extension}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent misses on the same image each write their own file, the last rename wins
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{key}_{size}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
 
-            logger.info(f"Content prefetch completed for portal {portal_name} ({portalId})")
+        max_bytes = self.max_bytes()
+        with self.lock:
+            self._load()
+            previous = self.entries.pop((key, size), None)
+            if previous:
+                self.total -= previous[1]
+            self.entries[(key, size)] = (path, len(data))
+            self.total += len(data)
+            evicted = []
+            while self.total > max_bytes and len(self.entries) > 1:
+                _, (old_path, old_size) = self.entries.popitem(last=False)
+                self.total -= old_size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+        return path
 
+    @staticmethod
+    def _resize(data, width):
+        """
+        Shrinks an image to a thumbnail width. Returns (JPEG bytes, content type), or None.
+        """
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if image.width <= width:
+                    return None # Already small enough, serve it as is
+                image.thumbnail((width, width * 4))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                output = io.BytesIO()
+                image.save(output, "JPEG", quality=85, optimize=True)
+                return output.getvalue(), "image/jpeg"
         except Exception as e:
-            logger.error(f"Error in prefetch worker for portal {portal_name}: {e}")
+            logger.debug(f"Could not resize image: {e}")
+            return None
 
-    # Start the worker thread
-    prefetch_thread = threading.Thread(target=prefetch_worker)
-    prefetch_thread.daemon = True  # Allow the thread to be terminated when the main program exits
-    prefetch_thread.start()
+    def get(self, src, size="original", proxy=None):
+        """
+        Returns the cached file of an image, downloading and resizing it on a miss.
 
-    return jsonify({
-        "status": "success",
-        "message": f"Started prefetching content for portal {portal_name} ({portalId}). This process runs in the background and may take a while to complete."
-    })
+        Args:
+            src (str): Image URL.
+            size (str): Key of IMAGE_SIZES, or "original".
+            proxy (str, optional): Proxy to download through.
 
-@app.route("/portals/<portalId>/prefetch", methods=["GET"])
-@authorise
-def prefetchPortalUI(portalId):
+        Returns:
+            str: Path of the cached image, or None if it could not be downloaded.
+        """
+        if Image is None:
+            size = "original" # Thumbnails can't be made without Pillow
+        key = self.key(src)
+        path = self._lookup(key, size)
+        if path:
+            return path
+
+        with self.lock:
+            failed = self.failures.get(src)
+        if failed and time.time() - failed < IMAGE_FAILURE_TTL:
+            return None
+
+        original = self._lookup(key, "original")
+        if original:
+            with open(original, "rb") as f:
+                data = f.read()
+            content_type = next((t for t, e in IMAGE_EXTENSIONS.items() if original.endswith("." + e)), "")
+        else:
+            result = stb.getImage(src, proxy)
+            if not result:
+                with self.lock:
+                    self.failures[src] = time.time()
+                    if len(self.failures) > 10000:
+                        self.failures.clear()
+                return None
+            data, content_type = result
+
+        if size in IMAGE_SIZES:
+            resized = self._resize(data, IMAGE_SIZES[size])
+            if resized:
+                data, content_type = resized
+        return self._store(key, size, data, content_type)
+
+    def stats(self):
+        with self.lock:
+            self._load()
+            return {
+                "images": len(self.entries),
+                "bytes": self.total,
+                "max_bytes": self.max_bytes(),
+                "resizing": Image is not None,
+            }
+
+image_cache = ImageCache(image_cache_folder)
+
+def imageProxyUrl(portal_id, src, size="small"):
     """
-    Renders a simple UI for prefetching content for a portal.
+    Builds the image proxy URL for an image of a portal.
 
     Args:
-        portalId (str): ID of the portal.
+        portal_id (str): ID of the portal the image belongs to.
+        src (str): Image URL.
+        size (str): Key of IMAGE_SIZES, or "original".
 
     Returns:
-        Response: Rendered HTML template.
+        str: Proxy URL, or an empty string if there is no image.
     """
-    portals = getPortals()
-    if portalId not in portals:
-        flash("Portal not found", "danger")
-        return redirect("/portals", code=302)
+    if not src:
+        return ""
+    return f"/api/image/{portal_id}/{size}?src={quote(src, safe='')}"
 
-    portal = portals[portalId]
+def portalImageUrl(portal, src):
+    """
+    Resolves an image URL of a portal and checks that it points at the portal.
+    Only the hosts of the portal URL, its mirrors and its image base URL are
+    allowed, so the image proxy can't be used to reach other hosts.
 
-    return render_template("prefetch.html", portal=portal, portalId=portalId)
+    Args:
+        portal (dict): Portal the image belongs to.
+        src (str): Absolute image URL, or a path relative to the portal's image base URL.
 
-#endregion
+    Returns:
+        str: Absolute image URL, or None if it isn't one of the portal's images.
+    """
+    url = portal.get("url", "")
+    if not src or not url:
+        return None
+    base_url = get_image_base_url(url)
+    if not src.startswith(("http://", "https://")):
+        src = base_url + "/" + src.lstrip("/")
+
+    allowed = set()
+    for endpoint in [url, base_url] + stb.getMirrors(url):
+        host = urlparse(endpoint).hostname
+        if host:
+            allowed.add(host.lower())
+    try:
+        host = urlparse(src).hostname
+    except ValueError:
+        return None
+    return src if host and host.lower() in allowed else None
 
-@app.route("/portal/<portalId>/channels", methods=["GET"])
+@app.route("/api/image/<portalId>/<size>", methods=["GET"])
 @authorise
-def portalChannels(portalId):
+@requestPriority(stb.PRIORITY_INTERACTIVE)
+def imageProxy(portalId, size):
+    """
+    Serves a portal image (poster, cover or logo) from the image cache, fetching
+    and resizing it on first use. Only images on the portal's own hosts are served
+    (see portalImageUrl).
+
+    Args:
+        portalId (str): ID of the portal the image belongs to.
+        size (str): small, medium, large or original.
+
+    Query parameters:
+        src (str): URL of the image, absolute or relative to the portal.
+
+    Returns:
+        Image file with long-lived cache headers and an ETag, 404 if the image isn't
+        the portal's or can't be downloaded.
+    """
+    portals = getPortals()
+    if portalId not in portals:
+        return jsonify({"error": "Portal not found"}), 404
+    if size not in IMAGE_SIZES and size != "original":
+        return jsonify({"error": f"Invalid size, expected one of: {', '.join(list(IMAGE_SIZES) + ['original'])}"}), 400
+    src = request.args.get("src", "").strip()
+    if not src:
+        return jsonify({"error": "Missing image URL"}), 400
+    src = portalImageUrl(portals[portalId], src)
+    if not src:
+        return jsonify({"error": "Image not found"}), 404
+
+    path = image_cache.get(src, size, getPortalProxy(portals[portalId], background=True))
+    if not path:
+        return jsonify({"error": "Image not found"}), 404
+
+    extension = path.rsplit(".", 1)[-1]
+    mimetype = next((t for t, e in IMAGE_EXTENSIONS.items() if e == extension), "application/octet-stream")
+    response = send_file(path, mimetype=mimetype, max_age=IMAGE_MAX_AGE, etag=f"{ImageCache.key(src)}-{size}", conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route("/api/image/stats", methods=["GET"])
+@authorise
+def imageCacheStats():
+    """
+    Returns the size and usage of the image cache.
+    """
+    return jsonify(image_cache.stats())
+
+#endregion
+
+# region Prefetch Content
+
+# Upper bound on prefetch workers per portal, the portal's "max concurrent requests" applies below it
+PREFETCH_MAX_WORKERS = 8
+# Log prefetch progress every this many completed tasks
+PREFETCH_LOG_INTERVAL = 50
+# Persist the prefetch job record every this many completed tasks
+PREFETCH_CHECKPOINT_INTERVAL = 25
+# Number of failed tasks kept in the job record
+PREFETCH_MAX_FAILED = 100
+# Poster size cached when a prefetch warms the image cache (the thumbnails of the movie and series lists)
+PREFETCH_IMAGE_SIZE = "small"
+# Seconds a prefetch task waits for a free MAC before it fails
+PREFETCH_MAC_TIMEOUT = 60
+
+# Running prefetch engines: {portal_id: PrefetchEngine}
+prefetch_jobs = {}
+prefetch_jobs_lock = threading.Lock()
+
+def isAuthFailure(result):
+    """
+    Checks whether an stb call result or exception means the token was rejected.
+
+    Args:
+        result: Return value or exception of an stb call.
+
+    Returns:
+        bool: True if the portal rejected the token.
+    """
+    text = str(result).lower()
+    if isinstance(result, Exception):
+        return "authorization failed" in text
+    return isinstance(result, str) and ("authorization failed" in text or "auth failed" in text or "auth error" in text)
+
+class MacSession:
+    """
+    A token shared by every thread working with one MAC.
+
+    Stalker portals usually invalidate the previous token on each handshake, so
+    concurrent workers must not refresh independently. The token is only refreshed
+    when a call is rejected, and only once per rejection: workers that fail with a
+    token that has already been replaced simply retry with the new one.
+    """
+    def __init__(self, url, mac, proxy=None, max_retries=2):
+        self.url = url
+        self.mac = mac
+        self.proxy = proxy
+        self.max_retries = max_retries
+        self.token = None
+        self.generation = 0 # Incremented on every refresh
+        self.refreshes = 0
+        self.lock = Lock()
+
+    def get_token(self):
+        """
+        Returns the current token and its generation, performing the first handshake if needed.
+        """
+        with self.lock:
+            if self.token is None:
+                self._refresh()
+            return self.token, self.generation
+
+    def invalidate(self, generation):
+        """
+        Refreshes the token unless another thread already replaced the given generation.
+        """
+        with self.lock:
+            if generation == self.generation:
+                self._refresh()
+
+    def _refresh(self):
+        token = stb.getToken(self.url, self.mac, self.proxy)
+        if not token:
+            raise stb.AuthenticationError(f"Failed to get token for MAC {self.mac}")
+        self.token = token
+        self.generation += 1
+        self.refreshes += 1
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls an stb function as func(url, mac, token, proxy, *args, **kwargs), refreshing
+        the shared token and retrying if the portal rejects it.
+
+        Returns:
+            The result of the function call.
+        """
+        for attempt in range(self.max_retries + 1):
+            token, generation = self.get_token()
+            try:
+                result = func(self.url, self.mac, token, self.proxy, *portalApiArgs(args), **kwargs)
+            except Exception as e:
+                if not isAuthFailure(e) or attempt == self.max_retries:
+                    raise
+                result = e
+            if not isAuthFailure(result) or attempt == self.max_retries:
+                return result
+            logger.info(f"Token for MAC {self.mac} rejected, refreshing (attempt {attempt + 1})")
+            self.invalidate(generation)
+        return result
+
+def get_prefetch_job_path(portal_id):
+    """
+    Gets the path of the persisted prefetch job record of a portal.
+
+    Args:
+        portal_id (str): ID of the portal.
+
+    Returns:
+        str: Path to the job record file.
+    """
+    return os.path.join(content_folder, f"prefetch_job_{portal_id}.json")
+
+def load_prefetch_job(portal_id):
+    """
+    Loads the persisted prefetch job record of a portal.
+
+    Args:
+        portal_id (str): ID of the portal.
+
+    Returns:
+        dict: Job record, or None if there is none.
+    """
+    job_path = get_prefetch_job_path(portal_id)
+    if not os.path.exists(job_path):
+        return None
+    try:
+        with open(job_path, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"Error loading prefetch job {job_path}: {e}")
+        return None
+
+def load_portal_categories(portal_name):
+    """
+    Reads the VOD and Series category lists saved with a portal.
+
+    Args:
+        portal_name (str): Name of the portal.
+
+    Returns:
+        tuple: (vod categories, series categories)
+    """
+    vod_categories_path = os.path.join(parent_folder, f"{portal_name}_vod_categories.json")
+    try:
+        with open(vod_categories_path, 'r') as file:
+            all_categories = json.load(file)
+    except Exception as e:
+        logger.error(f"Error loading VOD categories: {e}")
+        all_categories = []
+
+    vod_categories = [category for category in all_categories if category.get("type") == "VOD"]
+
+    # Try to load from series-specific file first, fall back to filtering VOD categories
+    series_categories_path = os.path.join(parent_folder, f"{portal_name}_series_categories.json")
+    series_categories = [category for category in all_categories if category.get("type") == "Series"]
+    if os.path.exists(series_categories_path):
+        try:
+            with open(series_categories_path, 'r') as file:
+                series_categories = json.load(file)
+        except Exception as e:
+            logger.error(f"Error loading Series categories: {e}")
+
+    return vod_categories, series_categories
+
+def get_catalog_manifest_path(portal_id):
+    """
+    Gets the path of the catalog manifest (change signatures) of a portal.
+
+    Args:
+        portal_id (str): ID of the portal.
+
+    Returns:
+        str: Path to the manifest file.
+    """
+    return os.path.join(content_folder, f"manifest_{portal_id}.json")
+
+def catalogSignature(items):
+    """
+    Computes the change signature of a category listing.
+
+    Args:
+        items (list): Items returned for the category.
+
+    Returns:
+        dict: Item count, most recent "added" timestamp and a hash of the listing.
+    """
+    added = [str(item.get("added") or "") for item in items if isinstance(item, dict)]
+    return {
+        "count": len(items),
+        "max_added": max(added, default=""),
+        "hash": hashlib.md5(json.dumps(items, sort_keys=True).encode()).hexdigest(),
+    }
+
+def remove_content_file(file_path):
+    """
+    Removes a cached content file if it exists.
+    """
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        content_layout.removed(file_path)
+    except OSError as e:
+        logger.error(f"Error removing {file_path}: {e}")
+
+class PrefetchAbortedError(Exception):
+    """Exception raised when a prefetch job cannot go on, e.g. no MAC of the portal can authenticate."""
+    pass
+
+class PrefetchEngine:
+    """
+    Walks a portal's VOD and Series catalog (category -> series -> season) with a
+    bounded pool of workers fed from a task queue. Request rate and concurrency
+    towards the portal are enforced by its stb scheduler; the pool is sized so that
+    it can use the whole budget.
+
+    The queued and running tasks are the job's cursor. They are checkpointed to a
+    job record together with the counters, so an interrupted prefetch resumes with
+    the remaining tasks instead of starting over.
+
+    Refreshes are differential: a manifest keeps a signature per category and a hash
+    per series, so unchanged categories are not rewritten and only new or changed
+    series are walked again. Categories, series and seasons that disappeared from
+    the portal are pruned from the catalog store.
+    """
+    # Methods that may be queued as tasks (and restored from a job record)
+    TASKS = ("prefetch_vod_category", "prefetch_series_category", "prefetch_series", "prefetch_season", "prefetch_images")
+
+    def __init__(self, portal_id, portal, full=False, images=False):
+        self.portal_id = portal_id
+        self.portal = portal
+        self.portal_name = portal.get("name")
+        self.tasks = queue.Queue()
+        try:
+            allowed = int(portal.get("max concurrent requests", defaultPortal["max concurrent requests"]))
+        except (TypeError, ValueError):
+            allowed = int(defaultPortal["max concurrent requests"])
+        self.workers = max(1, min(PREFETCH_MAX_WORKERS, allowed))
+        self.sessions = {} # Shared token per MAC: {mac: MacSession}
+        self.lock = Lock()
+        self.checkpoint_lock = Lock() # Serialises job record writes
+        self.started = None
+        self.finished = None
+        self.tasks_done = 0
+        self.items = 0 # Catalog entries cached (items, seasons, episodes)
+        self.errors = 0
+        self.pending = {} # Queued or running tasks: {(task name, *args): [task name, args]}
+        self.failed = [] # Most recent failed tasks with their error
+        self.previous_elapsed = 0 # Time spent in earlier runs of a resumed job
+        self.run_tasks_done = 0 # Tasks completed by this run, for the ETA
+        self.resumed = False
+        self.recording = False # This run owns the job record (it was restored or replaced)
+        self.aborted = None # Why the job was given up, the remaining tasks stay pending
+        self.full = full # Ignore the manifest and walk everything
+        self.skipped = 0 # Unchanged categories and series
+        self.pruned = 0 # Removed content files
+        self.images = images # Also warm the image cache with the posters of every category
+        self.images_cached = 0
+        self.series_walks = {} # Series whose seasons are being walked: {series ID: [hash, season IDs left, all seasons cached]}
+        self.manifest = self._load_manifest()
+
+    def stats(self):
+        """
+        Returns progress counters and the measured throughput.
+        """
+        with self.lock:
+            run_elapsed = ((self.finished or time.time()) - self.started) if self.started else 0
+            elapsed = self.previous_elapsed + run_elapsed
+            pending = len(self.pending)
+            # The ETA uses this run's task rate; pending grows as categories expand, so it is a lower bound
+            task_rate = self.run_tasks_done / run_elapsed if run_elapsed else 0
+            return {
+                "portal": self.portal_name,
+                "running": self.finished is None,
+                "resumed": self.resumed,
+                "aborted": self.aborted,
+                "workers": self.workers,
+                "tasks_done": self.tasks_done,
+                "tasks_pending": pending,
+                "tasks_failed": self.errors,
+                "items": self.items,
+                "skipped": self.skipped,
+                "pruned": self.pruned, # Categories, series and seasons removed
+                "images": self.images_cached,
+                "errors": self.errors,
+                "token_refreshes": sum(session.refreshes for session in self.sessions.values()),
+                "elapsed": round(elapsed, 1),
+                "items_per_second": round(self.items / elapsed, 2) if elapsed else 0.0,
+                "eta": round(pending / task_rate) if task_rate and pending else None,
+            }
+
+    def checkpoint(self, status="running"):
+        """
+        Persists the job record (counters, timings, pending tasks, recent failures).
+        """
+        with self.lock:
+            run_elapsed = ((self.finished or time.time()) - self.started) if self.started else 0
+            record = {
+                "portal_id": self.portal_id,
+                "status": status,
+                "updated": time.time(),
+                "elapsed": self.previous_elapsed + run_elapsed,
+                "tasks_done": self.tasks_done,
+                "items": self.items,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "full": self.full,
+                "images": self.images,
+                "pending": list(self.pending.values()),
+                "failed": list(self.failed),
+            }
+            manifest = json.loads(json.dumps(self.manifest)) # Snapshot, workers keep updating it
+        with self.checkpoint_lock:
+            self._write_record(get_prefetch_job_path(self.portal_id), record)
+            self._write_record(get_catalog_manifest_path(self.portal_id), manifest)
+
+    def _write_record(self, file_path, record):
+        try:
+            write_atomic(file_path, dumps_compact(record)) # Never leave a half-written record behind
+        except Exception as e:
+            logger.error(f"Error saving prefetch record {file_path}: {e}")
+
+    def _load_manifest(self):
+        manifest = load_json_content(get_catalog_manifest_path(self.portal_id), {}) or {}
+        for section in ("vod", "series_categories", "series"):
+            manifest.setdefault(section, {})
+        return manifest
+
+    def restore(self, record):
+        """
+        Continues a persisted job: restores its counters and queues its pending tasks.
+
+        Returns:
+            bool: True if there was work to resume.
+        """
+        tasks = [(getattr(self, name), args) for name, args in record.get("pending", []) if name in self.TASKS]
+        if not tasks:
+            return False
+        self.tasks_done = record.get("tasks_done", 0)
+        self.items = record.get("items", 0)
+        self.skipped = record.get("skipped", 0)
+        self.errors = record.get("errors", 0)
+        self.full = record.get("full", self.full)
+        self.images = record.get("images", self.images)
+        self.failed = record.get("failed", [])
+        self.previous_elapsed = record.get("elapsed", 0)
+        self.resumed = True
+        for task, args in tasks:
+            self.submit(task, *args)
+        logger.info(f"Resuming prefetch for portal {self.portal_name} with {len(tasks)} pending tasks")
+        return True
+
+    def submit(self, task, *args):
+        """
+        Queues a task, task(*args) is run by one of the workers.
+        """
+        with self.lock:
+            self.pending[(task.__name__,) + args] = [task.__name__, list(args)]
+        self.tasks.put((task, args))
+
+    def run(self, resume=True):
+        """
+        Runs the prefetch to completion. Blocks until every queued task is done.
+
+        Args:
+            resume (bool): Continue the portal's unfinished job record if there is one.
+        """
+        self.started = time.time()
+        logger.info(f"Starting content prefetch for portal {self.portal_name} ({self.portal_id}) with {self.workers} workers")
+        try:
+            macs = list(self.portal["macs"].keys())
+            if not macs:
+                logger.error(f"No MACs available for portal {self.portal_name}")
+                return
+
+            # The job record is restored before anything can fail, and only replaced once this run holds its tasks
+            record = load_prefetch_job(self.portal_id) if resume else None
+            if not (record and record.get("status") in ("running", "failed") and self.restore(record)):
+                self._queue_categories()
+            self.checkpoint()
+            self.recording = True
+
+            threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.workers)]
+            for thread in threads:
+                thread.start()
+            self.tasks.join()
+            for _ in threads:
+                self.tasks.put(None) # Stop the workers
+            if self.aborted:
+                self.finished = time.time()
+                self.checkpoint("failed") # Keeps the remaining tasks for a resume
+                return
+            self.prune()
+            self.finished = time.time()
+            self.checkpoint("completed")
+        except Exception as e:
+            logger.error(f"Error in prefetch for portal {self.portal_name}: {e}")
+            self.finished = self.finished or time.time()
+            if self.recording:
+                self.checkpoint("failed")
+            # Otherwise the previous job record is left as it was, so it can still be resumed
+        finally:
+            self.finished = self.finished or time.time()
+            stats = self.stats()
+            logger.info(f"Content prefetch completed for portal {self.portal_name} ({self.portal_id}): "
+                        f"{stats['items']} items in {stats['elapsed']}s ({stats['items_per_second']} items/s), "
+                        f"{stats['skipped']} unchanged, {stats['pruned']} pruned, {stats['errors']} errors")
+
+    def _worker(self):
+        with stb.requestPriority(stb.PRIORITY_BACKGROUND):
+            while True:
+                entry = self.tasks.get()
+                if entry is None:
+                    return
+                task, args = entry
+                if self.aborted:
+                    self.tasks.task_done() # Stays pending in the job record
+                    continue
+                completed = True
+                try:
+                    task(*args)
+                except PrefetchAbortedError as e:
+                    completed = False
+                    with self.lock:
+                        first = self.aborted is None
+                        self.aborted = str(e)
+                    if first:
+                        logger.error(f"Giving up prefetch for portal {self.portal_name}: {e}")
+                except Exception as e:
+                    with self.lock:
+                        self.errors += 1
+                        self.failed = (self.failed + [{"task": task.__name__, "args": list(args), "error": str(e)}])[-PREFETCH_MAX_FAILED:]
+                    logger.error(f"Error in prefetch task {task.__name__}{args}: {e}")
+                finally:
+                    if completed:
+                        with self.lock:
+                            self.pending.pop((task.__name__,) + args, None)
+                            self.tasks_done += 1
+                            self.run_tasks_done += 1
+                            done = self.tasks_done
+                        if done % PREFETCH_CHECKPOINT_INTERVAL == 0:
+                            self.checkpoint()
+                        if done % PREFETCH_LOG_INTERVAL == 0:
+                            stats = self.stats()
+                            logger.info(f"Prefetch {self.portal_name}: {stats['tasks_done']} tasks done, {stats['tasks_pending']} pending, {stats['items_per_second']} items/s")
+                    self.tasks.task_done()
+
+    def call(self, func, *args):
+        """
+        Runs an stb catalog call on a MAC from the portal's MAC pool, with that MAC's shared token.
+        A MAC that fails to authenticate is left out and the call moves on to another one.
+
+        Raises:
+            PrefetchAbortedError: If no MAC of the portal can authenticate.
+            TimeoutError: If no MAC became free within PREFETCH_MAC_TIMEOUT seconds.
+        """
+        while True:
+            if mac_pool.all_failed(self.portal_id, self.portal):
+                raise PrefetchAbortedError(f"No MAC of portal {self.portal_name} can authenticate")
+            try:
+                with mac_pool.acquire(self.portal_id, self.portal, timeout=PREFETCH_MAC_TIMEOUT) as mac:
+                    with self.lock:
+                        session = self.sessions.get(mac)
+                        if session is None:
+                            # Tokens may be bound to the client address, so each session keeps to its MAC's proxy
+                            session = MacSession(self.portal["url"], mac, getPortalProxy(self.portal, mac))
+                            self.sessions[mac] = session
+                    try:
+                        return session.call(func, *args)
+                    except stb.AuthenticationError:
+                        mac_pool.mark_failed(self.portal_id, mac) # Let the other MACs carry on
+                        logger.warning(f"Retrying {func.__name__} on another MAC of portal {self.portal_name}")
+            except TimeoutError:
+                if mac_pool.all_failed(self.portal_id, self.portal):
+                    continue # Raises above
+                raise
+
+    def _cached(self, count):
+        with self.lock:
+            self.items += count
+
+    def _unchanged(self, section, key, signature, cached):
+        """
+        Checks a signature against the manifest. Caller must hold the lock.
+        """
+        entry = self.manifest[section].get(key) or {}
+        return not self.full and entry.get("signature") == signature and cached
+
+    def _load_categories(self):
+        """Reads the category files saved with the portal. Returns (vod categories, series categories)."""
+        return load_portal_categories(self.portal_name)
+
+    def _queue_categories(self):
+        """Queues a task per category."""
+        vod_categories, series_categories = self._load_categories()
+        logger.info(f"Prefetching {len(vod_categories)} VOD and {len(series_categories)} Series categories for portal {self.portal_name}")
+        for category in vod_categories:
+            if category.get("id"):
+                self.submit(self.prefetch_vod_category, category.get("id"))
+        for category in series_categories:
+            if category.get("id"):
+                self.submit(self.prefetch_series_category, category.get("id"))
+
+    def prefetch_vod_category(self, category_id):
+        vod_items = self.call(stb.getOrderedList, "vod", category_id)
+
+        # Check if the response is valid
+        if not isinstance(vod_items, list):
+            logger.warning(f"Skipping VOD category {category_id}: invalid response")
+            return
+        if not vod_items:
+            # Emptied on the portal, its cached items are stale
+            with self.lock:
+                known = self.manifest["vod"].pop(category_id, None)
+            if known or catalog.has_items(self.portal_id, "vod", category_id):
+                catalog.delete_items(self.portal_id, "vod", category_id)
+                self._pruned(1)
+            logger.info(f"VOD category {category_id} is empty")
+            return
+
+        signature = catalogSignature(vod_items)
+        cached = catalog.has_items(self.portal_id, "vod", category_id)
+        with self.lock:
+            unchanged = self._unchanged("vod", category_id, signature, cached)
+            if unchanged:
+                self.skipped += 1
+        if unchanged:
+            self.prefetch_category_images("vod", category_id)
+            return
+
+        catalog.put_items(self.portal_id, "vod", category_id, vod_items)
+        self.prefetch_category_images("vod", category_id)
+        with self.lock:
+            self.manifest["vod"][category_id] = {"signature": signature}
+        self._cached(len(vod_items))
+        logger.debug(f"Cached {len(vod_items)} VOD items for category {category_id}")
+
+    def prefetch_series_category(self, category_id):
+        # First try with series type, then with vod type
+        series_items = self.call(stb.getOrderedList, "series", category_id)
+        if isinstance(series_items, str):
+            series_items = self.call(stb.getOrderedList, "vod", category_id)
+        if not isinstance(series_items, list):
+            series_items = []
+
+        # Filter to only include Series items
+        series_items = [item for item in series_items if isinstance(item, dict) and (
+            item.get("item_type") == "Series" or item.get("type") == "Series")]
+        if not series_items:
+            logger.warning(f"No Series items found for category {category_id}")
+            return
+
+        signature = catalogSignature(series_items)
+        cached = catalog.has_items(self.portal_id, "series", category_id)
+        with self.lock:
+            unchanged = self._unchanged("series_categories", category_id, signature, cached)
+            if unchanged:
+                self.skipped += 1
+        if not unchanged:
+            catalog.put_items(self.portal_id, "series", category_id, series_items)
+            self._cached(len(series_items))
+            logger.debug(f"Cached {len(series_items)} Series items for category {category_id}")
+            with self.lock:
+                self.manifest["series_categories"][category_id] = {
+                    "signature": signature,
+                    "series": [str(series.get("id")) for series in series_items if series.get("id")],
+                }
+        self.prefetch_category_images("series", category_id)
+
+        # Walk only series that are new or whose listing entry changed. The series hashes are checked
+        # even in an unchanged category: a series is only recorded once its seasons were listed,
+        # so series that failed in an earlier run are picked up again.
+        queued = []
+        with self.lock:
+            for series in series_items:
+                series_id = series.get("id")
+                if not series_id:
+                    continue
+                series_hash = catalogSignature([series])["hash"]
+                known = self.manifest["series"].get(str(series_id)) or {}
+                if self.full or known.get("hash") != series_hash:
+                    queued.append((series_id, series_hash))
+                else:
+                    self.skipped += 1
+        for series_id, series_hash in queued:
+            self.submit(self.prefetch_series, series_id, series_hash)
+
+    def prefetch_series(self, series_id, series_hash=None):
+        seasons = self.call(stb.getSeriesSeasons, series_id)
+
+        # Check if the response is valid
+        if not isinstance(seasons, list):
+            logger.warning(f"Skipping seasons for series {series_id}: invalid response")
+            return
+
+        catalog.put_seasons(self.portal_id, series_id, seasons)
+        self._cached(len(seasons))
+
+        # The series hash is recorded once the episodes of every season are cached, so a
+        # series with a failed or empty season is walked again by the next refresh
+        season_ids = [str(season.get("id")) for season in seasons if season.get("id")]
+        with self.lock:
+            known = self.manifest["series"].get(str(series_id)) or {}
+            removed = [season_id for season_id in known.get("seasons", []) if season_id not in season_ids]
+            self.manifest["series"][str(series_id)] = {"hash": None, "seasons": season_ids}
+            if season_ids:
+                self.series_walks[str(series_id)] = [series_hash, set(season_ids), True]
+        for season_id in removed:
+            catalog.delete_episodes(self.portal_id, series_id, season_id)
+        self._pruned(len(removed))
+
+        for season_id in season_ids:
+            self.submit(self.prefetch_season, series_id, season_id)
+
+    def prefetch_season(self, series_id, season_id):
+        episodes = self.call(stb.getSeasonEpisodes, series_id, season_id)
+
+        # Check if the response is valid
+        if not isinstance(episodes, list):
+            logger.warning(f"Skipping episodes for season {season_id}: invalid response")
+            self._season_walked(series_id, season_id, False)
+            return
+        if not episodes:
+            logger.warning(f"No episodes found for season {season_id}")
+            catalog.delete_episodes(self.portal_id, series_id, season_id) # Stale episodes of an emptied season
+            self._season_walked(series_id, season_id, False)
+            return
+
+        catalog.put_episodes(self.portal_id, series_id, season_id, episodes)
+        self._cached(len(episodes))
+        self._season_walked(series_id, season_id, True)
+
+    def _season_walked(self, series_id, season_id, cached):
+        """
+        Records the hash of a series once all its seasons are walked, if all were cached.
+        """
+        with self.lock:
+            walk = self.series_walks.get(str(series_id))
+            if walk is None:
+                return # Restored task of an earlier run, the series is walked again next time
+            series_hash, seasons_left, all_cached = walk
+            seasons_left.discard(str(season_id))
+            walk[2] = all_cached and cached
+            if seasons_left:
+                return
+            del self.series_walks[str(series_id)]
+            if walk[2] and str(series_id) in self.manifest["series"]:
+                self.manifest["series"][str(series_id)]["hash"] = series_hash
+
+    def _pruned(self, count):
+        with self.lock:
+            self.pruned += count
+
+    def prefetch_category_images(self, kind, category_id):
+        """Queues warming the image cache with a category's posters, if enabled."""
+        if self.images:
+            self.submit(self.prefetch_images, kind, category_id)
+
+    def prefetch_images(self, kind, category_id):
+        # Collect the posters first, downloads are slow and shouldn't hold a catalog cursor open
+        sources = []
+        for item in catalog.iter_items(self.portal_id, kind, category_id):
+            src = item.get("screenshot_uri") or item.get("poster_path") or item.get("cover_big")
+            src = portalImageUrl(self.portal, src) if isinstance(src, str) else None
+            if src:
+                sources.append(src)
+
+        proxy = getPortalProxy(self.portal, background=True)
+        cached = 0
+        for src in sources:
+            if image_cache.get(src, PREFETCH_IMAGE_SIZE, proxy):
+                cached += 1
+        with self.lock:
+            self.images_cached += cached
+        logger.debug(f"Cached {cached} of {len(sources)} {kind} posters for category {category_id}")
+
+    def prune(self):
+        """
+        Removes cached content of categories that no longer exist on the portal and
+        of series no longer listed in any category.
+        """
+        vod_categories, series_categories = self._load_categories()
+        if not vod_categories and not series_categories:
+            return # Never prune against a missing category list
+        vod_ids = {str(category.get("id")) for category in vod_categories}
+        series_category_ids = {str(category.get("id")) for category in series_categories}
+
+        with self.lock:
+            removed_vod = [category_id for category_id in self.manifest["vod"] if str(category_id) not in vod_ids]
+            removed_categories = [category_id for category_id in self.manifest["series_categories"] if str(category_id) not in series_category_ids]
+            for category_id in removed_vod:
+                del self.manifest["vod"][category_id]
+            for category_id in removed_categories:
+                del self.manifest["series_categories"][category_id]
+
+            listed = set()
+            for entry in self.manifest["series_categories"].values():
+                listed.update(entry.get("series", []))
+            removed_series = {series_id: entry for series_id, entry in self.manifest["series"].items() if series_id not in listed}
+            for series_id in removed_series:
+                del self.manifest["series"][series_id]
+
+        for category_id in removed_vod:
+            catalog.delete_items(self.portal_id, "vod", category_id)
+        for category_id in removed_categories:
+            catalog.delete_items(self.portal_id, "series", category_id)
+        for series_id in removed_series:
+            catalog.delete_series(self.portal_id, series_id)
+        self._pruned(len(removed_vod) + len(removed_categories) + len(removed_series))
+
+        if removed_vod or removed_categories or removed_series:
+            logger.info(f"Pruned {len(removed_vod) + len(removed_categories)} categories and {len(removed_series)} series from portal {self.portal_name}")
+
+def startPrefetch(portal_id, resume=True, full=False, images=False):
+    """
+    Starts a PrefetchEngine for a portal in a background thread.
+
+    Args:
+        portal_id (str): ID of the portal.
+        resume (bool): Continue the portal's unfinished job if there is one.
+        full (bool): Walk the whole catalog, not only what changed since the last run.
+        images (bool): Also cache the posters of every category in the image cache.
+
+    Returns:
+        PrefetchEngine: The started engine, or None if a prefetch is already running.
+    """
+    with prefetch_jobs_lock:
+        running = prefetch_jobs.get(portal_id)
+        if running and running.stats()["running"]:
+            return None
+        engine = PrefetchEngine(portal_id, getPortals()[portal_id], full=full, images=images)
+        prefetch_jobs[portal_id] = engine
+
+    # Start the engine in a background thread
+    prefetch_thread = threading.Thread(target=engine.run, args=(resume,))
+    prefetch_thread.daemon = True  # Allow the thread to be terminated when the main program exits
+    prefetch_thread.start()
+    return engine
+
+def resumePrefetchJobs():
+    """
+    Restarts the prefetch jobs that were still running when the application stopped.
+    """
+    for portal_id, portal in getPortals().items():
+        record = load_prefetch_job(portal_id)
+        if record and record.get("status") == "running" and portal.get("enabled") == "true":
+            logger.info(f"Resuming interrupted prefetch for portal {portal.get('name')} ({portal_id})")
+            startPrefetch(portal_id)
+
+@app.route("/api/portal/<portalId>/prefetch", methods=["POST"])
+@authorise
+def prefetchPortalContent(portalId):
+    """
+    Prefetches and caches all content for a portal (VODs, Series, Seasons, Episodes).
+    This is a long-running operation that runs in the background on a PrefetchEngine.
+    An interrupted prefetch is resumed unless ?restart=true is given. Only changed
+    categories and new series are walked unless ?full=true is given. With ?images=true
+    the posters are cached in the image cache as well.
+
+    Args:
+        portalId (str): ID of the portal.
+
+    Returns:
+        JSON: Status message.
+    """
+    portals = getPortals()
+    if portalId not in portals:
+        return jsonify({"error": "Portal not found"}), 404
+
+    portal_name = portals[portalId].get("name")
+    restart = request.args.get("restart", "false").lower() == "true"
+    full = request.args.get("full", "false").lower() == "true"
+    images = request.args.get("images", "false").lower() == "true"
+
+    engine = startPrefetch(portalId, resume=not restart, full=full, images=images)
+    if not engine:
+        return jsonify({"error": f"Prefetch already running for portal {portal_name}", "stats": prefetch_jobs[portalId].stats()}), 409
+
+    return jsonify({
+        "status": "success",
+        "message": f"Started prefetching content for portal {portal_name} ({portalId}) with {engine.workers} workers. This process runs in the background and may take a while to complete."
+    })
+
+@app.route("/api/portal/<portalId>/prefetch/status", methods=["GET"])
+@authorise
+def prefetchPortalStatus(portalId):
+    """
+    Returns the progress of a portal's prefetch job: task counts, items, throughput and ETA.
+
+    Args:
+        portalId (str): ID of the portal.
+
+    Returns:
+        JSON: Job status, or 404 if the portal was never prefetched.
+    """
+    if portalId not in getPortals():
+        return jsonify({"error": "Portal not found"}), 404
+
+    engine = prefetch_jobs.get(portalId)
+    record = load_prefetch_job(portalId)
+    if engine:
+        status = engine.stats()
+        status["status"] = "running" if status["running"] else (record or {}).get("status", "completed")
+    elif record:
+        # Job from an earlier run of the application
+        elapsed = record.get("elapsed", 0)
+        status = {
+            "status": record.get("status"),
+            "running": False,
+            "tasks_done": record.get("tasks_done", 0),
+            "tasks_pending": len(record.get("pending", [])),
+            "tasks_failed": record.get("errors", 0),
+            "items": record.get("items", 0),
+            "errors": record.get("errors", 0),
+            "elapsed": round(elapsed, 1),
+            "items_per_second": round(record.get("items", 0) / elapsed, 2) if elapsed else 0.0,
+            "eta": None,
+        }
+    else:
+        return jsonify({"error": "No prefetch job for this portal"}), 404
+
+    status["macs"] = mac_pool.stats(portalId, getPortals()[portalId]) # Catalog and live load per MAC
+    status["failed"] = (record or {}).get("failed", [])[-10:] # Most recent failures
+    status["updated"] = (record or {}).get("updated")
+    return jsonify(status)
+
+@app.route("/portals/<portalId>/prefetch", methods=["GET"])
+@authorise
+def prefetchPortalUI(portalId):
+    """
+    Renders a simple UI for prefetching content for a portal.
+
+    Args:
+        portalId (str): ID of the portal.
+
+    Returns:
+        Response: Rendered HTML template.
+    """
+    portals = getPortals()
+    if portalId not in portals:
+        flash("Portal not found", "danger")
+        return redirect("/portals", code=302)
+
+    portal = portals[portalId]
+
+    return render_template("prefetch.html", portal=portal, portalId=portalId)
+
+#endregion
+
+@app.route("/portal/<portalId>/channels", methods=["GET"])
+@authorise
+def portalChannels(portalId):
     """
     Renders the channels.html template for a specific portal.
 
-    Args:
-        portalId (str): ID of the portal.
+    Args:
+        portalId (str): ID of the portal.
+
+    Returns:
+        Response: Rendered HTML template with channels data.
+    """
+    portals = getPortals()
+    if portalId not in portals:
+        flash("Portal not found", "danger")
+        return redirect("/portals", code=302)
+
+    portal = portals[portalId]
+    portal_name = portal.get("name")
+
+    try:
+        # Load channels from file
+        channels_path = os.path.join(parent_folder, f"{portal_name}.json")
+        channels = []
+        if os.path.exists(channels_path):
+            with open(channels_path, 'r') as file:
+                channels = json.load(file)
+
+        # Load genres from file
+        genres_path = os.path.join(parent_folder, f"{portal_name}_genres.json")
+        genres = []
+        if os.path.exists(genres_path):
+            with open(genres_path, 'r') as file:
+                genres = json.load(file)
+
+        # Get channel groups
+        channel_groups = getChannelGroups()
+
+        return render_template("channels.html",
+                              portal=portal,
+                              portalId=portalId,
+                              channels=channels,
+                              genres=genres,
+                              channel_groups=channel_groups)
+    except Exception as e:
+        logger.error(f"Error loading channels for portal {portal_name}: {e}")
+        flash(f"Error loading channels: {str(e)}", "danger")
+        return redirect("/portals", code=302)
+
+#endregion
+
+# region Playlist Generation Functions
+
+# Upper bound on concurrent link requests per playlist export, the portal's "max concurrent requests" applies below it
+LINK_RESOLVE_MAX_WORKERS = 8
+# Links resolved ahead of the playlist line being written, per worker
+LINK_RESOLVE_WINDOW = 4
+
+class LinkResolver:
+    """
+    Resolves direct stream links for many VOD items or episodes concurrently.
+
+    All workers share one MacSession, so the export performs a single handshake and
+    only refreshes the token when the portal rejects it. Requests go through the
+    portal's stb scheduler at background priority: the export runs as fast as the
+    portal's request budget allows without delaying live playback.
+    """
+    def __init__(self, portal, mac, proxy=None):
+        try:
+            allowed = int(portal.get("max concurrent requests", defaultPortal["max concurrent requests"]))
+        except (TypeError, ValueError):
+            allowed = int(defaultPortal["max concurrent requests"])
+        self.workers = max(1, min(LINK_RESOLVE_MAX_WORKERS, allowed))
+        self.session = MacSession(portal["url"], mac, proxy)
+        self.lock = Lock()
+        self.resolved = 0
+        self.failed = 0
+
+    def _resolve(self, item_id, content_type, series_info):
+        with stb.requestPriority(stb.PRIORITY_BACKGROUND):
+            try:
+                link = self.session.call(lambda url, mac, token, proxy: stb.getVodSeriesLink(url, mac, token, item_id, content_type, series_info, proxy=proxy))
+            except Exception as e:
+                logger.warning(f"Error resolving link for {content_type} {item_id}: {e}")
+                link = None
+        with self.lock:
+            if link:
+                self.resolved += 1
+            else:
+                self.failed += 1
+        return link
+
+    def resolve(self, entries):
+        """
+        Resolves the links of playlist entries, in order, as soon as each is available.
+
+        Args:
+            entries (iterable): (payload, link) pairs. A link given as an
+                (item ID, content type, series info) tuple is resolved, any other
+                link is passed through unchanged.
+
+        Yields:
+            tuple: (payload, link, resolved link or None) in the order of the entries.
+        """
+        window = deque()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="link-resolver") as executor:
+            try:
+                for payload, link in entries:
+                    future = executor.submit(self._resolve, *link) if isinstance(link, tuple) else None
+                    window.append((payload, link, future))
+                    # Keep a bounded number of links in flight ahead of the output
+                    while len(window) > self.workers * LINK_RESOLVE_WINDOW or (window and window[0][2] is None):
+                        payload, link, future = window.popleft()
+                        yield payload, link, future.result() if future else link
+                while window:
+                    payload, link, future = window.popleft()
+                    yield payload, link, future.result() if future else link
+            finally:
+                # The client went away: do not resolve links nobody will read
+                for _, _, future in window:
+                    if future:
+                        future.cancel()
+
+def playlistLines(header, entries, resolver=None, progress=None):
+    """
+    Generates an M3U playlist, streaming each entry out as soon as its link is known.
+
+    Args:
+        header (str): Playlist lines before the first entry.
+        entries (list): (info lines, link) pairs. The link is a URL, None for lines
+            without a stream, or an (item ID, content type, series info) tuple for
+            the resolver to turn into a direct link.
+        resolver (LinkResolver, optional): Resolver for direct links.
+        progress (callable, optional): Called once for every entry processed.
+
+    Yields:
+        str: Playlist text.
+    """
+    yield header
+    if resolver:
+        resolved = resolver.resolve(entries)
+    else:
+        resolved = ((lines, link, link) for lines, link in entries)
+
+    for lines, link, stream_link in resolved:
+        if progress:
+            progress()
+        if isinstance(link, tuple) and not stream_link:
+            logger.warning(f"Failed to get direct stream link for {link[1]} {link[0]} - skipping")
+            continue
+        yield lines + (f"{stream_link}\n" if stream_link else "")
+
+    if resolver:
+        logger.info(f"Playlist links resolved: {resolver.resolved} ok, {resolver.failed} failed")
+
+class PlaylistError(Exception):
+    """
+    A playlist request that cannot be served, with the HTTP status to answer with.
+    """
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def playlistResponse(playlist):
+    """
+    Streams a prepared playlist as an M3U download.
+
+    Args:
+        playlist (dict): Playlist from prepareMoviesPlaylist() or prepareSeriesPlaylist().
+
+    Returns:
+        Response: Streaming M3U response.
+    """
+    response = Response(playlistLines(playlist["header"], playlist["entries"], playlist["resolver"]))
+    response.headers["Content-Type"] = "audio/x-mpegurl"
+    response.headers["Content-Disposition"] = f'attachment; filename="{playlist["name"].replace(" ", "_")}.m3u"'
+    return response
+
+def prepareMoviesPlaylist(data, server_address):
+    """
+    Builds the entries of an M3U playlist of selected movies.
+
+    Args:
+        data (dict): Request data, see create_movies_playlist().
+        server_address (str): Base URL of this server, for app links.
+
+    Returns:
+        dict: Playlist name, header, entries and the LinkResolver for direct links (or None).
+
+    Raises:
+        PlaylistError: If the request is invalid or the portal cannot be used.
+    """
+    if not data:
+        raise PlaylistError("Missing request data", 400)
+
+    portal_id = data.get("portalId")
+    movie_ids = data.get("movieIds", [])
+    playlist_name = data.get("playlistName", "Movies Playlist")
+    include_metadata = data.get("includeMetadata", True)
+    use_direct_links = data.get("useDirectLinks", False) # App links are resolved on play and never expire
+    xui_compatible = data.get("xuiCompatible", False)
+
+    if not portal_id:
+        raise PlaylistError("Missing portal ID", 400)
+
+    if not movie_ids:
+        raise PlaylistError("No movies selected", 400)
+
+    # Get portal details
+    portals = getPortals()
+    if portal_id not in portals:
+        raise PlaylistError("Portal not found", 404)
+
+    portal = portals[portal_id]
+    portal_name = portal.get("name", "Unknown Portal")
+
+    # Get available MACs for the portal
+    macs = list(portal["macs"].keys())
+    if not macs:
+        logger.error(f"No MACs available for portal {portal_id}")
+        raise PlaylistError("No MACs available for the portal", 400)
+
+    # Spread catalog requests across the portal's MACs
+    mac = mac_pool.pick(portal_id, portal) # Least busy MAC not needed for live streams
+    proxy = getPortalProxy(portal, mac)
+
+    # Direct links are resolved concurrently while the playlist streams out
+    resolver = None
+    if use_direct_links:
+        resolver = LinkResolver(portal, mac, proxy)
+        try:
+            resolver.session.get_token() # Authenticate once, before the response starts
+        except stb.AuthenticationError:
+            logger.error(f"Failed to authenticate with portal {portal_id}")
+            raise PlaylistError("Failed to authenticate with portal", 500)
+
+    # Start building the playlist
+    playlist_content = "#EXTM3U\n"
+
+    # Add playlist info if metadata is enabled and not XUI compatible format
+    if include_metadata and not xui_compatible:
+        playlist_content += f'#PLAYLIST:{playlist_name}\n'
+
+    # Look up only the selected movies through the catalog's id index
+    fixed_movies = {}
+    try:
+        selected_movies = lookup_cached_items(portal_id, portal_name, "vod", movie_ids)
+        for movie_id, movie in selected_movies.items():
+            fixed_movies[movie_id] = movie # Image URLs were made absolute when stored
+    except Exception as e:
+        logger.warning(f"Error loading cached movie details: {e}")
+
+    # Add each movie to the playlist
+    entries = [] # (playlist lines, stream link)
+    for movie_id in movie_ids:
+        try:
+            entry = ""
+            if use_direct_links:
+                # Direct stream URL, resolved by the LinkResolver (this replaces the internal app URL)
+                stream_link = (movie_id, "vod", None)
+            else:
+                # Use application URL with from_playlist parameter
+                stream_link = f"{server_address}/play/vod/{portal_id}/{movie_id}?from_playlist=true"
+
+            # Get movie details if available
+            movie = fixed_movies.get(str(movie_id), {})
+            movie_name = movie.get("name", movie.get("o_name", f"Movie {movie_id}"))
+
+            # Add extended info
+            if xui_compatible:
+                # XUI One Panel compatible format
+                # Format: #EXTINF:-1 tvg-id="MovieName.movie" tvg-logo="http://example.com/logo.jpg" group-title="Playlist Name",Movie Name
+
+                # Create a safe tvg-id (alphanumeric and dots only)
+                tvg_id = f"{movie_name.replace(' ', '')}.movie"
+                tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+
+                # Get logo URL
+                logo = movie.get("screenshot_uri", movie.get("poster_path", movie.get("cover_big", "")))
+                logo_attr = f' tvg-logo="{logo}"' if logo else ""
+
+                # Add all metadata as attributes in the EXTINF line
+                entry += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{movie_name}\n'
+
+            elif include_metadata:
+                # Traditional extended M3U format with separate tags
+                duration = movie.get("duration", -1)
+                if duration and not isinstance(duration, int):
+                    try:
+                        duration = int(duration)
+                    except (ValueError, TypeError):
+                        duration = -1
+
+                # Use default -1 for unknown duration
+                entry += f'#EXTINF:{duration},{movie_name}\n'
+
+                # Add logo if available - ensure it has absolute URL
+                logo = movie.get("screenshot_uri", movie.get("poster_path", movie.get("cover_big", "")))
+                if logo:
+                    # Logo should already be fixed by fix_screenshot_urls
+                    entry += f'#EXTLOGO:{logo}\n'
+
+                # Add genre if available
+                genre = movie.get("genre", "")
+                if genre:
+                    entry += f'#EXTGENRE:{genre}\n'
+
+                # Add description if available
+                description = movie.get("description", movie.get("plot", ""))
+                if description:
+                    # Limit description length
+                    if len(description) > 500:
+                        description = description[:497] + "..."
+                    entry += f'#EXTDESCRIPTION:{description}\n'
+            else:
+                # Simple format without extended metadata
+                entry += f'#EXTINF:-1,{movie_name}\n'
+
+            # Add the stream URL
+            entries.append((entry, stream_link))
+        except Exception as e:
+            logger.warning(f"Error processing movie {movie_id}: {str(e)}")
+            continue
+
+    return {"name": playlist_name, "header": playlist_content, "entries": entries, "resolver": resolver}
+
+
+@app.route("/api/playlist/movies", methods=["POST"])
+@authorise
+def create_movies_playlist():
+    """
+    Creates an M3U playlist from selected movies.
+
+    Expects JSON with:
+    - portalId (str): Portal ID
+    - movieIds (list): List of movie IDs to include in the playlist
+    - playlistName (str): Name for the playlist
+    - includeMetadata (bool): Whether to include extended metadata in the playlist
+    - useDirectLinks (bool, optional): Whether to bake in direct stream links, which expire (default: false)
+    - xuiCompatible (bool, optional): Whether to format the playlist for XUI One Panel compatibility (default: false)
+
+    Returns:
+        M3U playlist file for download
+    """
+    try:
+        playlist = prepareMoviesPlaylist(request.json, request.host_url.rstrip('/'))
+        return playlistResponse(playlist)
+    except PlaylistError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error creating movie playlist: {e}")
+        return jsonify({"error": f"Error creating playlist: {str(e)}"}), 500
+
+def prepareSeriesPlaylist(data, server_address):
+    """
+    Builds the entries of an M3U playlist of selected series or their episodes.
+
+    Args:
+        data (dict): Request data, see create_series_playlist().
+        server_address (str): Base URL of this server, for app links.
+
+    Returns:
+        dict: Playlist name, header, entries and the LinkResolver for direct links (or None).
+
+    Raises:
+        PlaylistError: If the request is invalid or the portal cannot be used.
+    """
+    if not data:
+        raise PlaylistError("Missing request data", 400)
+
+    portal_id = data.get("portalId")
+    series_ids = data.get("seriesIds", [])
+    playlist_name = data.get("playlistName", "Series Playlist")
+    include_metadata = data.get("includeMetadata", True)
+    include_episodes = data.get("includeEpisodes", False)
+    use_direct_links = data.get("useDirectLinks", False) # App links are resolved on play and never expire
+    xui_compatible = data.get("xuiCompatible", False)
+
+    if not portal_id:
+        raise PlaylistError("Missing portal ID", 400)
+
+    if not series_ids:
+        raise PlaylistError("No series selected", 400)
+
+    # Get portal details
+    portals = getPortals()
+    if portal_id not in portals:
+        raise PlaylistError("Portal not found", 404)
+
+    portal = portals[portal_id]
+    portal_name = portal.get("name", "Unknown Portal")
+
+    # Get available MACs for the portal
+    macs = list(portal["macs"].keys())
+    if not macs:
+        logger.error(f"No MACs available for portal {portal_id}")
+        raise PlaylistError("No MACs available for the portal", 400)
+
+    # Spread catalog requests across the portal's MACs
+    mac = mac_pool.pick(portal_id, portal) # Least busy MAC not needed for live streams
+    proxy = getPortalProxy(portal, mac)
+
+    # Direct links are resolved concurrently while the playlist streams out
+    resolver = None
+    if use_direct_links:
+        resolver = LinkResolver(portal, mac, proxy)
+        try:
+            resolver.session.get_token() # Authenticate once, before the response starts
+        except stb.AuthenticationError:
+            logger.error(f"Failed to authenticate with portal {portal_id}")
+            raise PlaylistError("Failed to authenticate with portal", 500)
+
+    # Start building the playlist
+    playlist_content = "#EXTM3U\n"
+
+    # Add playlist info if metadata is enabled and not XUI compatible format
+    if include_metadata and not xui_compatible:
+        playlist_content += f'#PLAYLIST:{playlist_name}\n'
+
+    # Look up only the selected series through the catalog's id index
+    fixed_series = {}
+    try:
+        selected_series = lookup_cached_items(portal_id, portal_name, "series", series_ids)
+        for series_id, series in selected_series.items():
+            fixed_series[series_id] = series # Image URLs were made absolute when stored
+    except Exception as e:
+        logger.warning(f"Error loading cached series details: {e}")
+
+    # Add each series to the playlist
+    entries = [] # (playlist lines, stream link)
+    for series_id in series_ids:
+        # Get series details if available
+        series = fixed_series.get(str(series_id), {})
+        series_name = series.get("name", series.get("o_name", f"Series {series_id}"))
+
+        if include_episodes and include_metadata:
+            # Try to load seasons
+            try:
+                seasons = catalog.get_seasons(portal_id, series_id)
+                if seasons:
+                    # Add each season and episode
+                    for season in seasons:
+                        season_id = season.get("id")
+                        season_name = season.get("name", f"Season {season.get('season_number', '?')}")
+
+                        # Add season header as a comment (if not XUI compatible)
+                        if not xui_compatible:
+                            entries.append((f'#EXTGRP:{series_name} - {season_name}\n', None))
+
+                        # Get episodes
+                        episodes = catalog.get_episodes(portal_id, series_id, season_id)
+                        if episodes:
+                            # Add each episode
+                            for episode in episodes:
+                                episode_id = episode.get("id")
+                                if not episode_id:
+                                    continue
+
+                                try:
+                                    entry = ""
+                                    if use_direct_links:
+                                        # Direct stream link for the episode, resolved by the LinkResolver
+                                        stream_link = (episode_id, "episode", {"series_id": series_id, "season_id": season_id})
+                                    else:
+                                        # Use application URL with from_playlist parameter
+                                        stream_link = f"{server_address}/play/series/{portal_id}/{series_id}/{season_id}/{episode_id}?from_playlist=true"
+
+                                    episode_name = episode.get("name", episode.get("title", ""))
+                                    episode_number = episode.get("episode_number", "?")
+                                    full_name = f"{series_name} - S{season.get('season_number', '?')}E{episode_number}: {episode_name}"
+
+                                    if xui_compatible:
+                                        # Create a safe tvg-id
+                                        tvg_id = f"{series_name.replace(' ', '')}.S{season.get('season_number', '0')}E{episode_number}"
+                                        tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+
+                                        # Get logo URL
+                                        logo = episode.get("screenshot_uri", episode.get("poster_path", ""))
+                                        logo_attr = f' tvg-logo="{logo}"' if logo else ""
+
+                                        # Add all metadata as attributes in the EXTINF line
+                                        entry += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{full_name}\n'
+                                    else:
+                                        # Traditional extended M3U format
+                                        # Add extended info
+                                        duration = episode.get("duration", -1)
+                                        if duration and not isinstance(duration, int):
+                                            try:
+                                                duration = int(duration)
+                                            except (ValueError, TypeError):
+                                                duration = -1
+
+                                        entry += f'#EXTINF:{duration},{full_name}\n'
+
+                                        # Add logo if available
+                                        logo = episode.get("screenshot_uri", episode.get("poster_path", ""))
+                                        if logo:
+                                            # Logo should already be fixed by fix_screenshot_urls
+                                            entry += f'#EXTLOGO:{logo}\n'
+
+                                        # Add description if available
+                                        description = episode.get("description", episode.get("plot", ""))
+                                        if description:
+                                            # Limit description length
+                                            if len(description) > 500:
+                                                description = description[:497] + "..."
+                                            entry += f'#EXTDESCRIPTION:{description}\n'
+
+                                    # Add the stream URL
+                                    entries.append((entry, stream_link))
+                                except Exception as e:
+                                    logger.warning(f"Error processing episode {episode_id}: {str(e)}")
+                                    continue
+            except Exception as e:
+                logger.warning(f"Error including episodes for series {series_id}: {e}")
+                try:
+                    # Fall back to series-only link if episodes fail
+                    entry = ""
+                    if use_direct_links:
+                        # Direct stream link for the series, resolved by the LinkResolver
+                        stream_link = (series_id, "series", None)
+                    else:
+                        # Use application URL with from_playlist parameter
+                        stream_link = f"{server_address}/play/series/{portal_id}/{series_id}?from_playlist=true"
+
+                    if xui_compatible:
+                        # Create a safe tvg-id
+                        tvg_id = f"{series_name.replace(' ', '')}.series"
+                        tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+
+                        # Get logo URL
+                        logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
+                        logo_attr = f' tvg-logo="{logo}"' if logo else ""
+
+                        # Add all metadata as attributes in the EXTINF line
+                        entry += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{series_name}\n'
+                    else:
+                        # Traditional extended M3U format
+                        # Add extended info
+                        entry += f'#EXTINF:-1,{series_name}\n'
+
+                        # Add logo if available - already fixed in fixed_series
+                        logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
+                        if logo:
+                            entry += f'#EXTLOGO:{logo}\n'
+
+                        # Add description if available
+                        description = series.get("description", series.get("plot", ""))
+                        if description:
+                            # Limit description length
+                            if len(description) > 500:
+                                description = description[:497] + "..."
+                            entry += f'#EXTDESCRIPTION:{description}\n'
+
+                    # Add the stream URL
+                    entries.append((entry, stream_link))
+                except Exception as e:
+                    logger.warning(f"Error processing series {series_id}: {str(e)}")
+                    continue
+        else:
+            try:
+                # Just add the series link
+                entry = ""
+                if use_direct_links:
+                    # Direct stream link for the series, resolved by the LinkResolver
+                    stream_link = (series_id, "series", None)
+                else:
+                    # Use application URL with from_playlist parameter
+                    stream_link = f"{server_address}/play/series/{portal_id}/{series_id}?from_playlist=true"
+
+                # XUI compatible format
+                if xui_compatible:
+                    # Create a safe tvg-id
+                    tvg_id = f"{series_name.replace(' ', '')}.series"
+                    tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+
+                    # Get logo URL
+                    logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
+                    logo_attr = f' tvg-logo="{logo}"' if logo else ""
+
+                    # Add all metadata as attributes in the EXTINF line
+                    entry += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{series_name}\n'
+                # Add extended info if metadata is enabled
+                elif include_metadata:
+                    entry += f'#EXTINF:-1,{series_name}\n'
+
+                    # Add logo if available - already fixed in fixed_series
+                    logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
+                    if logo:
+                        entry += f'#EXTLOGO:{logo}\n'
+
+                    # Add genre if available
+                    genre = series.get("genre", "")
+                    if genre:
+                        entry += f'#EXTGENRE:{genre}\n'
+
+                    # Add description if available
+                    description = series.get("description", series.get("plot", ""))
+                    if description:
+                        # Limit description length
+                        if len(description) > 500:
+                            description = description[:497] + "..."
+                        entry += f'#EXTDESCRIPTION:{description}\n'
+                else:
+                    # Simple format without extended metadata
+                    entry += f'#EXTINF:-1,{series_name}\n'
+
+                # Add the stream URL
+                entries.append((entry, stream_link))
+            except Exception as e:
+                logger.warning(f"Error processing series {series_id}: {str(e)}")
+                continue
+
+    return {"name": playlist_name, "header": playlist_content, "entries": entries, "resolver": resolver}
+
+
+@app.route("/api/playlist/series", methods=["POST"])
+@authorise
+def create_series_playlist():
+    """
+    Creates an M3U playlist from selected series episodes.
+
+    Expects JSON with:
+    - portalId (str): Portal ID
+    - seriesIds (list): List of series IDs to include
+    - playlistName (str): Name for the playlist
+    - includeMetadata (bool): Whether to include extended metadata in the playlist
+    - includeEpisodes (bool, optional): Whether to include individual episodes (default: False)
+    - useDirectLinks (bool, optional): Whether to bake in direct stream links, which expire (default: false)
+    - xuiCompatible (bool, optional): Whether to format the playlist for XUI One Panel compatibility (default: false)
+
+    Returns:
+        M3U playlist file for download
+    """
+    try:
+        playlist = prepareSeriesPlaylist(request.json, request.host_url.rstrip('/'))
+        return playlistResponse(playlist)
+    except PlaylistError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error creating series playlist: {e}")
+        return jsonify({"error": f"Error creating playlist: {str(e)}"}), 500
+
+# Finished playlist exports are kept on disk, and reused by identical exports, for this many seconds
+EXPORT_RETENTION = 24 * 3600
+exports_folder = os.path.join(content_folder, "exports")
+
+class ExportJob:
+    """
+    A playlist export running in the background, writing its result to a file.
+    """
+    def __init__(self, job_id, kind, key, name, link_lifetime=None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key # Identifies identical exports
+        self.name = name
+        self.link_lifetime = link_lifetime # Seconds the baked-in direct links stay valid, None for app links
+        self.status = "queued" # queued, running, completed, failed or cancelled
+        self.total = 0 # Playlist entries
+        self.done = 0
+        self.size = 0
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.cancelled = threading.Event()
+
+    @property
+    def result_path(self):
+        return os.path.join(exports_folder, f"{self.id}.m3u")
+
+    @property
+    def record_path(self):
+        return os.path.join(exports_folder, f"{self.id}.json")
+
+    @property
+    def expired(self):
+        return self.finished is not None and time.time() - self.finished > EXPORT_RETENTION
+
+    @property
+    def reusable(self):
+        """
+        Whether an identical export may be answered with this job. Exports with direct
+        links are only reused while their first links are still valid.
+        """
+        if self.status not in ("queued", "running", "completed"):
+            return False
+        return self.link_lifetime is None or time.time() - self.created < self.link_lifetime
+
+    def _advance(self):
+        self.done += 1
+
+    def run(self, playlist):
+        """
+        Writes the playlist to the result file. Runs in the job's thread.
+
+        Args:
+            playlist (dict): Prepared playlist (header, entries and resolver).
+        """
+        self.status = "running"
+        temp_path = self.result_path + ".tmp"
+        lines = playlistLines(playlist["header"], playlist["entries"], playlist["resolver"], progress=self._advance)
+        try:
+            os.makedirs(exports_folder, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for text in lines:
+                    if self.cancelled.is_set():
+                        break
+                    f.write(text)
+            if self.cancelled.is_set():
+                os.remove(temp_path)
+                self.status = "cancelled"
+            else:
+                os.replace(temp_path, self.result_path)
+                self.size = os.path.getsize(self.result_path)
+                self.status = "completed"
+        except Exception as e:
+            logger.error(f"Error exporting playlist {self.name}: {e}")
+            self.status = "failed"
+            self.error = str(e)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+        finally:
+            lines.close() # Stops link resolution still in flight
+            self.finished = time.time()
+
+        logger.info(f"Playlist export {self.id} ({self.name}) {self.status}: {self.done}/{self.total} entries")
+        if self.status == "completed":
+            write_atomic(self.record_path, dumps_compact(self.to_dict(key=True)))
+
+    def to_dict(self, key=False):
+        job = {
+            "id": self.id,
+            "kind": self.kind,
+            "name": self.name,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "progress": round(self.done / self.total * 100, 1) if self.total else 0,
+            "size": self.size,
+            "error": self.error,
+            "created": self.created,
+            "finished": self.finished,
+            "expires": self.finished + EXPORT_RETENTION if self.finished else None,
+            "download": f"/api/playlist/export/{self.id}/download" if self.status == "completed" else None,
+        }
+        if key:
+            job["key"] = self.key
+            job["link_lifetime"] = self.link_lifetime
+        return job
+
+    @classmethod
+    def from_dict(cls, record):
+        job = cls(record["id"], record["kind"], record["key"], record["name"], record.get("link_lifetime"))
+        for field in ("status", "total", "done", "size", "created", "finished"):
+            setattr(job, field, record.get(field, getattr(job, field)))
+        return job
+
+class ExportManager:
+    """
+    Runs playlist exports as background jobs and keeps their results on disk for
+    EXPORT_RETENTION seconds. Completed results survive restarts, and an export
+    identical to a queued, running or completed one returns that job instead
+    (for direct link exports, only within the portal's learned link lifetime).
+    """
+    def __init__(self):
+        self.jobs = {} # {job ID: ExportJob}
+        self.lock = Lock()
+        self.loaded = False
+
+    def _load(self):
+        # Called with the lock held: restores completed exports of earlier runs
+        if self.loaded:
+            return
+        self.loaded = True
+        if not os.path.isdir(exports_folder):
+            return
+        for filename in os.listdir(exports_folder):
+            path = os.path.join(exports_folder, filename)
+            if filename.endswith(".json"):
+                try:
+                    with open(path, "rb") as f:
+                        job = ExportJob.from_dict(loads_json(f.read()))
+                    if os.path.exists(job.result_path):
+                        self.jobs[job.id] = job
+                        continue
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Ignoring export record {filename}: {e}")
+                self._remove_files(path)
+            elif filename.endswith(".tmp"):
+                self._remove_files(path) # Interrupted by the last shutdown
+
+    def _remove_files(self, *paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _cleanup(self):
+        # Called with the lock held
+        for job_id, job in list(self.jobs.items()):
+            if job.expired:
+                del self.jobs[job_id]
+                self._remove_files(job.result_path, job.record_path)
+
+    def start(self, kind, data, server_address, fresh=False):
+        """
+        Starts an export, or returns an identical one that is still usable.
+
+        Args:
+            kind (str): "movies" or "series".
+            data (dict): Playlist request data.
+            server_address (str): Base URL of this server, for app links.
+            fresh (bool, optional): Always start a new export.
+
+        Returns:
+            tuple: (ExportJob, True if an existing export was reused)
+
+        Raises:
+            PlaylistError: If the request is invalid.
+        """
+        key = hashlib.sha1(json.dumps([kind, data, server_address], sort_keys=True).encode("utf-8")).hexdigest()
+        # Direct links expire, so the result is only worth reusing for as long as the portal's links last
+        link_lifetime = vod_resolver.portal_ttl(data.get("portalId")) if data.get("useDirectLinks", False) else None
+        with self.lock:
+            self._load()
+            self._cleanup()
+            if not fresh:
+                for job in self.jobs.values():
+                    if job.key == key and job.reusable:
+                        return job, True
+            # Registered before the playlist is prepared, so identical requests arriving meanwhile reuse it
+            job = ExportJob(uuid.uuid4().hex, kind, key, kind, link_lifetime)
+            self.jobs[job.id] = job
+
+        try:
+            playlist = EXPORT_KINDS[kind](data, server_address)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            job.finished = time.time()
+            raise
+        job.name = playlist["name"]
+        job.total = len(playlist["entries"])
+        threading.Thread(target=job.run, args=(playlist,), daemon=True, name=f"export-{job.id[:8]}").start()
+        logger.info(f"Started playlist export {job.id} ({job.name}, {job.total} entries)")
+        return job, False
+
+    def get(self, job_id):
+        with self.lock:
+            self._load()
+            job = self.jobs.get(job_id)
+            return None if job is None or job.expired else job
+
+    def list(self):
+        with self.lock:
+            self._load()
+            self._cleanup()
+            return sorted(self.jobs.values(), key=lambda job: job.created, reverse=True)
+
+    def cancel(self, job_id):
+        """
+        Cancels a running export, or deletes the result of a finished one.
+
+        Returns:
+            ExportJob: The job, or None if not found.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job.finished is None:
+                job.cancelled.set() # The job thread stops and removes its partial file
+            else:
+                del self.jobs[job_id]
+                self._remove_files(job.result_path, job.record_path)
+            return job
+
+EXPORT_KINDS = {"movies": prepareMoviesPlaylist, "series": prepareSeriesPlaylist}
+export_manager = ExportManager()
 
-    Returns:
-        Response: Rendered HTML template with channels data.
+@app.route("/api/playlist/<kind>/export", methods=["POST"])
+@authorise
+def start_playlist_export(kind):
     """
-    portals = getPortals()
-    if portalId not in portals:
-        flash("Portal not found", "danger")
-        return redirect("/portals", code=302)
+    Starts a background export of a movie or series playlist.
 
-    portal = portals[portalId]
-    portal_name = portal.get("name")
+    Takes the same JSON as /api/playlist/movies or /api/playlist/series. An identical
+    export that is still running or was completed within the retention period is
+    returned instead, unless ?fresh=true is given.
 
+    Returns:
+        JSON job status (202), with "reused" telling whether an earlier export was returned.
+    """
+    if kind not in EXPORT_KINDS:
+        return jsonify({"error": "Unknown export type"}), 404
     try:
-        # Load channels from file
-        channels_path = os.path.join(parent_folder, f"{portal_name}.json")
-        channels = []
-        if os.path.exists(channels_path):
-            with open(channels_path, 'r') as file:
-                channels = json.load(file)
+        fresh = request.args.get("fresh", "false").lower() == "true"
+        job, reused = export_manager.start(kind, request.json, request.host_url.rstrip('/'), fresh=fresh)
+        return jsonify(dict(job.to_dict(), reused=reused)), 202
+    except PlaylistError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+        logger.error(f"Error starting {kind} playlist export: {e}")
+        return jsonify({"error": f"Error starting export: {str(e)}"}), 500
 
-        # Load genres from file
-        genres_path = os.path.join(parent_folder, f"{portal_name}_genres.json")
-        genres = []
-        if os.path.exists(genres_path):
-            with open(genres_path, 'r') as file:
-                genres = json.load(file)
+@app.route("/api/playlist/exports", methods=["GET"])
+@authorise
+def list_playlist_exports():
+    """
+    Lists running and retained playlist exports, newest first.
+    """
+    return jsonify([job.to_dict() for job in export_manager.list()])
 
-        # Get channel groups
-        channel_groups = getChannelGroups()
+@app.route("/api/playlist/export/<job_id>", methods=["GET"])
+@authorise
+def get_playlist_export(job_id):
+    """
+    Returns the status and progress of a playlist export.
+    """
+    job = export_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Export not found"}), 404
+    return jsonify(job.to_dict())
 
-        return render_template("channels.html",
-                              portal=portal,
-                              portalId=portalId,
-                              channels=channels,
-                              genres=genres,
-                              channel_groups=channel_groups)
-    except Exception as e:
-        logger.error(f"Error loading channels for portal {portal_name}: {e}")
-        flash(f"Error loading channels: {str(e)}", "danger")
-        return redirect("/portals", code=302)
+@app.route("/api/playlist/export/<job_id>", methods=["DELETE"])
+@authorise
+def cancel_playlist_export(job_id):
+    """
+    Cancels a running playlist export or deletes a finished one.
+    """
+    job = export_manager.cancel(job_id)
+    if not job:
+        return jsonify({"error": "Export not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route("/api/playlist/export/<job_id>/download", methods=["GET"])
+@authorise
+def download_playlist_export(job_id):
+    """
+    Downloads the result of a completed playlist export.
+    """
+    job = export_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Export not found"}), 404
+    if job.status != "completed":
+        return jsonify({"error": f"Export is {job.status}"}), 409
+    return send_file(job.result_path, mimetype="audio/x-mpegurl", as_attachment=True,
+                     download_name=f'{job.name.replace(" ", "_")}.m3u')
 
 #endregion
 
-# region Playlist Generation Functions
+# region VOD Link Resolution
 
-@app.route("/api/playlist/movies", methods=["POST"])
-@authorise
-def create_movies_playlist():
+# Lifetime assumed for resolved VOD links of a portal until one has been observed
+VOD_LINK_TTL = 300
+VOD_LINK_MIN_TTL = 30
+VOD_LINK_MAX_TTL = 6 * 3600
+VOD_LINK_CACHE_SIZE = 2000
+# Query parameters that commonly carry a link's expiry as a Unix timestamp
+VOD_LINK_EXPIRY_PARAMS = ("expires", "expire", "expiry", "exp", "e", "valid_until", "deadline")
+# Query parameters of single-use links: any request to the link may use it up, so they are never probed
+VOD_LINK_SINGLE_USE_PARAMS = ("play_token",)
+
+class VodSession(MacSession):
     """
-    Creates an M3U playlist from selected movies.
+    A MacSession that also completes the profile handshake portals require before
+    they create VOD links. Kept warm between plays so a click costs one request.
+    """
+    def _refresh(self):
+        super()._refresh()
+        try:
+            device_id = stb.generate_device_id(self.mac)
+            timestamp = int(time.time())
+            signature = stb.generate_signature(self.mac, self.token, [str(timestamp)])
+            if not stb.getProfile(self.url, self.mac, self.token, device_id, device_id, signature, timestamp, self.proxy):
+                logger.warning(f"Failed to get profile for MAC {self.mac}, VOD links may still work")
+        except Exception as e:
+            logger.warning(f"Error in profile authentication: {str(e)}")
 
-    Expects JSON with:
-    - portalId (str): Portal ID
-    - movieIds (list): List of movie IDs to include in the playlist
-    - playlistName (str): Name for the playlist
-    - includeMetadata (bool): Whether to include extended metadata in the playlist
-    - useDirectLinks (bool, optional): Whether to use direct stream links (default: true)
-    - xuiCompatible (bool, optional): Whether to format the playlist for XUI One Panel compatibility (default: false)
+class VodResolver:
+    """
+    Resolves movie, series and episode stream links and caches them per item.
 
-    Returns:
-        M3U playlist file for download
+    How long a link stays valid is taken from its expiry parameter when it has one,
+    and is otherwise learned per portal: a cached link past half its lifetime is
+    checked in the background when served (through the proxy of the MAC that
+    resolved it, and never for single-use links), and the portal's lifetime grows
+    when the link still works and shrinks when it has expired. Sessions (token and
+    profile) are shared by all plays of a MAC.
     """
-    try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "Missing request data"}), 400
+    def __init__(self, max_size=VOD_LINK_CACHE_SIZE):
+        self.max_size = max_size
+        self.links = OrderedDict() # {key: (link, resolved time, lifetime, MAC, proxy)}
+        self.ttls = {} # Learned link lifetime per portal: {portal_id: seconds}
+        self.sessions = {} # {(portal_id, mac): VodSession}
+        self.key_locks = {} # One resolution per item at a time: {key: [Lock, callers using it]}
+        self.probing = set()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(portal_id, kind, item_id, series_id=None, season_id=None):
+        return f"{portal_id}:{kind}:{series_id or ''}:{season_id or ''}:{item_id}"
+
+    def portal_ttl(self, portal_id):
+        return self.ttls.get(portal_id, VOD_LINK_TTL)
+
+    def _link_ttl(self, portal_id, link):
+        # An expiry timestamp in the link itself beats anything learned
+        now = time.time()
+        for name, value in parse_qsl(urlparse(link).query):
+            if name.lower() in VOD_LINK_EXPIRY_PARAMS and value.isdigit():
+                expires = int(value)
+                if now < expires < now + 30 * 24 * 3600:
+                    return max(VOD_LINK_MIN_TTL, min(VOD_LINK_MAX_TTL, (expires - now) * 0.9))
+        return self.portal_ttl(portal_id)
+
+    def _learn(self, portal_id, age, alive):
+        with self.lock:
+            ttl = self.portal_ttl(portal_id)
+            if alive:
+                ttl = min(VOD_LINK_MAX_TTL, max(ttl, age) * 1.25)
+            else:
+                ttl = max(VOD_LINK_MIN_TTL, min(ttl, age) * 0.8)
+            self.ttls[portal_id] = ttl
+        logger.debug(f"VOD link lifetime for portal {portal_id} is now {int(ttl)}s")
 
-        portal_id = data.get("portalId")
-        movie_ids = data.get("movieIds", [])
-        playlist_name = data.get("playlistName", "Movies Playlist")
-        include_metadata = data.get("includeMetadata", True)
-        use_direct_links = data.get("useDirectLinks", True)
-        xui_compatible = data.get("xuiCompatible", False)
+    def _probe(self, key, portal_id, link, resolved, proxy):
+        try:
+            alive = stb.probeLink(link, proxy)
+            if alive is None:
+                return
+            self._learn(portal_id, time.time() - resolved, alive)
+            if not alive:
+                self.invalidate(key)
+        finally:
+            with self.lock:
+                self.probing.discard(key)
 
-        if not portal_id:
-            return jsonify({"error": "Missing portal ID"}), 400
+    @staticmethod
+    def _single_use(link):
+        return any(name.lower() in VOD_LINK_SINGLE_USE_PARAMS for name, _ in parse_qsl(urlparse(link).query))
 
-        if not movie_ids:
-            return jsonify({"error": "No movies selected"}), 400
+    def cached(self, key):
+        """
+        Returns a cached link that is still within its lifetime, or None.
+        """
+        with self.lock:
+            entry = self.links.get(key)
+            if not entry:
+                return None
+            link, resolved, ttl, mac, proxy = entry
+            age = time.time() - resolved
+            if age >= ttl:
+                del self.links[key]
+                return None
+            self.links.move_to_end(key)
+            probe = age > ttl / 2 and key not in self.probing and not self._single_use(link)
+            if probe:
+                self.probing.add(key)
+        if probe:
+            portal_id = key.split(":", 1)[0]
+            threading.Thread(target=self._probe, args=(key, portal_id, link, resolved, proxy), daemon=True).start()
+        return link
+
+    def store(self, key, portal_id, link, mac=None, proxy=None):
+        with self.lock:
+            self.links[key] = (link, time.time(), self._link_ttl(portal_id, link), mac, proxy)
+            self.links.move_to_end(key)
+            while len(self.links) > self.max_size:
+                self.links.popitem(last=False)
 
-        # Get portal details
-        portals = getPortals()
-        if portalId not in portals:
-            return jsonify({"error": "Portal not found"}), 404
+    def link_mac(self, key):
+        """
+        Returns the MAC that resolved the cached link of an item, or None. The link
+        should be opened through that MAC's proxy, as hosts may tie it to the address.
+        """
+        with self.lock:
+            entry = self.links.get(key)
+            return entry[3] if entry else None
 
-        portal = portals[portal_id]
-        portal_name = portal.get("name", "Unknown Portal")
-        url = portal["url"]
+    def link_age(self, key):
+        """
+        Returns the seconds since the cached link of an item was resolved, or None.
+        """
+        with self.lock:
+            entry = self.links.get(key)
+            return time.time() - entry[1] if entry else None
 
-        # Get available MACs for the portal
-        macs = list(portal["macs"].keys())
-        if not macs:
-            logger.error(f"No MACs available for portal {portal_id}")
-            return jsonify({"error": "No MACs available for the portal"}), 400
+    def invalidate(self, key, age=None):
+        """
+        Drops a cached link, e.g. after the stream host rejected it. With the link's
+        age the portal's learned lifetime is shortened as well.
+        """
+        with self.lock:
+            entry = self.links.pop(key, None)
+        if entry and age is not None:
+            self._learn(key.split(":", 1)[0], age, False)
 
-        # Use the first available MAC
-        mac = macs[0]
-        proxy = portal.get("proxy")
+    def session(self, portal_id, portal, mac):
+        with self.lock:
+            session = self.sessions.get((portal_id, mac))
+            if session is None or session.url != portal["url"]:
+                session = VodSession(portal["url"], mac, getPortalProxy(portal, mac))
+                self.sessions[(portal_id, mac)] = session
+            return session
 
-        # Get token for the portal
-        token = stb.getToken(url, mac, proxy)
-        if not token:
-            logger.error(f"Failed to authenticate with portal {portal_id}")
-            return jsonify({"error": "Failed to authenticate with portal"}), 500
+    def resolve(self, portal_id, portal, kind, item_id, series_id=None, season_id=None, fresh=False, avoid=()):
+        """
+        Gets the stream link of a movie ("vod"), series ("series") or episode ("episode").
+        Concurrent plays of the same item share one resolution.
 
-        # Start building the playlist
-        playlist_content = "#EXTM3U\n"
+        Args:
+            portal_id (str): ID of the portal.
+            portal (dict): Portal configuration.
+            kind (str): "vod", "series" or "episode".
+            item_id (str): ID of the movie, series or episode.
+            series_id (str, optional): Series of an episode.
+            season_id (str, optional): Season of an episode.
+            fresh (bool, optional): Ignore a cached link.
+            avoid (iterable, optional): MACs not to resolve on.
 
-        # Add playlist info if metadata is enabled and not XUI compatible format
-        if include_metadata and not xui_compatible:
-            playlist_content += f'#PLAYLIST:{playlist_name}\n'
+        Returns:
+            str: Stream link, or None if the portal did not give one or every MAC is avoided.
 
-        # Get all movies data
-        all_movies = {}
+        Raises:
+            stb.AuthenticationError: If no token could be obtained.
+        """
+        key = self.key(portal_id, kind, item_id, series_id, season_id)
+        if fresh:
+            self.invalidate(key)
+        else:
+            link = self.cached(key)
+            if link:
+                self.hits += 1
+                return link
 
-        # Try to load movie details from cached VOD categories
-        vod_categories_path = os.path.join(parent_folder, f"{portal_name}_vod_categories.json")
+        with self.lock:
+            # Counted, so the lock is only dropped once no caller holds or waits for it
+            key_lock = self.key_locks.setdefault(key, [Lock(), 0])
+            key_lock[1] += 1
         try:
-            if os.path.exists(vod_categories_path):
-                with open(vod_categories_path, 'r') as f:
-                    categories = json.load(f)
+            with key_lock[0]:
+                link = self.cached(key) # Resolved by a concurrent play meanwhile
+                if link:
+                    self.hits += 1
+                    return link
+
+                self.misses += 1
+                mac = mac_pool.pick(portal_id, portal, avoid)
+                if mac is None:
+                    return None
+                session = self.session(portal_id, portal, mac)
+                series_info = {"series_id": series_id, "season_id": season_id} if kind == "episode" else None
+                link = session.call(lambda url, mac, token, proxy: stb.getVodSeriesLink(url, mac, token, item_id, kind, series_info, proxy=proxy))
+                if link:
+                    self.store(key, portal_id, link, mac, session.proxy)
+                return link
+        finally:
+            with self.lock:
+                key_lock[1] -= 1
+                if not key_lock[1]:
+                    del self.key_locks[key]
 
-                for category in categories:
-                    if category.get("type") != "VOD":
-                        continue
+    def stats(self):
+        with self.lock:
+            return {
+                "links": len(self.links),
+                "hits": self.hits,
+                "misses": self.misses,
+                "sessions": len(self.sessions),
+                "ttl": {portal_id: int(ttl) for portal_id, ttl in self.ttls.items()},
+            }
 
-                    category_id = category.get("id")
-                    if not category_id:
-                        continue
+vod_resolver = VodResolver()
 
-                    # Get items path
-                    items_path = get_vod_items_path(portal_id, category_id)
+@app.route("/api/vod/links/stats", methods=["GET"])
+@authorise
+def vodLinkStats():
+    """
+    Returns VOD link cache statistics and the learned link lifetime per portal.
+    """
+    return jsonify(vod_resolver.stats())
 
-                    if os.path.exists(items_path):
-                        with open(items_path, 'r') as f:
-                            try:
-                                items = json.load(f)
-                                for item in items:
-                                    if isinstance(item, dict) and "id" in item:
-                                        all_movies[item["id"]] = item
-                            except json.JSONDecodeError:
-                                logger.warning(f"Error parsing JSON from {items_path}")
-        except Exception as e:
-            logger.warning(f"Error loading cached movie details: {e}")
+def playVodContent(portalId, kind, item_id, title, label, series_id=None, season_id=None):
+    """
+    Plays a movie, series or episode. The stream link comes from vod_resolver, so
+    repeated plays and playlist entries are a redirect served from the cache.
 
-        # Fix image URLs for all movies by converting relative paths to absolute
-        fixed_movies = {}
-        for movie_id, movie in all_movies.items():
-            fixed_movies[movie_id] = movie.copy()
+    Playlist requests (?from_playlist=true) are redirected to the stream, or get
+    {"direct_url": ...} when the client asks for JSON. Web requests are redirected
+    or, with ?player=true, shown in player.html. Once an episode plays, the next
+    one is prepared in the background.
 
-        # Use the fix_screenshot_urls function to ensure all image URLs are absolute
-        movie_list = list(fixed_movies.values())
-        fixed_movie_list = fix_screenshot_urls(movie_list, url)
+    Args:
+        portalId (str): ID of the portal.
+        kind (str): "vod", "series" or "episode".
+        item_id (str): ID of the movie, series or episode.
+        title (str): Player title.
+        label (str): What is played, for messages ("movie", "series", "episode").
+        series_id (str, optional): Series of an episode.
+        season_id (str, optional): Season of an episode.
 
-        # Update the fixed_movies dictionary with the fixed URLs
-        for i, movie in enumerate(fixed_movie_list):
-            if movie.get("id") in fixed_movies:
-                fixed_movies[movie.get("id")] = movie
+    Returns:
+        Response: Redirect, player page or error.
+    """
+    from_playlist = request.args.get('from_playlist', 'false').lower() == 'true'
 
-        # Get server address for app URLs if not using direct links
-        server_address = request.host_url.rstrip('/')
-        logger.info(f"Server address for playlist: {server_address}")
+    # Get portal details
+    portals = getPortals()
+    if portalId not in portals:
+        return jsonify({"error": "Portal not found"}), 404
 
-        # Add each movie to the playlist
-        for movie_id in movie_ids:
-            try:
-                if use_direct_links:
-                    # Get direct stream URL (this replaces the internal app URL)
-                    stream_link = stb.getVodSeriesLink(url, mac, token, movie_id, "vod", proxy=proxy)
-                    if not stream_link:
-                        logger.warning(f"Failed to get direct stream link for movie {movie_id} - skipping")
-                        continue
-                else:
-                    # Use application URL with from_playlist parameter
-                    stream_link = f"{server_address}/play/vod/{portal_id}/{movie_id}?from_playlist=true"
+    portal = portals[portalId]
+    key = vod_resolver.key(portalId, kind, item_id, series_id, season_id)
+
+    # Downloaded items are served locally, with Range support, without contacting the portal
+    cached_path = vod_disk_cache.lookup(key)
+    if cached_path:
+        if kind == "episode":
+            lookAheadNextEpisode(portalId, portal, series_id, season_id, item_id)
+        if request.args.get('player', 'false').lower() == 'true':
+            return render_template("player.html", stream_url=request.base_url, title=title)
+        return send_file(cached_path, conditional=True)
+
+    if not portal.get("macs"):
+        logger.error(f"No MACs available for portal {portalId}")
+        return jsonify({"error": "No MACs available for the portal"}), 400
 
-                # Get movie details if available
-                movie = fixed_movies.get(movie_id, {})
-                movie_name = movie.get("name", movie.get("o_name", f"Movie {movie_id}"))
+    # Proxy mode streams through this server for clients that cannot reach the portal
+    proxied = request.args.get('proxy', getSettings().get("vod proxy", "false")).lower() == 'true'
 
-                # Add extended info
-                if xui_compatible:
-                    # XUI One Panel compatible format
-                    # Format: #EXTINF:-1 tvg-id="MovieName.movie" tvg-logo="http://example.com/logo.jpg" group-title="Playlist Name",Movie Name
+    # Portals allow one stream per MAC: background downloads wait while the item plays,
+    # and running ones are stopped before a MAC is picked for it
+    vod_disk_cache.mark_playing(portalId, proxied)
 
-                    # Create a safe tvg-id (alphanumeric and dots only)
-                    tvg_id = f"{movie_name.replace(' ', '')}.movie"
-                    tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+    try:
+        stream_link = vod_resolver.resolve(portalId, portal, kind, item_id, series_id, season_id)
+    except stb.AuthenticationError:
+        logger.error(f"Failed to get token for portal {portalId}")
+        if from_playlist:
+            return jsonify({"error": "Authentication failed - could not get token"}), 401
+        return render_template("error.html", error="Failed to authenticate with portal - could not get token.")
+    except Exception as e:
+        logger.error(f"Error playing {label}: {str(e)}")
+        if from_playlist:
+            return jsonify({"error": str(e)}), 500
+        return render_template("error.html", error=f"Error playing {label}: {str(e)}")
 
-                    # Get logo URL
-                    logo = movie.get("screenshot_uri", movie.get("poster_path", movie.get("cover_big", "")))
-                    logo_attr = f' tvg-logo="{logo}"' if logo else ""
+    if not stream_link:
+        logger.error(f"Failed to get stream link for {label} {item_id}")
+        if from_playlist:
+            return jsonify({"error": "Failed to get stream link"}), 404
+        return render_template("error.html", error=f"Failed to get stream link for the {label}.")
 
-                    # Add all metadata as attributes in the EXTINF line
-                    playlist_content += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{movie_name}\n'
+    # Played items are downloaded in the background once the play is over, so the next play is local
+    vod_disk_cache.enqueue(key, portalId, portal, kind, item_id, series_id, season_id, link=stream_link)
 
-                elif include_metadata:
-                    # Traditional extended M3U format with separate tags
-                    duration = movie.get("duration", -1)
-                    if duration and not isinstance(duration, int):
-                        try:
-                            duration = int(duration)
-                        except (ValueError, TypeError):
-                            duration = -1
+    # Get the next episode ready while this one plays
+    if kind == "episode":
+        lookAheadNextEpisode(portalId, portal, series_id, season_id, item_id)
 
-                    # Use default -1 for unknown duration
-                    playlist_content += f'#EXTINF:{duration},{movie_name}\n'
+    if proxied:
+        return proxyVodStream(key, portalId, portal, stream_link,
+                              lambda: vod_resolver.resolve(portalId, portal, kind, item_id, series_id, season_id, fresh=True))
 
-                    # Add logo if available - ensure it has absolute URL
-                    logo = movie.get("screenshot_uri", movie.get("poster_path", movie.get("cover_big", "")))
-                    if logo:
-                        # Logo should already be fixed by fix_screenshot_urls
-                        playlist_content += f'#EXTLOGO:{logo}\n'
+    if from_playlist:
+        # Media players follow the redirect; API clients can still ask for the URL
+        if request.accept_mimetypes.best == "application/json":
+            return jsonify({"direct_url": stream_link})
+        return redirect(stream_link)
+    if request.args.get('player', 'false').lower() == 'true':
+        return render_template("player.html", stream_url=stream_link, title=title)
+    return redirect(stream_link)
 
-                    # Add genre if available
-                    genre = movie.get("genre", "")
-                    if genre:
-                        playlist_content += f'#EXTGENRE:{genre}\n'
+#endregion
 
-                    # Add description if available
-                    description = movie.get("description", movie.get("plot", ""))
-                    if description:
-                        # Limit description length
-                        if len(description) > 500:
-                            description = description[:497] + "..."
-                        playlist_content += f'#EXTDESCRIPTION:{description}\n'
-                else:
-                    # Simple format without extended metadata
-                    playlist_content += f'#EXTINF:-1,{movie_name}\n'
+# region VOD Proxy
 
-                # Add the stream URL
-                playlist_content += f'{stream_link}\n'
-            except Exception as e:
-                logger.warning(f"Error processing movie {movie_id}: {str(e)}")
-                continue
+# Size of the reads from upstream and writes to the client
+VOD_PROXY_CHUNK_SIZE = 256 * 1024
+# Times a stream that breaks off is reopened (with a fresh link if needed) before giving up
+VOD_PROXY_MAX_RESUMES = 3
+# Upstream statuses meaning the link is no longer valid
+VOD_LINK_EXPIRED_STATUSES = (401, 403, 404, 410)
+# Upstream headers passed on to the client
+VOD_PROXY_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "Last-Modified", "ETag")
 
-        # Create response
-        response = make_response(playlist_content)
-        response.headers["Content-Type"] = "audio/x-mpegurl"
-        response.headers["Content-Disposition"] = f'attachment; filename="{playlist_name.replace(" ", "_")}.m3u"'
+def parseByteRange(value):
+    """
+    Parses a single "bytes=start-end" range.
 
-        return response
-    except Exception as e:
-        logger.error(f"Error creating movie playlist: {e}")
-        return jsonify({"error": f"Error creating playlist: {str(e)}"}), 500
+    Returns:
+        tuple: (start, end or None), or None for anything else (suffix and multi-part ranges).
+    """
+    match = re.fullmatch(r"\s*bytes=(\d+)-(\d*)\s*", value or "")
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
 
-@app.route("/api/playlist/series", methods=["POST"])
-@authorise
-def create_series_playlist():
+def openVodUpstream(key, portal, link, range_header, reresolve, priority=stb.PRIORITY_LIVE):
     """
-    Creates an M3U playlist from selected series episodes.
+    Opens the upstream stream of a VOD link, resolving a new link once if the
+    current one has expired. The stream is opened through the proxy of the MAC
+    that resolved the link.
 
-    Expects JSON with:
-    - portalId (str): Portal ID
-    - seriesIds (list): List of series IDs to include
-    - playlistName (str): Name for the playlist
-    - includeMetadata (bool): Whether to include extended metadata in the playlist
-    - includeEpisodes (bool, optional): Whether to include individual episodes (default: False)
-    - useDirectLinks (bool, optional): Whether to use direct stream links (default: true)
-    - xuiCompatible (bool, optional): Whether to format the playlist for XUI One Panel compatibility (default: false)
+    Args:
+        key (str): vod_resolver key of the item.
+        portal (dict): Portal configuration.
+        link (str): Resolved stream link.
+        range_header (str): Range to request, or None.
+        reresolve (callable): Returns a freshly resolved link.
+        priority (int, optional): Scheduler priority of the new resolution.
 
     Returns:
-        M3U playlist file for download
+        tuple: (requests.Response, link used)
+    """
+    upstream = stb.openStream(link, range_header, getPortalProxy(portal, vod_resolver.link_mac(key)))
+    if upstream.status_code in VOD_LINK_EXPIRED_STATUSES:
+        upstream.close()
+        logger.info(f"VOD link for {key} rejected with {upstream.status_code}, resolving a new one")
+        vod_resolver.invalidate(key, vod_resolver.link_age(key))
+        with stb.requestPriority(priority):
+            link = reresolve()
+        if not link:
+            raise stb.StreamCreationError(f"Failed to resolve a new link for {key}")
+        upstream = stb.openStream(link, range_header, getPortalProxy(portal, vod_resolver.link_mac(key)))
+    return upstream, link
+
+def proxyVodStream(key, portalId, portal, link, reresolve):
+    """
+    Streams a movie or episode through this server. The client's Range header is
+    forwarded so players can seek, and a stream that breaks off (dropped connection
+    or expired link) is reopened from the byte it stopped at. When the VOD cache is
+    enabled, the bytes served also fill the item's download.
+
+    Args:
+        key (str): vod_resolver key of the item.
+        portalId (str): ID of the portal.
+        portal (dict): Portal configuration.
+        link (str): Resolved stream link.
+        reresolve (callable): Returns a freshly resolved link.
+
+    Returns:
+        Response: Streaming response with the upstream status and headers.
     """
+    range_header = request.headers.get("Range")
     try:
-        data = request.json
-        if not data:
-            return jsonify({"error": "Missing request data"}), 400
-
-        portal_id = data.get("portalId")
-        series_ids = data.get("seriesIds", [])
-        playlist_name = data.get("playlistName", "Series Playlist")
-        include_metadata = data.get("includeMetadata", True)
-        include_episodes = data.get("includeEpisodes", False)
-        use_direct_links = data.get("useDirectLinks", True)
-        xui_compatible = data.get("xuiCompatible", False)
+        upstream, link = openVodUpstream(key, portal, link, range_header, reresolve)
+    except (requests.RequestException, stb.StalkerPortalError) as e:
+        logger.error(f"Error opening VOD stream {key}: {e}")
+        return jsonify({"error": "Failed to open stream"}), 502
+
+    if upstream.status_code >= 400:
+        upstream.close()
+        logger.error(f"VOD stream {key} returned {upstream.status_code}")
+        return jsonify({"error": f"Upstream returned {upstream.status_code}"}), 502
+
+    # Where the response starts and ends, to resume a stream that breaks off
+    start, end, size = 0, None, None
+    content_range = re.match(r"bytes (\d+)-(\d+)/(\d+|\*)", upstream.headers.get("Content-Range", ""))
+    if content_range:
+        start, end = int(content_range.group(1)), int(content_range.group(2))
+        size = int(content_range.group(3)) if content_range.group(3).isdigit() else None
+    elif upstream.headers.get("Content-Length", "").isdigit():
+        end = int(upstream.headers["Content-Length"]) - 1
+        size = end + 1
+    resumable = range_header is None or parseByteRange(range_header) is not None
+    content_type = upstream.headers.get("Content-Type", "").split(";")[0].strip()
+
+    def generate():
+        nonlocal upstream, link
+        sent = 0
+        resumes = 0
+        fill = vod_disk_cache.open_fill(key, start, size, content_type, link)
+        try:
+            while True:
+                try:
+                    for chunk in upstream.iter_content(VOD_PROXY_CHUNK_SIZE):
+                        sent += len(chunk)
+                        vod_disk_cache.mark_playing(portalId, proxied=True)
+                        if fill:
+                            fill.write(chunk)
+                        yield chunk
+                    return
+                except requests.RequestException as e:
+                    upstream.close()
+                    if not resumable or resumes >= VOD_PROXY_MAX_RESUMES or (end is not None and start + sent > end):
+                        logger.warning(f"VOD stream {key} broke off after {sent} bytes: {e}")
+                        return
+                    resumes += 1
+                    logger.info(f"VOD stream {key} broke off after {sent} bytes ({e}), resuming")
+                    resume_range = f"bytes={start + sent}-{end if end is not None else ''}"
+                    try:
+                        upstream, link = openVodUpstream(key, portal, link, resume_range, reresolve)
+                    except (requests.RequestException, stb.StalkerPortalError) as e:
+                        logger.warning(f"Could not resume VOD stream {key}: {e}")
+                        return
+                    if upstream.status_code != 206:
+                        logger.warning(f"Could not resume VOD stream {key}: upstream returned {upstream.status_code}")
+                        return
+        finally:
+            upstream.close()
+            if fill:
+                fill.close() # An unfinished fill stays as ".part" file for the download to resume
 
-        if not portal_id:
-            return jsonify({"error": "Missing portal ID"}), 400
+    headers = {name: upstream.headers[name] for name in VOD_PROXY_HEADERS if name in upstream.headers}
+    headers.setdefault("Accept-Ranges", "bytes")
+    return Response(generate(), status=upstream.status_code, headers=headers, direct_passthrough=True)
 
-        if not series_ids:
-            return jsonify({"error": "No series selected"}), 400
+#endregion
 
-        # Get portal details
-        portals = getPortals()
-        if portalId not in portals:
-            return jsonify({"error": "Portal not found"}), 404
+# region VOD Download Cache
+
+# Folder for downloaded movies and episodes
+vod_cache_folder = os.path.join(content_folder, "media")
+
+# Parallel background downloads
+VOD_CACHE_WORKERS = 2
+VOD_CACHE_CHUNK_SIZE = 1024 * 1024
+# Seconds a failed download is remembered before the item is tried again
+VOD_CACHE_FAILURE_TTL = 3600
+# Seconds a portal counts as playing after a redirected VOD play. The player streams from
+# the host directly, so the end of the play is not seen; this covers a feature film
+VOD_CACHE_PLAY_HOLD = 3 * 3600
+# Seconds a portal counts as playing after the last bytes of a proxied VOD play
+VOD_CACHE_PROXY_HOLD = 60
+# Seconds between checks whether downloads deferred by a play may start
+VOD_CACHE_RECHECK_INTERVAL = 30
+# Seconds an unfinished ".part" file is kept for resuming
+VOD_CACHE_PART_MAX_AGE = 7 * 24 * 3600
+
+# File extensions of downloads by content type, or taken from the link when it has a known one
+VOD_CACHE_EXTENSIONS = {
+    "video/mp4": "mp4",
+    "video/x-matroska": "mkv",
+    "video/x-msvideo": "avi",
+    "video/mp2t": "ts",
+    "video/quicktime": "mov",
+    "video/webm": "webm",
+}
 
-        portal = portals[portal_id]
-        portal_name = portal.get("name", "Unknown Portal")
-        url = portal["url"]
+class VodDiskCache:
+    """
+    Optional disk cache of movies and episodes, enabled with the "vod cache" setting.
+
+    Played (or pre-populated) items are downloaded in the background by a few
+    workers, into a ".part" file that is resumed after a restart, and served
+    locally once complete. Portals usually allow one stream per MAC, so downloads
+    of a portal pause while one of its VOD items is being played; a proxied play
+    instead fills the ".part" file with the bytes it serves. The cache, including
+    unfinished ".part" files, is kept under "vod cache size gb" by evicting stale
+    ".part" files first and then the least recently played files; like the image
+    cache, file modification times record use so the order survives restarts.
+    """
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = Lock()
+        self.entries = OrderedDict() # name -> (path, bytes), least recently used first
+        self.parts = OrderedDict() # Unfinished downloads: name -> (path, bytes), oldest first
+        self.total = 0 # Bytes of entries and parts
+        self.loaded = False
+        self.tasks = queue.Queue()
+        self.queued = set() # Names queued, deferred or downloading
+        self.deferred = [] # Tasks waiting for their portal to stop playing
+        self.writers = set() # Names whose ".part" file is being written (download or proxied play)
+        self.playing = {} # {portal ID: time until which it counts as playing}
+        self.running = {} # Downloads streaming from a portal: {name: (portal ID, upstream response)}
+        self.stopped = set() # Names of downloads stopped for a play, to be deferred rather than failed
+        self.progress = {} # Downloading: {name: (bytes done, bytes total)}
+        self.failures = {} # name -> time of the last failed download
+        self.workers = []
+        self.downloads = 0
+
+    def enabled(self):
+        return getSettings().get("vod cache", "false") == "true"
+
+    def max_bytes(self):
+        try:
+            return int(float(getSettings().get("vod cache size gb", defaultSettings["vod cache size gb"])) * 1024 ** 3)
+        except (TypeError, ValueError):
+            return int(defaultSettings["vod cache size gb"]) * 1024 ** 3
 
-        # Get available MACs for the portal
-        macs = list(portal["macs"].keys())
-        if not macs:
-            logger.error(f"No MACs available for portal {portal_id}")
-            return jsonify({"error": "No MACs available for the portal"}), 400
+    @staticmethod
+    def name(key):
+        return hashlib.sha1(key.encode("utf-8")).hexdigest()
 
-        # Use the first available MAC
-        mac = macs[0]
-        proxy = portal.get("proxy")
+    def _part_path(self, name):
+        return os.path.join(self.folder, f"{name}.part")
 
-        # Get token for the portal
-        token = stb.getToken(url, mac, proxy)
-        if not token:
-            logger.error(f"Failed to authenticate with portal {portal_id}")
-            return jsonify({"error": "Failed to authenticate with portal"}), 500
+    def _load(self):
+        """
+        Indexes the files already in the cache, oldest use first, and removes
+        ".part" files too old to resume. Caller must hold the lock.
+        """
+        if self.loaded:
+            return
+        files = []
+        parts = []
+        stale = []
+        if os.path.isdir(self.folder):
+            for filename in os.listdir(self.folder):
+                name, _, extension = filename.partition(".")
+                if not extension:
+                    continue
+                path = os.path.join(self.folder, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if extension != "part":
+                    files.append((stat.st_mtime, name, path, stat.st_size))
+                elif time.time() - stat.st_mtime > VOD_CACHE_PART_MAX_AGE:
+                    stale.append(path)
+                else:
+                    parts.append((stat.st_mtime, name, path, stat.st_size))
+        for _, name, path, size in sorted(files):
+            self.entries[name] = (path, size)
+            self.total += size
+        for _, name, path, size in sorted(parts):
+            self.parts[name] = (path, size)
+            self.total += size
+        self._remove(stale)
+        self.loaded = True
+        logger.info(f"VOD cache holds {len(self.entries)} files and {len(self.parts)} unfinished downloads ({self.total // 1024 ** 3} GB)")
+
+    def lookup(self, key):
+        """
+        Returns:
+            str: Path of the downloaded item, or None.
+        """
+        name = self.name(key)
+        with self.lock:
+            self._load()
+            entry = self.entries.get(name)
+            if entry is None:
+                return None
+            self.entries.move_to_end(name)
+        try:
+            os.utime(entry[0]) # Record the use for the LRU order after a restart
+            return entry[0]
+        except OSError:
+            with self.lock:
+                if self.entries.pop(name, None):
+                    self.total -= entry[1]
+            return None
 
-        # Start building the playlist
-        playlist_content = "#EXTM3U\n"
+    def mark_playing(self, portal_id, proxied=False):
+        """
+        Records that a VOD item of a portal is being played. Downloads of the portal
+        wait until the play is over, and running ones are stopped (their ".part" file
+        is resumed later) so their MAC's stream is free before the play resolves its link.
 
-        # Add playlist info if metadata is enabled and not XUI compatible format
-        if include_metadata and not xui_compatible:
-            playlist_content += f'#PLAYLIST:{playlist_name}\n'
+        Args:
+            portal_id (str): ID of the portal.
+            proxied (bool, optional): The play streams through this server, which
+                calls again for every chunk it serves.
+        """
+        until = time.time() + (VOD_CACHE_PROXY_HOLD if proxied else VOD_CACHE_PLAY_HOLD)
+        with self.lock:
+            self.playing[portal_id] = max(self.playing.get(portal_id, 0), until)
+            stopping = [(name, upstream) for name, (download_portal, upstream) in self.running.items() if download_portal == portal_id]
+            for name, _ in stopping:
+                del self.running[name]
+                self.stopped.add(name)
+        for name, upstream in stopping:
+            logger.info(f"Pausing a VOD cache download of portal {portal_id} for a play")
+            upstream.close()
+
+    def _portal_playing(self, portal_id):
+        # Called with the lock held
+        if self.playing.get(portal_id, 0) > time.time():
+            return True
+        self.playing.pop(portal_id, None)
+        return False
 
-        # Get server address for app URLs if not using direct links
-        server_address = request.host_url.rstrip('/')
-        logger.info(f"Server address for playlist: {server_address}")
+    def enqueue(self, key, portal_id, portal, kind, item_id, series_id=None, season_id=None, link=None):
+        """
+        Queues an item for download if the cache is enabled and it is not cached yet.
+        The download starts once no VOD item of the portal is being played.
 
-        # Get all series data
-        all_series = {}
+        Args:
+            key (str): vod_resolver key of the item.
+            portal_id (str): ID of the portal.
+            portal (dict): Portal configuration.
+            kind (str): "vod" or "episode".
+            item_id (str): ID of the movie or episode.
+            series_id (str, optional): Series of an episode.
+            season_id (str, optional): Season of an episode.
+            link (str, optional): Link already resolved for the item.
 
-        # Try to load series details from cached Series categories
-        series_categories_path = os.path.join(parent_folder, f"{portal_name}_series_categories.json")
+        Returns:
+            bool: True if the item was queued.
+        """
+        if not self.enabled() or kind == "series":
+            return False
+        name = self.name(key)
+        with self.lock:
+            self._load()
+            failed = self.failures.get(name)
+            if name in self.entries or name in self.queued or (failed and time.time() - failed < VOD_CACHE_FAILURE_TTL):
+                return False
+            self.queued.add(name)
+            self.workers = [worker for worker in self.workers if worker.is_alive()]
+            while len(self.workers) < VOD_CACHE_WORKERS:
+                worker = threading.Thread(target=self._work, daemon=True, name=f"vod-cache-{len(self.workers)}")
+                worker.start()
+                self.workers.append(worker)
+        self.tasks.put((name, key, portal_id, portal, kind, item_id, series_id, season_id, link))
+        return True
 
-        try:
-            # First try series-specific categories
-            if os.path.exists(series_categories_path):
-                with open(series_categories_path, 'r') as f:
-                    categories = json.load(f)
-            else:
-                # Fall back to VOD categories with Series type
-                vod_categories_path = os.path.join(parent_folder, f"{portal_name}_vod_categories.json")
-                if os.path.exists(vod_categories_path):
-                    with open(vod_categories_path, 'r') as f:
-                        all_categories = json.load(f)
-                        categories = [c for c in all_categories if c.get("type") == "Series"]
-                else:
-                    categories = []
+    def _release_deferred(self):
+        """
+        Queues the deferred downloads of portals that stopped playing again.
+        """
+        with self.lock:
+            ready = [task for task in self.deferred if not self._portal_playing(task[2]) and task[0] not in self.writers]
+            self.deferred = [task for task in self.deferred if task not in ready]
+        for task in ready:
+            self.tasks.put(task)
 
-            # Process categories
-            for category in categories:
-                category_id = category.get("id")
-                if not category_id:
+    def _work(self):
+        while True:
+            try:
+                task = self.tasks.get(timeout=VOD_CACHE_RECHECK_INTERVAL)
+            except queue.Empty:
+                self._release_deferred()
+                continue
+            name, key, portal_id, portal, kind, item_id, *rest = task
+            with self.lock:
+                # A download would take the stream of the MAC a viewer is using
+                if self._portal_playing(portal_id) or name in self.writers:
+                    self.deferred.append(task)
                     continue
-
-                # Get items path
-                items_path = get_series_items_path(portal_id, category_id)
-
-                if os.path.exists(items_path):
-                    with open(items_path, 'r') as f:
-                        try:
-                            items = json.load(f)
-                            for item in items:
-                                if isinstance(item, dict) and "id" in item:
-                                    all_series[item["id"]] = item
-                        except json.JSONDecodeError:
-                            logger.warning(f"Error parsing JSON from {items_path}")
-        except Exception as e:
-            logger.warning(f"Error loading cached series details: {e}")
-
-        # Fix image URLs for all series by converting relative paths to absolute
-        fixed_series = {}
-        for series_id, series in all_series.items():
-            fixed_series[series_id] = series.copy()
-
-        # Use the fix_screenshot_urls function to ensure all image URLs are absolute
-        series_list = list(fixed_series.values())
-        fixed_series_list = fix_screenshot_urls(series_list, url)
-
-        # Update the fixed_series dictionary with the fixed URLs
-        for i, series in enumerate(fixed_series_list):
-            if series.get("id") in fixed_series:
-                fixed_series[series.get("id")] = series
-
-        # Function to ensure image URL is absolute
-        def ensure_absolute_url(image_url):
-            if not image_url:
-                return ""
-
-            if not image_url.startswith(('http://', 'https://')):
-                base_url = url.split('/c/')[0] if '/c/' in url else url
-                base_url = base_url.rstrip('/')
-                if image_url.startswith('/'):
-                    return base_url + image_url
+                self.writers.add(name)
+            error = None
+            try:
+                done = self.enabled() and self._download(name, key, portal_id, portal, kind, item_id, *rest)
+            except Exception as e:
+                done, error = False, e
+            with self.lock:
+                self.running.pop(name, None)
+                self.writers.discard(name)
+                self.progress.pop(name, None)
+                if name in self.stopped:
+                    self.stopped.discard(name)
+                    self.deferred.append(task) # Resumes from its ".part" file after the play
                 else:
-                    return base_url + '/' + image_url
-            return image_url
+                    self.queued.discard(name)
+                    if not done:
+                        self.failures[name] = time.time()
+                        if error:
+                            logger.error(f"Error downloading {key} to the VOD cache: {error}")
+            self._release_deferred()
+
+    def _make_room(self, size, max_bytes, keep=None):
+        """
+        Evicts unfinished downloads nobody is writing, oldest first, and then least
+        recently used files until size more bytes fit. Caller must hold the lock.
+
+        Args:
+            size (int): Bytes about to be added.
+            max_bytes (int): Cache size limit.
+            keep (str, optional): Name of the download the room is made for.
 
-        # Add each series to the playlist
-        for series_id in series_ids:
-            # Get series details if available
-            series = fixed_series.get(series_id, {})
-            series_name = series.get("name", series.get("o_name", f"Series {series_id}"))
+        Returns:
+            list: Paths of the evicted files, to delete outside the lock.
+        """
+        evicted = []
+        for name, (old_path, old_size) in list(self.parts.items()):
+            if self.total + size <= max_bytes:
+                break
+            if name in self.writers or name == keep:
+                continue
+            del self.parts[name]
+            self.total -= old_size
+            evicted.append(old_path)
+        while self.entries and self.total + size > max_bytes:
+            _, (old_path, old_size) = self.entries.popitem(last=False)
+            self.total -= old_size
+            evicted.append(old_path)
+        return evicted
+
+    def _remove(self, paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
 
-            if include_episodes and include_metadata:
-                # Try to load seasons
-                try:
-                    seasons_path = get_seasons_path(portal_id, series_id)
-                    if os.path.exists(seasons_path):
-                        with open(seasons_path, 'r') as f:
-                            seasons = json.load(f)
-
-                            # Fix season image URLs
-                            seasons = fix_screenshot_urls(seasons, url)
-
-                            # Add each season and episode
-                            for season in seasons:
-                                season_id = season.get("id")
-                                season_name = season.get("name", f"Season {season.get('season_number', '?')}")
-
-                                # Add season header as a comment (if not XUI compatible)
-                                if not xui_compatible:
-                                    playlist_content += f'#EXTGRP:{series_name} - {season_name}\n'
-
-                                # Get episodes
-                                episodes_path = get_episodes_path(portal_id, series_id, season_id)
-                                if os.path.exists(episodes_path):
-                                    with open(episodes_path, 'r') as f:
-                                        episodes = json.load(f)
-
-                                        # Fix episode image URLs
-                                        episodes = fix_screenshot_urls(episodes, url)
-
-                                        # Add each episode
-                                        for episode in episodes:
-                                            episode_id = episode.get("id")
-                                            if not episode_id:
-                                                continue
+    def _grow_part(self, name, size):
+        # Called with the lock held: accounts for bytes written to a ".part" file
+        path, previous = self.parts.pop(name, (self._part_path(name), 0))
+        self.parts[name] = (path, size)
+        self.total += size - previous
 
-                                            try:
-                                                if use_direct_links:
-                                                    # Get direct stream link for episode
-                                                    stream_link = stb.getVodSeriesLink(url, mac, token, episode_id, "episode", series_info, proxy=proxy)
-                                                    if not stream_link:
-                                                        logger.warning(f"Failed to get direct stream link for episode {episode_id} - skipping")
-                                                        continue
-                                                else:
-                                                    # Use application URL with from_playlist parameter
-                                                    stream_link = f"{server_address}/play/series/{portal_id}/{series_id}/{season_id}/{episode_id}?from_playlist=true"
-
-                                                episode_name = episode.get("name", episode.get("title", ""))
-                                                episode_number = episode.get("episode_number", "?")
-                                                full_name = f"{series_name} - S{season.get('season_number', '?')}E{episode_number}: {episode_name}"
-
-                                                if xui_compatible:
-                                                    # Create a safe tvg-id
-                                                    tvg_id = f"{series_name.replace(' ', '')}.S{season.get('season_number', '0')}E{episode_number}"
-                                                    tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
-
-                                                    # Get logo URL
-                                                    logo = episode.get("screenshot_uri", episode.get("poster_path", ""))
-                                                    logo_attr = f' tvg-logo="{logo}"' if logo else ""
-
-                                                    # Add all metadata as attributes in the EXTINF line
-                                                    playlist_content += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{full_name}\n'
-                                                else:
-                                                    # Traditional extended M3U format
-                                                    # Add extended info
-                                                    duration = episode.get("duration", -1)
-                                                    if duration and not isinstance(duration, int):
-                                                        try:
-                                                            duration = int(duration)
-                                                        except (ValueError, TypeError):
-                                                            duration = -1
-
-                                                    playlist_content += f'#EXTINF:{duration},{full_name}\n'
-
-                                                    # Add logo if available
-                                                    logo = episode.get("screenshot_uri", episode.get("poster_path", ""))
-                                                    if logo:
-                                                        # Logo should already be fixed by fix_screenshot_urls
-                                                        playlist_content += f'#EXTLOGO:{logo}\n'
-
-                                                    # Add description if available
-                                                    description = episode.get("description", episode.get("plot", ""))
-                                                    if description:
-                                                        # Limit description length
-                                                        if len(description) > 500:
-                                                            description = description[:497] + "..."
-                                                        playlist_content += f'#EXTDESCRIPTION:{description}\n'
-
-                                                # Add the stream URL
-                                                playlist_content += f'{stream_link}\n'
-                                            except Exception as e:
-                                                logger.warning(f"Error processing episode {episode_id}: {str(e)}")
-                                                continue
-                except Exception as e:
-                    logger.warning(f"Error including episodes for series {series_id}: {e}")
-                    try:
-                        # Fall back to series-only link if episodes fail
-                        if use_direct_links:
-                            # Get direct stream link for series
-                            stream_link = stb.getVodSeriesLink(url, mac, token, series_id, "series", proxy=proxy)
-                            if not stream_link:
-                                logger.warning(f"Failed to get direct stream link for series {series_id} - skipping")
-                                continue
-                        else:
-                            # Use application URL with from_playlist parameter
-                            stream_link = f"{server_address}/play/series/{portal_id}/{series_id}?from_playlist=true"
+    def _drop_part(self, name):
+        with self.lock:
+            _, size = self.parts.pop(name, (None, 0))
+            self.total -= size
+        self._remove([self._part_path(name)])
 
-                        if xui_compatible:
-                            # Create a safe tvg-id
-                            tvg_id = f"{series_name.replace(' ', '')}.series"
-                            tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+    def _reserve(self, name, key, offset, size):
+        """
+        Makes room for the rest of a download of size bytes (if known) from offset.
 
-                            # Get logo URL
-                            logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
-                            logo_attr = f' tvg-logo="{logo}"' if logo else ""
+        Returns:
+            bool: False if the item is larger than the whole cache.
+        """
+        max_bytes = self.max_bytes()
+        if size is None:
+            return True
+        if size > max_bytes:
+            logger.info(f"{key} ({size // 1024 ** 2} MB) is larger than the VOD cache, not downloaded")
+            return False
+        with self.lock:
+            evicted = self._make_room(size - offset, max_bytes, keep=name)
+        self._remove(evicted)
+        return True
 
-                            # Add all metadata as attributes in the EXTINF line
-                            playlist_content += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{series_name}\n'
-                        else:
-                            # Traditional extended M3U format
-                            # Add extended info
-                            playlist_content += f'#EXTINF:-1,{series_name}\n'
-
-                            # Add logo if available - already fixed in fixed_series
-                            logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
-                            if logo:
-                                playlist_content += f'#EXTLOGO:{logo}\n'
-
-                            # Add description if available
-                            description = series.get("description", series.get("plot", ""))
-                            if description:
-                                # Limit description length
-                                if len(description) > 500:
-                                    description = description[:497] + "..."
-                                playlist_content += f'#EXTDESCRIPTION:{description}\n'
-
-                        # Add the stream URL
-                        playlist_content += f'{stream_link}\n'
-                    except Exception as e:
-                        logger.warning(f"Error processing series {series_id}: {str(e)}")
-                        continue
-            else:
-                try:
-                    # Just add the series link
-                    if use_direct_links:
-                        # Get direct stream link for series
-                        stream_link = stb.getVodSeriesLink(url, mac, token, series_id, "series", proxy=proxy)
-                        if not stream_link:
-                            logger.warning(f"Failed to get direct stream link for series {series_id} - skipping")
-                            continue
-                    else:
-                        # Use application URL with from_playlist parameter
-                        stream_link = f"{server_address}/play/series/{portal_id}/{series_id}?from_playlist=true"
+    def _finish(self, name, key, size, content_type, link):
+        """
+        Moves a complete ".part" file into the cache.
+        """
+        extension = VOD_CACHE_EXTENSIONS.get(content_type)
+        if not extension:
+            link_extension = os.path.splitext(urlparse(link).path)[1].lstrip(".").lower()
+            extension = link_extension if link_extension in VOD_CACHE_EXTENSIONS.values() else "bin"
+        path = os.path.join(self.folder, f"{name}.{extension}")
+        os.replace(self._part_path(name), path)
 
-                    # XUI compatible format
-                    if xui_compatible:
-                        # Create a safe tvg-id
-                        tvg_id = f"{series_name.replace(' ', '')}.series"
-                        tvg_id = ''.join(c for c in tvg_id if c.isalnum() or c == '.')
+        with self.lock:
+            _, part_size = self.parts.pop(name, (None, 0))
+            self.entries[name] = (path, size)
+            self.total += size - part_size
+            self.downloads += 1
+            evicted = self._make_room(0, self.max_bytes())
+        self._remove(evicted)
+        logger.info(f"Downloaded {key} to the VOD cache ({size // 1024 ** 2} MB)")
+
+    def _download(self, name, key, portal_id, portal, kind, item_id, series_id, season_id, link):
+        with self.lock:
+            if name in self.entries:
+                return True # Filled by a proxied play meanwhile
+        reresolve = lambda: vod_resolver.resolve(portal_id, portal, kind, item_id, series_id, season_id, fresh=True)
+        with stb.requestPriority(stb.PRIORITY_BACKGROUND):
+            link = vod_resolver.resolve(portal_id, portal, kind, item_id, series_id, season_id) or link
+        if not link:
+            return False
 
-                        # Get logo URL
-                        logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
-                        logo_attr = f' tvg-logo="{logo}"' if logo else ""
+        os.makedirs(self.folder, exist_ok=True)
+        part_path = self._part_path(name)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        upstream, link = openVodUpstream(key, portal, link, f"bytes={offset}-" if offset else None, reresolve, stb.PRIORITY_BACKGROUND)
+        with self.lock:
+            if self._portal_playing(portal_id):
+                self.stopped.add(name) # A play started while the link was resolved
+                upstream.close()
+                return False
+            self.running[name] = (portal_id, upstream) # mark_playing closes it to free the MAC
+        with upstream:
+            if upstream.status_code not in (200, 206):
+                logger.warning(f"VOD cache download of {key} returned {upstream.status_code}")
+                return False
+            if upstream.status_code == 200:
+                offset = 0 # The host ignored the range, start over
+
+            content_range = re.match(r"bytes \d+-\d+/(\d+)", upstream.headers.get("Content-Range", ""))
+            if content_range:
+                size = int(content_range.group(1))
+            elif upstream.headers.get("Content-Length", "").isdigit():
+                size = offset + int(upstream.headers["Content-Length"])
+            else:
+                size = None
+
+            if not self._reserve(name, key, offset, size):
+                self._drop_part(name)
+                return False
+
+            logger.info(f"Downloading {key} to the VOD cache" + (f" from byte {offset}" if offset else ""))
+            max_bytes = self.max_bytes()
+            done = offset
+            with open(part_path, "ab" if offset else "wb") as f:
+                for chunk in upstream.iter_content(VOD_CACHE_CHUNK_SIZE):
+                    f.write(chunk)
+                    done += len(chunk)
+                    with self.lock:
+                        self._grow_part(name, done)
+                        self.progress[name] = (done, size)
+                    if size is None and done > max_bytes:
+                        logger.info(f"{key} is larger than the VOD cache, download stopped")
+                        f.close()
+                        self._drop_part(name)
+                        return False
+
+        if size is not None and done != size:
+            with self.lock:
+                if name in self.stopped:
+                    return False # Paused for a play
+            logger.warning(f"VOD cache download of {key} stopped at {done} of {size} bytes, will resume")
+            return False
 
-                        # Add all metadata as attributes in the EXTINF line
-                        playlist_content += f'#EXTINF:-1 tvg-id="{tvg_id}"{logo_attr} group-title="{playlist_name}",{series_name}\n'
-                    # Add extended info if metadata is enabled
-                    elif include_metadata:
-                        playlist_content += f'#EXTINF:-1,{series_name}\n'
+        self._finish(name, key, done, upstream.headers.get("Content-Type", "").split(";")[0].strip(), link)
+        return True
 
-                        # Add logo if available - already fixed in fixed_series
-                        logo = series.get("screenshot_uri", series.get("poster_path", series.get("cover_big", "")))
-                        if logo:
-                            playlist_content += f'#EXTLOGO:{logo}\n'
+    def open_fill(self, key, start, size, content_type, link):
+        """
+        Lets a proxied play fill the cache with the bytes it serves, when it is
+        served from where the item's ".part" file ends.
 
-                        # Add genre if available
-                        genre = series.get("genre", "")
-                        if genre:
-                            playlist_content += f'#EXTGENRE:{genre}\n'
+        Args:
+            key (str): vod_resolver key of the item.
+            start (int): First byte the play serves.
+            size (int): Size of the item, None if unknown.
+            content_type (str): Content type of the item.
+            link (str): Stream link, for the file extension.
 
-                        # Add description if available
-                        description = series.get("description", series.get("plot", ""))
-                        if description:
-                            # Limit description length
-                            if len(description) > 500:
-                                description = description[:497] + "..."
-                            playlist_content += f'#EXTDESCRIPTION:{description}\n'
-                    else:
-                        # Simple format without extended metadata
-                        playlist_content += f'#EXTINF:-1,{series_name}\n'
+        Returns:
+            VodCacheFill: To write the served bytes to, or None if the play can't fill the cache.
+        """
+        if not self.enabled() or size is None:
+            return None
+        name = self.name(key)
+        part_path = self._part_path(name)
+        with self.lock:
+            self._load()
+            if name in self.entries or name in self.writers:
+                return None
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            if start != offset:
+                return None
+            self.writers.add(name)
+        try:
+            if not self._reserve(name, key, offset, size):
+                raise OSError("larger than the cache")
+            os.makedirs(self.folder, exist_ok=True)
+            f = open(part_path, "ab" if offset else "wb")
+        except OSError:
+            with self.lock:
+                self.writers.discard(name)
+            return None
+        logger.info(f"Filling the VOD cache with {key} from the proxied play" + (f" from byte {offset}" if offset else ""))
+        return VodCacheFill(self, name, key, f, offset, size, content_type, link)
 
-                    # Add the stream URL
-                    playlist_content += f'{stream_link}\n'
-                except Exception as e:
-                    logger.warning(f"Error processing series {series_id}: {str(e)}")
-                    continue
+    def stats(self):
+        with self.lock:
+            self._load()
+            return {
+                "enabled": self.enabled(),
+                "files": len(self.entries),
+                "unfinished": len(self.parts),
+                "bytes": self.total,
+                "max_bytes": self.max_bytes(),
+                "queued": len(self.queued),
+                "deferred": len(self.deferred),
+                "downloading": [{"done": done, "total": total} for done, total in self.progress.values()],
+                "downloads": self.downloads,
+            }
 
-        # Create response
-        response = make_response(playlist_content)
-        response.headers["Content-Type"] = "audio/x-mpegurl"
-        response.headers["Content-Disposition"] = f'attachment; filename="{playlist_name.replace(" ", "_")}.m3u"'
+class VodCacheFill:
+    """
+    Appends the bytes a proxied play serves to an item's ".part" file, and moves
+    the file into the cache once it is complete. Made by VodDiskCache.open_fill.
+    """
+    def __init__(self, cache, name, key, f, done, size, content_type, link):
+        self.cache = cache
+        self.name = name
+        self.key = key
+        self.file = f
+        self.done = done
+        self.size = size
+        self.content_type = content_type
+        self.link = link
 
-        return response
-    except Exception as e:
-        logger.error(f"Error creating series playlist: {e}")
-        return jsonify({"error": f"Error creating playlist: {str(e)}"}), 500
+    def write(self, chunk):
+        if self.file is None:
+            return
+        try:
+            self.file.write(chunk)
+        except OSError as e:
+            logger.warning(f"Stopped filling the VOD cache with {self.key}: {e}")
+            self.close()
+            return
+        self.done += len(chunk)
+        with self.cache.lock:
+            self.cache._grow_part(self.name, self.done)
+            self.cache.progress[self.name] = (self.done, self.size)
+        if self.done >= self.size:
+            self.close()
+
+    def close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        try:
+            if self.done == self.size:
+                self.cache._finish(self.name, self.key, self.done, self.content_type, self.link)
+            elif self.done > self.size:
+                self.cache._drop_part(self.name) # Not the file the size was announced for
+        except OSError as e:
+            logger.warning(f"Error moving {self.key} into the VOD cache: {e}")
+        finally:
+            with self.cache.lock:
+                self.cache.writers.discard(self.name)
+                self.cache.progress.pop(self.name, None)
 
-#endregion
+vod_disk_cache = VodDiskCache(vod_cache_folder)
 
-# region Content Playback Routes
+@app.route("/api/vod/cache/stats", methods=["GET"])
+@authorise
+def vodCacheStats():
+    """
+    Returns VOD download cache usage and download progress.
+    """
+    return jsonify(vod_disk_cache.stats())
 
-@app.route("/play/vod/<portalId>/<movieId>", methods=["GET"])
-def play_vod(portalId, movieId):
+@app.route("/api/vod/cache/<portalId>/<kind>/category/<categoryId>", methods=["POST"])
+@authorise
+def vodCachePopulate(portalId, kind, categoryId):
     """
-    Stream a VOD item from the specified portal.
+    Queues every movie of a VOD category, or every episode of the series of a series
+    category, for download to the VOD cache. Uses the cached catalog, so the category
+    must have been prefetched.
 
     Args:
-        portalId (str): ID of the portal
-        movieId (str): ID of the movie to stream
+        portalId (str): ID of the portal.
+        kind (str): "vod" or "series".
+        categoryId (str): ID of the category.
 
     Returns:
-        Response: Stream response or error
+        JSON with the number of items queued.
     """
-    from_playlist = request.args.get('from_playlist', 'false').lower() == 'true'
-    is_web_view = not from_playlist
-
-    logger.info(f"Request to play VOD: portalId={portalId}, movieId={movieId}")
-    logger.info(f"Web view requested: {is_web_view}, from playlist: {from_playlist}")
-
-    # Get portal details
     portals = getPortals()
     if portalId not in portals:
         return jsonify({"error": "Portal not found"}), 404
+    if kind not in ("vod", "series"):
+        return jsonify({"error": "Unknown content type"}), 404
+    if not vod_disk_cache.enabled():
+        return jsonify({"error": "The VOD cache is disabled"}), 400
 
     portal = portals[portalId]
-    portal_name = portal.get("name", "Unknown Portal")
-    url = portal["url"]
-
-    logger.info(f"Portal found: {portal_name} with URL: {url}")
+    queued = 0
+    items = list(catalog.iter_items(portalId, kind, categoryId))
+    for item in items:
+        if kind == "vod":
+            key = vod_resolver.key(portalId, "vod", item["id"])
+            queued += vod_disk_cache.enqueue(key, portalId, portal, "vod", item["id"])
+            continue
+        for season in catalog.get_seasons(portalId, item["id"]) or []:
+            for episode in catalog.get_episodes(portalId, item["id"], season["id"]) or []:
+                key = vod_resolver.key(portalId, "episode", episode["id"], item["id"], season["id"])
+                queued += vod_disk_cache.enqueue(key, portalId, portal, "episode", episode["id"], item["id"], season["id"])
 
-    # Get available MACs for the portal
-    macs = list(portal["macs"].keys())
-    if not macs:
-        logger.error(f"No MACs available for portal {portalId}")
-        return jsonify({"error": "No MACs available for the portal"}), 400
+    logger.info(f"Queued {queued} items of {kind} category {categoryId} for the VOD cache")
+    return jsonify({"items": len(items), "queued": queued})
 
-    # Use the first available MAC
-    mac = macs[0]
-    proxy = portal.get("proxy")
+#endregion
 
-    logger.info(f"Using MAC: {mac} and proxy: {proxy}")
+# region Next Episode Look-ahead
+
+# Seconds before plays of the same episode trigger another look-ahead (players reconnect and seek)
+NEXT_EPISODE_LOOKAHEAD_INTERVAL = 600
+# Bytes of the next episode read when "warm next episode" is on, so its stream host has it ready
+NEXT_EPISODE_WARM_BYTES = 2 * 1024 * 1024
+# Seconds before the end of the playing episode at which the next one is resolved. Links
+# expire, so one resolved when the episode starts may be dead by the time it ends
+NEXT_EPISODE_READY_BEFORE_END = 120
+# Seconds assumed for episodes whose length the catalog does not give
+NEXT_EPISODE_DEFAULT_LENGTH = 40 * 60
+
+# Episodes whose successor was looked up recently: {vod_resolver key: time}
+next_episode_lookaheads = {}
+next_episode_lock = Lock()
+
+class NextEpisodeScheduler:
+    """
+    Runs each series' pending look-ahead when it is due, from a single timer
+    thread. A series has at most one pending look-ahead: playing another of its
+    episodes replaces it.
+    """
+    def __init__(self):
+        self.pending = {} # {(portal ID, series ID): (time due, prefetchNextEpisode arguments)}
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def schedule(self, portal_id, series_id, due, args):
+        with self.condition:
+            self.pending[(portal_id, series_id)] = (due, args)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True, name="next-episode")
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                now = time.time()
+                ready = [series for series, (due, _) in self.pending.items() if due <= now]
+                if not ready:
+                    next_due = min((due for due, _ in self.pending.values()), default=None)
+                    self.condition.wait(next_due - now if next_due is not None else None)
+                    continue
+                due_args = [self.pending.pop(series)[1] for series in ready]
+            for args in due_args:
+                threading.Thread(target=prefetchNextEpisode, args=args, daemon=True).start()
 
-    # Full authentication process
-    # Step 1: Get token
-    token = stb.getToken(url, mac, proxy)
-    if not token:
-        logger.error(f"Failed to get token for portal {portalId}")
-        if from_playlist:
-            return jsonify({"error": "Authentication failed - could not get token"}), 401
-        return render_template("error.html", error="Failed to authenticate with portal - could not get token.")
+next_episode_scheduler = NextEpisodeScheduler()
 
-    logger.info(f"Successfully obtained token for portal {portalId}")
+def episodeOrder(items, number_field):
+    """
+    Orders cached seasons or episodes by their number, keeping the portal's order
+    for entries without a usable number.
+    """
+    def sort_key(indexed):
+        position, item = indexed
+        try:
+            return (int(item.get(number_field)), position)
+        except (TypeError, ValueError):
+            return (float("inf"), position)
+    return [item for _, item in sorted(enumerate(items), key=sort_key)]
 
-    # Step 2: Full authentication with profile (needed for VOD content)
-    try:
-        # Generate device IDs
-        device_id = stb.generate_device_id(mac)
-        device_id2 = device_id
+def findNextEpisode(portal_id, series_id, season_id, episode_id):
+    """
+    Finds the episode after the given one in the cached episode lists: the next
+    episode of the season, or the first episode of the next season.
 
-        # Generate timestamp and signature
-        import time
-        timestamp = int(time.time())
-        signature = stb.generate_signature(mac, token, [str(timestamp)])
+    Returns:
+        tuple: (season ID, episode dict), or None if there is no next episode.
+    """
+    episodes = episodeOrder(catalog.get_episodes(portal_id, series_id, season_id) or [], "episode_number")
+    ids = [str(episode.get("id")) for episode in episodes]
+    if str(episode_id) not in ids:
+        return None
+    index = ids.index(str(episode_id))
+    if index + 1 < len(episodes):
+        return season_id, episodes[index + 1]
+
+    seasons = episodeOrder(catalog.get_seasons(portal_id, series_id) or [], "season_number")
+    season_ids = [str(season.get("id")) for season in seasons]
+    if str(season_id) not in season_ids:
+        return None
+    for season in seasons[season_ids.index(str(season_id)) + 1:]:
+        episodes = episodeOrder(catalog.get_episodes(portal_id, series_id, season["id"]) or [], "episode_number")
+        if episodes:
+            return str(season["id"]), episodes[0]
+    return None
+
+def episodeLength(portal_id, series_id, season_id, episode_id):
+    """
+    Returns:
+        int: Length of a cached episode in seconds (the catalog gives minutes), or NEXT_EPISODE_DEFAULT_LENGTH.
+    """
+    for episode in catalog.get_episodes(portal_id, series_id, season_id) or []:
+        if str(episode.get("id")) == str(episode_id):
+            try:
+                minutes = int(episode.get("duration") or episode.get("time"))
+            except (TypeError, ValueError):
+                break
+            if minutes > 0:
+                return minutes * 60
+            break
+    return NEXT_EPISODE_DEFAULT_LENGTH
 
-        # Get profile to complete authentication
-        logger.info(f"Getting profile to complete authentication")
-        profile = stb.getProfile(url, mac, token, device_id, device_id2, signature, timestamp, proxy)
+def prefetchNextEpisode(portal_id, portal, series_id, season_id, episode_id, playing_mac=None):
+    """
+    Resolves the link of the episode after the one being played, on another MAC
+    than the one streaming it, so that it starts from the VOD link cache. With
+    "warm next episode" on, its first bytes are read as well. Run by
+    next_episode_scheduler shortly before the playing episode ends.
 
-        if not profile:
-            logger.warning(f"Failed to get profile, but will try to get stream link anyway")
+    Args:
+        portal_id (str): ID of the portal.
+        portal (dict): Portal configuration.
+        series_id (str): Series of the playing episode.
+        season_id (str): Season of the playing episode.
+        episode_id (str): Playing episode.
+        playing_mac (str, optional): MAC streaming the playing episode.
+    """
+    try:
+        found = findNextEpisode(portal_id, series_id, season_id, episode_id)
+        if not found:
+            logger.debug(f"No cached next episode after {episode_id} of series {series_id}")
+            return
+        next_season_id, episode = found
+        next_id = str(episode["id"])
+        next_key = vod_resolver.key(portal_id, "episode", next_id, series_id, next_season_id)
+        if vod_disk_cache.lookup(next_key):
+            return
+
+        with stb.requestPriority(stb.PRIORITY_BACKGROUND):
+            link = vod_resolver.resolve(portal_id, portal, "episode", next_id, series_id, next_season_id,
+                                        avoid=[playing_mac] if playing_mac else ())
+        if not link:
+            logger.debug(f"Next episode {next_id} of series {series_id} not resolved: no link or no MAC besides the playing one")
+            return
+        logger.info(f"Next episode {next_id} of series {series_id} is ready")
+
+        if getSettings().get("warm next episode", "false") == "true":
+            proxy = getPortalProxy(portal, vod_resolver.link_mac(next_key))
+            with stb.openStream(link, f"bytes=0-{NEXT_EPISODE_WARM_BYTES - 1}", proxy) as upstream:
+                read = 0
+                for chunk in upstream.iter_content(VOD_PROXY_CHUNK_SIZE):
+                    read += len(chunk)
+                    if read >= NEXT_EPISODE_WARM_BYTES:
+                        break # The host may ignore the range
     except Exception as e:
-        logger.warning(f"Error in profile authentication: {str(e)}")
+        logger.warning(f"Error preparing the next episode after {episode_id}: {e}")
+
+def lookAheadNextEpisode(portal_id, portal, series_id, season_id, episode_id):
+    """
+    Gets the next episode ready while one plays, at most once per
+    NEXT_EPISODE_LOOKAHEAD_INTERVAL for the same episode. Called once the
+    episode's play has started.
+
+    Links expire, so the next episode's link is resolved shortly before the
+    playing one ends (see prefetchNextEpisode). With the VOD cache enabled the
+    next episode is also queued for download, which starts once the portal is
+    no longer playing.
+    """
+    key = vod_resolver.key(portal_id, "episode", episode_id, series_id, season_id)
+    playing_mac = vod_resolver.link_mac(key)
+    now = time.time()
+    with next_episode_lock:
+        if now - next_episode_lookaheads.get(key, 0) < NEXT_EPISODE_LOOKAHEAD_INTERVAL:
+            return
+        next_episode_lookaheads[key] = now
+        if len(next_episode_lookaheads) > 1000:
+            for old_key, started in list(next_episode_lookaheads.items()):
+                if now - started >= NEXT_EPISODE_LOOKAHEAD_INTERVAL:
+                    del next_episode_lookaheads[old_key]
 
-    # Try to get stream link
     try:
-        logger.info(f"Attempting to get stream link for movie {movieId}")
-        stream_link = stb.getVodSeriesLink(url, mac, token, movieId, "vod", proxy=proxy)
-
-        if not stream_link:
-            logger.error(f"Failed to get stream link for movie {movieId}")
-            if from_playlist:
-                return jsonify({"error": "Failed to get stream link"}), 404
-            return render_template("error.html", error="Failed to get stream link for the movie.")
+        if vod_disk_cache.enabled():
+            found = findNextEpisode(portal_id, series_id, season_id, episode_id)
+            if found:
+                next_season_id, episode = found
+                next_key = vod_resolver.key(portal_id, "episode", str(episode["id"]), series_id, next_season_id)
+                vod_disk_cache.enqueue(next_key, portal_id, portal, "episode", str(episode["id"]), series_id, next_season_id)
+        ready_before_end = min(NEXT_EPISODE_READY_BEFORE_END, vod_resolver.portal_ttl(portal_id) / 2)
+        due = now + max(0, episodeLength(portal_id, series_id, season_id, episode_id) - ready_before_end)
+    except Exception as e:
+        logger.warning(f"Error looking ahead of episode {episode_id}: {e}")
+        return
+    next_episode_scheduler.schedule(portal_id, series_id, due, (portal_id, portal, series_id, season_id, episode_id, playing_mac))
 
-        # Handle stream links that require authentication
-        if isinstance(stream_link, dict) and "auth" in stream_link:
-            logger.info("Stream requires authentication, sending headers and cookies")
+#endregion
 
-            if from_playlist:
-                # For playlists, return headers and cookies for direct stream access
-                headers = stream_link.get('auth', {}).get('headers', {})
-                cookies = stream_link.get('auth', {}).get('cookies', {})
-                direct_url = stream_link.get('url', '')
+# region Content Playback Routes
 
-                return jsonify({
-                    "direct_url": direct_url,
-                    "headers": headers,
-                    "cookies": cookies
-                })
-            else:
-                # For web view, we'll use our player to handle auth
-                return render_template(
-                    "player.html",
-                    stream_url=stream_link.get('url', ''),
-                    stream_headers=json.dumps(stream_link.get('auth', {}).get('headers', {})),
-                    stream_cookies=json.dumps(stream_link.get('auth', {}).get('cookies', {})),
-                    title=f"VOD: {movieId}"
-                )
-
-        # Regular direct stream URL
-        logger.info(f"Stream link found: {stream_link[:100] if isinstance(stream_link, str) else 'Unknown type'}...")
+@app.route("/play/vod/<portalId>/<movieId>", methods=["GET"])
+@requestPriority(stb.PRIORITY_LIVE)
+def play_vod(portalId, movieId):
+    """
+    Stream a VOD item from the specified portal.
 
-        if from_playlist:
-            # For playlists, return direct URL
-            return jsonify({"direct_url": stream_link})
-        else:
-            # For web view, check if we should use player or redirect
-            if request.args.get('player', 'false').lower() == 'true':
-                return render_template("player.html", stream_url=stream_link, title=f"VOD: {movieId}")
-            else:
-                return redirect(stream_link)
+    Args:
+        portalId (str): ID of the portal
+        movieId (str): ID of the movie to stream
 
-    except Exception as e:
-        logger.error(f"Error playing VOD item: {str(e)}")
-        if from_playlist:
-            return jsonify({"error": str(e)}), 500
-        return render_template("error.html", error=f"Error playing movie: {str(e)}")
+    Returns:
+        Response: Stream response or error
+    """
+    logger.info(f"Request to play VOD: portalId={portalId}, movieId={movieId}")
+    return playVodContent(portalId, "vod", movieId, f"VOD: {movieId}", "movie")
 
 @app.route("/play/series/<portalId>/<seriesId>", methods=["GET"])
+@requestPriority(stb.PRIORITY_LIVE)
 def play_series(portalId, seriesId):
     """
     Stream a Series from the specified portal.
@@ -4636,122 +8245,11 @@ def play_series(portalId, seriesId):
     Returns:
         Response: Stream response or error
     """
-    from_playlist = request.args.get('from_playlist', 'false').lower() == 'true'
-    is_web_view = not from_playlist
-
     logger.info(f"Request to play series: portalId={portalId}, seriesId={seriesId}")
-    logger.info(f"Web view requested: {is_web_view}, from playlist: {from_playlist}")
-
-    # Get portal details
-    portals = getPortals()
-    if portalId not in portals:
-        return jsonify({"error": "Portal not found"}), 404
-
-    portal = portals[portalId]
-    portal_name = portal.get("name", "Unknown Portal")
-    url = portal["url"]
-
-    logger.info(f"Portal found: {portal_name} with URL: {url}")
-
-    # Get available MACs for the portal
-    macs = list(portal["macs"].keys())
-    if not macs:
-        logger.error(f"No MACs available for portal {portalId}")
-        return jsonify({"error": "No MACs available for the portal"}), 400
-
-    # Use the first available MAC
-    mac = macs[0]
-    proxy = portal.get("proxy")
-
-    logger.info(f"Using MAC: {mac} and proxy: {proxy}")
-
-    # Full authentication process
-    # Step 1: Get token
-    token = stb.getToken(url, mac, proxy)
-    if not token:
-        logger.error(f"Failed to get token for portal {portalId}")
-        if from_playlist:
-            return jsonify({"error": "Authentication failed - could not get token"}), 401
-        return render_template("error.html", error="Failed to authenticate with portal - could not get token.")
-
-    logger.info(f"Successfully obtained token for portal {portalId}")
-
-    # Step 2: Full authentication with profile (needed for series content)
-    try:
-        # Generate device IDs
-        device_id = stb.generate_device_id(mac)
-        device_id2 = device_id
-
-        # Generate timestamp and signature
-        import time
-        timestamp = int(time.time())
-        signature = stb.generate_signature(mac, token, [str(timestamp)])
-
-        # Get profile to complete authentication
-        logger.info(f"Getting profile to complete authentication")
-        profile = stb.getProfile(url, mac, token, device_id, device_id2, signature, timestamp, proxy)
-
-        if not profile:
-            logger.warning(f"Failed to get profile, but will try to get stream link anyway")
-    except Exception as e:
-        logger.warning(f"Error in profile authentication: {str(e)}")
-
-    # Try to get stream link
-    try:
-        logger.info(f"Attempting to get stream link for series {seriesId}")
-        stream_link = stb.getVodSeriesLink(url, mac, token, seriesId, "series", proxy=proxy)
-
-        if not stream_link:
-            logger.error(f"Failed to get stream link for series {seriesId}")
-            if from_playlist:
-                return jsonify({"error": "Failed to get stream link"}), 404
-            return render_template("error.html", error="Failed to get stream link for the series.")
-
-        # Handle stream links that require authentication
-        if isinstance(stream_link, dict) and "auth" in stream_link:
-            logger.info("Stream requires authentication, sending headers and cookies")
-
-            if from_playlist:
-                # For playlists, return headers and cookies for direct stream access
-                headers = stream_link.get('auth', {}).get('headers', {})
-                cookies = stream_link.get('auth', {}).get('cookies', {})
-                direct_url = stream_link.get('url', '')
-
-                return jsonify({
-                    "direct_url": direct_url,
-                    "headers": headers,
-                    "cookies": cookies
-                })
-            else:
-                # For web view, we'll use our player to handle auth
-                return render_template(
-                    "player.html",
-                    stream_url=stream_link.get('url', ''),
-                    stream_headers=json.dumps(stream_link.get('auth', {}).get('headers', {})),
-                    stream_cookies=json.dumps(stream_link.get('auth', {}).get('cookies', {})),
-                    title=f"Series: {seriesId}"
-                )
-
-        # Regular direct stream URL
-        logger.info(f"Stream link found: {stream_link[:100] if isinstance(stream_link, str) else 'Unknown type'}...")
-
-        if from_playlist:
-            # For playlists, return direct URL
-            return jsonify({"direct_url": stream_link})
-        else:
-            # For web view, check if we should use player or redirect
-            if request.args.get('player', 'false').lower() == 'true':
-                return render_template("player.html", stream_url=stream_link, title=f"Series: {seriesId}")
-            else:
-                return redirect(stream_link)
-
-    except Exception as e:
-        logger.error(f"Error playing series: {str(e)}")
-        if from_playlist:
-            return jsonify({"error": str(e)}), 500
-        return render_template("error.html", error=f"Error playing series: {str(e)}")
+    return playVodContent(portalId, "series", seriesId, f"Series: {seriesId}", "series")
 
 @app.route("/play/series/<portalId>/<seriesId>/<seasonId>/<episodeId>", methods=["GET"])
+@requestPriority(stb.PRIORITY_LIVE)
 def play_episode(portalId, seriesId, seasonId, episodeId):
     """
     Stream a Series episode from the specified portal.
@@ -4765,128 +8263,8 @@ def play_episode(portalId, seriesId, seasonId, episodeId):
     Returns:
         Response: Stream response or error
     """
-    from_playlist = request.args.get('from_playlist', 'false').lower() == 'true'
-    is_web_view = not from_playlist
-
     logger.info(f"Request to play episode: portalId={portalId}, seriesId={seriesId}, seasonId={seasonId}, episodeId={episodeId}")
-    logger.info(f"Web view requested: {is_web_view}, from playlist: {from_playlist}")
-
-    # Get portal details
-    portals = getPortals()
-    if portalId not in portals:
-        return jsonify({"error": "Portal not found"}), 404
-
-    portal = portals[portalId]
-    portal_name = portal.get("name", "Unknown Portal")
-    url = portal["url"]
-
-    logger.info(f"Portal found: {portal_name} with URL: {url}")
-
-    # Get available MACs for the portal
-    macs = list(portal["macs"].keys())
-    if not macs:
-        logger.error(f"No MACs available for portal {portalId}")
-        return jsonify({"error": "No MACs available for the portal"}), 400
-
-    # Use the first available MAC
-    mac = macs[0]
-    proxy = portal.get("proxy")
-
-    logger.info(f"Using MAC: {mac} and proxy: {proxy}")
-
-    # Full authentication process
-    # Step 1: Get token
-    token = stb.getToken(url, mac, proxy)
-    if not token:
-        logger.error(f"Failed to get token for portal {portalId}")
-        if from_playlist:
-            return jsonify({"error": "Authentication failed - could not get token"}), 401
-        return render_template("error.html", error="Failed to authenticate with portal - could not get token.")
-
-    logger.info(f"Successfully obtained token for portal {portalId}")
-
-    # Step 2: Full authentication with profile (needed for episode content)
-    try:
-        # Generate device IDs
-        device_id = stb.generate_device_id(mac)
-        device_id2 = device_id
-
-        # Generate timestamp and signature
-        import time
-        timestamp = int(time.time())
-        signature = stb.generate_signature(mac, token, [str(timestamp)])
-
-        # Get profile to complete authentication
-        logger.info(f"Getting profile to complete authentication")
-        profile = stb.getProfile(url, mac, token, device_id, device_id2, signature, timestamp, proxy)
-
-        if not profile:
-            logger.warning(f"Failed to get profile, but will try to get stream link anyway")
-    except Exception as e:
-        logger.warning(f"Error in profile authentication: {str(e)}")
-
-    # Try to get stream link
-    try:
-        # Create series info dict for episode
-        series_info = {
-            "series_id": seriesId,
-            "season_id": seasonId,
-            "episode_id": episodeId,
-            "episode_number": episodeId  # Use episode ID as number if actual number is not available
-        }
-
-        logger.info(f"Attempting to get stream link for episode {episodeId}")
-        stream_link = stb.getVodSeriesLink(url, mac, token, episodeId, "episode", series_info, proxy=proxy)
-
-        if not stream_link:
-            logger.error(f"Failed to get stream link for episode {episodeId}")
-            if from_playlist:
-                return jsonify({"error": "Failed to get stream link"}), 404
-            return render_template("error.html", error="Failed to get stream link for the episode.")
-
-        # Handle stream links that require authentication
-        if isinstance(stream_link, dict) and "auth" in stream_link:
-            logger.info("Stream requires authentication, sending headers and cookies")
-
-            if from_playlist:
-                # For playlists, return headers and cookies for direct stream access
-                headers = stream_link.get('auth', {}).get('headers', {})
-                cookies = stream_link.get('auth', {}).get('cookies', {})
-                direct_url = stream_link.get('url', '')
-
-                return jsonify({
-                    "direct_url": direct_url,
-                    "headers": headers,
-                    "cookies": cookies
-                })
-            else:
-                # For web view, we'll use our player to handle auth
-                return render_template(
-                    "player.html",
-                    stream_url=stream_link.get('url', ''),
-                    stream_headers=json.dumps(stream_link.get('auth', {}).get('headers', {})),
-                    stream_cookies=json.dumps(stream_link.get('auth', {}).get('cookies', {})),
-                    title=f"Episode: {episodeId}"
-                )
-
-        # Regular direct stream URL
-        logger.info(f"Stream link found: {stream_link[:100] if isinstance(stream_link, str) else 'Unknown type'}...")
-
-        if from_playlist:
-            # For playlists, return direct URL
-            return jsonify({"direct_url": stream_link})
-        else:
-            # For web view, check if we should use player or redirect
-            if request.args.get('player', 'false').lower() == 'true':
-                return render_template("player.html", stream_url=stream_link, title=f"Episode: {episodeId}")
-            else:
-                return redirect(stream_link)
-
-    except Exception as e:
-        logger.error(f"Error playing episode: {str(e)}")
-        if from_playlist:
-            return jsonify({"error": str(e)}), 500
-        return render_template("error.html", error=f"Error playing episode: {str(e)}")
+    return playVodContent(portalId, "episode", episodeId, f"Episode: {episodeId}", "episode", seriesId, seasonId)
 
 #endregion
 
@@ -4943,8 +8321,8 @@ def get_cached_content(content_type, portal_id, resource_path):
         if not macs:
             return jsonify({"error": "No MACs available"}), 400
 
-        mac = macs[0]
-        proxy = portal.get("proxy")
+        mac = mac_pool.pick(portal_id, portal) # Least busy MAC not needed for live streams
+        proxy = getPortalProxy(portal, mac)
 
         # Get token
         token = stb.getToken(url, mac, proxy)
@@ -5006,5 +8384,17 @@ if __name__ == "__main__":
     logger.info(f"FFprobe path: {ffprobe_path}")
     logger.info(f"Config file: {configFile}")
 
+    # Warm up portal connections and measure mirrors in the background
+    threading.Thread(target=portalMonitor, daemon=True).start()
+
+    # Migrate stored image URLs of portals whose address changed, before they are browsed
+    catalog.normalize_all()
+
+    # Continue prefetch jobs interrupted by the last shutdown
+    resumePrefetchJobs()
+
+    # Turn SIGTERM (docker stop, systemd) into a normal exit so pending writes are flushed
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
     # Serve the Flask application using Waitress
     waitress.serve(app, host=host_addr, port=host_port, threads=10)
\ No newline at end of file
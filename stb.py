@@ -1,5 +1,8 @@
 import requests
 from requests.adapters import HTTPAdapter, Retry
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NameResolutionError, ConnectTimeoutError, NewConnectionError
 from urllib.parse import urlparse
 import re
 import hashlib
@@ -7,6 +10,12 @@ import time
 import json
 import logging
 import traceback
+import threading
+import socket
+import itertools
+import heapq
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -30,10 +39,888 @@ class OrderedListError(StalkerPortalError):
     pass
 
 # Global session
+# Connection pools: hosts kept (portals, mirrors, proxies) and keep-alive connections per host
+POOL_CONNECTIONS = 20
+POOL_MAXSIZE = 32
+
+# How long a resolved host name is reused before it is looked up again
+DNS_CACHE_TTL = 300
+
+# Resolved addresses: {getaddrinfo arguments: (expiry time, result)}
+_dns_cache = {}
+_dns_cache_lock = threading.Lock()
+_getaddrinfo = socket.getaddrinfo
+
+
+def _cachedGetaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
+    """
+    socket.getaddrinfo() with a TTL cache. If a lookup fails, the expired
+    result is used rather than failing the request.
+    """
+    key = (host, port, family, type, proto, flags)
+    now = time.time()
+    with _dns_cache_lock:
+        cached = _dns_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    try:
+        result = _getaddrinfo(host, port, family, type, proto, flags)
+    except socket.gaierror:
+        if cached:
+            logger.warning(f"DNS lookup for {host} failed, using the cached address")
+            return cached[1]
+        raise
+
+    with _dns_cache_lock:
+        _dns_cache[key] = (now + DNS_CACHE_TTL, result)
+    return result
+
+
+def _createConnection(address, timeout, source_address=None, socket_options=None):
+    """
+    socket.create_connection() resolving through the DNS cache.
+
+    Args:
+        address (tuple): (host, port) to connect to.
+        timeout: Socket timeout; the urllib3 default sentinel leaves the socket default.
+        source_address (tuple, optional): Local address to bind.
+        socket_options (list, optional): setsockopt() arguments applied before connecting.
+
+    Returns:
+        socket.socket: The connected socket.
+    """
+    host, port = address
+    if host.startswith("["):
+        host = host.strip("[]")
+    error = None
+    for family, socktype, proto, _, sockaddr in _cachedGetaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        sock = None
+        try:
+            sock = socket.socket(family, socktype, proto)
+            for option in socket_options or []:
+                sock.setsockopt(*option)
+            if timeout is None or isinstance(timeout, (int, float)):
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            error = e
+            if sock is not None:
+                sock.close()
+    if error is not None:
+        raise error
+    raise OSError("getaddrinfo returns an empty list")
+
+
+class _CachedDnsConnection:
+    """Opens the socket through the DNS cache, otherwise a plain urllib3 connection."""
+    def _new_conn(self):
+        try:
+            return _createConnection(
+                (self._dns_host, self.port),
+                self.timeout,
+                source_address=self.source_address,
+                socket_options=self.socket_options,
+            )
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        except socket.timeout as e:
+            raise ConnectTimeoutError(self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})") from e
+        except OSError as e:
+            raise NewConnectionError(self, f"Failed to establish a new connection: {e}") from e
+
+
+class _CachedDnsHTTPConnection(_CachedDnsConnection, HTTPConnection):
+    pass
+
+
+class _CachedDnsHTTPSConnection(_CachedDnsConnection, HTTPSConnection):
+    pass
+
+
+class _CachedDnsHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CachedDnsHTTPConnection
+
+
+class _CachedDnsHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CachedDnsHTTPSConnection
+
+
+_CACHED_DNS_POOL_CLASSES = {"http": _CachedDnsHTTPConnectionPool, "https": _CachedDnsHTTPSConnectionPool}
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections resolve host names through the DNS cache.
+    Only sessions that mount it are affected, socket.getaddrinfo is left alone.
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = _CACHED_DNS_POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS managers bring their own connection classes
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = _CACHED_DNS_POOL_CLASSES
+        return manager
+
+
 s = requests.Session()
 retries = Retry(total=3, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-s.mount("http://", HTTPAdapter(max_retries=retries))
-s.mount("https://", HTTPAdapter(max_retries=retries))
+s.mount("http://", CachedDnsAdapter(max_retries=retries, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE))
+s.mount("https://", CachedDnsAdapter(max_retries=retries, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE))
+
+
+def clearDnsCache(host=None):
+    """
+    Drops cached DNS results.
+
+    Args:
+        host (str, optional): Host name to drop. Drops everything if omitted.
+    """
+    with _dns_cache_lock:
+        if host is None:
+            _dns_cache.clear()
+        else:
+            for key in [key for key in _dns_cache if key[0] == host]:
+                del _dns_cache[key]
+
+# Request priority classes, lower value is served first
+PRIORITY_LIVE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_LIVE: "live",
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Default request budget per portal host
+DEFAULT_REQUEST_RATE = 10.0  # requests per second (token bucket refill rate)
+DEFAULT_REQUEST_BURST = 20  # token bucket size
+DEFAULT_MAX_IN_FLIGHT = 8  # concurrent requests
+
+
+class PortalScheduler:
+    """
+    Request budget for a single portal host.
+
+    Combines a token bucket (sustained rate + burst) with a limit on concurrent
+    requests. Waiting requests are granted strictly by priority class, then in
+    arrival order. Live requests never wait: they may overdraw the bucket and
+    exceed the in-flight limit, and the debt is paid back by lower classes.
+    """
+    def __init__(self, rate=DEFAULT_REQUEST_RATE, burst=DEFAULT_REQUEST_BURST, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        """
+        Initializes the PortalScheduler.
+
+        Args:
+            rate (float): Sustained requests per second. 0 disables rate limiting.
+            burst (int): Maximum number of requests that can be sent back-to-back.
+            max_in_flight (int): Maximum concurrent requests. 0 disables the limit.
+        """
+        self.rate = float(rate)
+        self.burst = max(1, int(burst))
+        self.max_in_flight = int(max_in_flight)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.in_flight = 0
+        self.waiting = []  # Heap of (priority, sequence)
+        self.sequence = itertools.count()
+        self.cond = threading.Condition()
+        self.granted = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_time = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    def configure(self, rate=None, burst=None, max_in_flight=None):
+        """
+        Updates the budget. Arguments left as None keep their current value.
+        """
+        with self.cond:
+            self._refill()
+            if rate is not None:
+                self.rate = float(rate)
+            if burst is not None:
+                self.burst = max(1, int(burst))
+                self.tokens = min(self.tokens, float(self.burst))
+            if max_in_flight is not None:
+                self.max_in_flight = int(max_in_flight)
+            self.cond.notify_all()
+
+    def _refill(self):
+        """
+        Adds tokens for the time elapsed since the last refill. Caller must hold the lock.
+        """
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        else:
+            self.tokens = float(self.burst)
+        self.updated = now
+
+    def _can_start(self):
+        """
+        Checks if a request may start now. Caller must hold the lock.
+        """
+        has_slot = self.max_in_flight <= 0 or self.in_flight < self.max_in_flight
+        return has_slot and self.tokens >= 1
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Blocks until a request of the given priority may be sent.
+
+        Args:
+            priority (int): One of the PRIORITY_* constants.
+        """
+        started = time.monotonic()
+        with self.cond:
+            self._refill()
+
+            if priority <= PRIORITY_LIVE:
+                self.tokens -= 1
+                self.in_flight += 1
+                self.granted[PRIORITY_LIVE] += 1
+                return
+
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    self._refill()
+                    if self.waiting[0] == entry and self._can_start():
+                        heapq.heappop(self.waiting)
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        self.granted[priority] = self.granted.get(priority, 0) + 1
+                        self.wait_time[priority] = self.wait_time.get(priority, 0.0) + (time.monotonic() - started)
+                        # Let the next waiter re-check, it may be able to start too
+                        self.cond.notify_all()
+                        return
+
+                    # Sleep until a token is due, or until a request finishes
+                    timeout = None
+                    if self.tokens < 1 and self.rate > 0:
+                        timeout = (1 - self.tokens) / self.rate
+                    self.cond.wait(timeout)
+            except BaseException:
+                if entry in self.waiting:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.cond.notify_all()
+                raise
+
+    def release(self):
+        """
+        Marks a request started with acquire() as finished.
+        """
+        with self.cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.cond.notify_all()
+
+    def stats(self):
+        """
+        Returns a snapshot of the scheduler state.
+
+        Returns:
+            dict: Budget, current load and per-class counters.
+        """
+        with self.cond:
+            self._refill()
+            return {
+                "rate": self.rate,
+                "burst": self.burst,
+                "max_in_flight": self.max_in_flight,
+                "tokens": round(self.tokens, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self.waiting),
+                "granted": {PRIORITY_NAMES[p]: n for p, n in self.granted.items()},
+                "wait_time": {PRIORITY_NAMES[p]: round(t, 3) for p, t in self.wait_time.items()},
+            }
+
+
+# Schedulers per portal host: {netloc: PortalScheduler}
+_schedulers = {}
+_schedulers_lock = threading.Lock()
+
+# Priority of stb.* calls made by the current thread
+_request_context = threading.local()
+
+
+def getScheduler(url):
+    """
+    Returns the scheduler shared by every request to the host of the given URL.
+
+    Args:
+        url (str): Any URL on the portal host
+
+    Returns:
+        PortalScheduler: The host's scheduler
+    """
+    key = urlparse(url).netloc
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = PortalScheduler()
+            _schedulers[key] = scheduler
+        return scheduler
+
+
+def configureScheduler(url, rate=None, burst=None, max_in_flight=None):
+    """
+    Sets the request budget for a portal host.
+
+    Args:
+        url (str): Portal URL
+        rate (float, optional): Sustained requests per second, 0 for unlimited
+        burst (int, optional): Token bucket size
+        max_in_flight (int, optional): Concurrent request limit, 0 for unlimited
+    """
+    getScheduler(url).configure(rate=rate, burst=burst, max_in_flight=max_in_flight)
+
+
+def getSchedulerStats():
+    """
+    Returns scheduler statistics for all known portal hosts.
+
+    Returns:
+        dict: {host: stats}
+    """
+    with _schedulers_lock:
+        schedulers = dict(_schedulers)
+    return {host: scheduler.stats() for host, scheduler in schedulers.items()}
+
+
+@contextmanager
+def requestPriority(priority):
+    """
+    Context manager setting the priority of all stb.* calls made by the current thread.
+
+    Example:
+        with stb.requestPriority(stb.PRIORITY_LIVE):
+            link = stb.getLink(url, mac, token, cmd, proxy)
+    """
+    previous = getattr(_request_context, "priority", None)
+    _request_context.priority = priority
+    try:
+        yield
+    finally:
+        _request_context.priority = previous
+
+
+def currentPriority():
+    """
+    Returns the priority of stb.* calls made by the current thread.
+    """
+    priority = getattr(_request_context, "priority", None)
+    return PRIORITY_INTERACTIVE if priority is None else priority
+
+
+# Proxy health tracking
+PROXY_LATENCY_ALPHA = 0.3  # Weight of the newest sample in the latency moving average
+PROXY_MAX_FAILURES = 3  # Consecutive failures before a proxy is ejected
+PROXY_SLOW_LATENCY = 5.0  # Average latency (seconds) above which a proxy is ejected
+PROXY_MIN_SAMPLES = 5  # Samples needed before a proxy can be ejected for being slow
+PROXY_EJECT_TIME = 60  # Initial ejection period in seconds, doubled on repeated ejections
+PROXY_MAX_EJECT_TIME = 600
+
+
+class ProxyHealth:
+    """
+    Latency and failure tracking for a single proxy.
+    """
+    kind = "proxy"
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.latency = None  # Exponential moving average, seconds
+        self.samples = 0
+        self.failures = 0  # Consecutive failures
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.ejections = 0
+        self.ejected_until = 0
+
+    def is_healthy(self, now=None):
+        return (now or time.time()) >= self.ejected_until
+
+    def score(self):
+        """
+        Expected cost of sending one more request through this proxy (lower is better).
+        """
+        latency = self.latency if self.latency is not None else 1.0
+        return latency * (1 + self.in_flight) * (1 + self.failures)
+
+    def _eject(self, reason):
+        period = min(PROXY_EJECT_TIME * (2 ** self.ejections), PROXY_MAX_EJECT_TIME)
+        self.ejections += 1
+        self.ejected_until = time.time() + period
+        self.failures = 0
+        self.samples = 0
+        self.latency = None
+        logger.warning(f"Ejecting {self.kind} {self.proxy} for {period}s: {reason}")
+
+    def record(self, elapsed, ok):
+        self.requests += 1
+        if ok:
+            self.failures = 0
+            self.samples += 1
+            if self.latency is None:
+                self.latency = elapsed
+            else:
+                self.latency = PROXY_LATENCY_ALPHA * elapsed + (1 - PROXY_LATENCY_ALPHA) * self.latency
+            if self.samples >= PROXY_MIN_SAMPLES and self.latency > PROXY_SLOW_LATENCY:
+                self._eject(f"average latency {self.latency:.2f}s")
+            elif self.samples >= PROXY_MIN_SAMPLES:
+                # A proxy that behaves again earns back the short ejection period
+                self.ejections = 0
+        else:
+            self.errors += 1
+            self.failures += 1
+            if self.failures >= PROXY_MAX_FAILURES:
+                self._eject(f"{self.failures} consecutive failures")
+
+    def stats(self):
+        return {
+            "healthy": self.is_healthy(),
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "ejected_for": max(0, round(self.ejected_until - time.time())),
+        }
+
+
+# Health per proxy URL, shared by all portals: {proxy: ProxyHealth}
+_proxy_health = {}
+_proxy_health_lock = threading.Lock()
+
+
+def _getProxyHealth(proxy):
+    """
+    Returns the health record of a proxy, creating it on first use. Caller must hold the lock.
+    """
+    health = _proxy_health.get(proxy)
+    if health is None:
+        health = ProxyHealth(proxy)
+        _proxy_health[proxy] = health
+    return health
+
+
+def parseProxies(value):
+    """
+    Splits a portal's proxy setting into a list of proxy URLs.
+
+    Args:
+        value (str or list): Comma, space or newline separated proxies, or a list
+
+    Returns:
+        list: Proxy URLs, in configured order
+    """
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = re.split(r"[\s,]+", value)
+    return [proxy.strip() for proxy in value if proxy and proxy.strip()]
+
+
+def selectProxy(proxies, mac=None, background=False):
+    """
+    Picks a proxy from a pool.
+
+    Requests for a MAC stick to the same healthy proxy (rendezvous hashing, so only
+    MACs of an ejected proxy move). Background traffic is spread to the healthy proxy
+    with the lowest expected cost. If every proxy is ejected, the one that comes back
+    first is used.
+
+    Args:
+        proxies (str or list): Proxy pool, see parseProxies()
+        mac (str, optional): MAC address the request is made for
+        background (bool): True for catalog/prefetch traffic
+
+    Returns:
+        str: Proxy URL, or None if the pool is empty
+    """
+    proxies = parseProxies(proxies)
+    if not proxies:
+        return None
+    if len(proxies) == 1:
+        return proxies[0]
+
+    now = time.time()
+    with _proxy_health_lock:
+        records = [_getProxyHealth(proxy) for proxy in proxies]
+        healthy = [record for record in records if record.is_healthy(now)]
+        if not healthy:
+            return min(records, key=lambda record: record.ejected_until).proxy
+
+        if background or not mac:
+            return min(healthy, key=lambda record: record.score()).proxy
+
+        def weight(record):
+            return hashlib.md5(f"{mac}|{record.proxy}".encode()).hexdigest()
+
+        return max(healthy, key=weight).proxy
+
+
+def recordProxyResult(proxy, elapsed, ok):
+    """
+    Records the outcome of a request sent through a proxy.
+
+    Args:
+        proxy (str): Proxy URL
+        elapsed (float): Request duration in seconds
+        ok (bool): False if the request failed at the connection level or with a 5xx
+    """
+    if not proxy:
+        return
+    with _proxy_health_lock:
+        _getProxyHealth(proxy).record(elapsed, ok)
+
+
+def getProxyStats():
+    """
+    Returns health statistics for all known proxies.
+
+    Returns:
+        dict: {proxy: stats}
+    """
+    with _proxy_health_lock:
+        return {proxy: health.stats() for proxy, health in _proxy_health.items()}
+
+
+class MirrorHealth(ProxyHealth):
+    """
+    Latency and failure tracking for a single portal mirror endpoint.
+    """
+    kind = "mirror"
+
+
+# Mirror endpoints per portal: {primary load.php URL: [primary, mirror, ...]}
+_mirrors = {}
+# Reverse index: {endpoint: primary load.php URL}
+_mirror_primary = {}
+# Health per endpoint: {endpoint: MirrorHealth}
+_mirror_health = {}
+_mirror_lock = threading.Lock()
+
+# Timeouts (connect, read) for a mirror probe
+MIRROR_PROBE_TIMEOUT = (3, 5)
+
+
+def _getMirrorHealth(endpoint):
+    """
+    Returns the health record of a mirror endpoint, creating it on first use. Caller must hold the lock.
+    """
+    health = _mirror_health.get(endpoint)
+    if health is None:
+        health = MirrorHealth(endpoint)
+        _mirror_health[endpoint] = health
+    return health
+
+
+def _dropMirrors(url):
+    """
+    Removes the mirror set of a primary URL and the health records no other set uses. Caller must hold the lock.
+    """
+    for endpoint in _mirrors.pop(url, []):
+        if _mirror_primary.get(endpoint) == url:
+            del _mirror_primary[endpoint]
+        if endpoint not in _mirror_primary:
+            _mirror_health.pop(endpoint, None)
+
+
+def registerMirrors(url, mirrors):
+    """
+    Sets the mirror endpoints of a portal. Requests to any of the endpoints are
+    sent to the fastest healthy one and fail over to the others. Endpoints that
+    stay in the set keep their health records.
+
+    Args:
+        url (str): Primary portal URL (load.php endpoint)
+        mirrors (list): Load.php endpoints of mirrors serving the same backend
+    """
+    endpoints = list(dict.fromkeys([url] + [mirror for mirror in (mirrors or []) if mirror]))
+    with _mirror_lock:
+        if _mirrors.get(url, [url]) == endpoints:
+            return # Unchanged, keep the latency scores and ejections
+
+        # Only endpoints that left the set lose their health records
+        kept = set(endpoints) if len(endpoints) > 1 else set()
+        for endpoint in _mirrors.pop(url, []):
+            if endpoint in kept:
+                continue
+            if _mirror_primary.get(endpoint) == url:
+                del _mirror_primary[endpoint]
+            if endpoint not in _mirror_primary:
+                _mirror_health.pop(endpoint, None)
+
+        if len(endpoints) > 1:
+            _mirrors[url] = endpoints
+            for endpoint in endpoints:
+                _mirror_primary[endpoint] = url
+                _getMirrorHealth(endpoint)
+            logger.info(f"Registered {len(endpoints) - 1} mirror(s) for {url}")
+
+
+def unregisterMirrors(url):
+    """
+    Forgets the mirrors of a portal whose URL changed or that was removed.
+
+    Args:
+        url (str): Former primary portal URL (load.php endpoint)
+    """
+    with _mirror_lock:
+        _dropMirrors(url)
+
+
+def getMirrors(url):
+    """
+    Returns the endpoints registered for a portal URL.
+
+    Args:
+        url (str): Primary portal URL (load.php endpoint)
+
+    Returns:
+        list: The primary URL followed by its mirrors, empty if it has no mirrors.
+    """
+    with _mirror_lock:
+        return list(_mirrors.get(url, []))
+
+
+def _splitEndpoint(url):
+    """
+    Splits a request URL into its mirror set and query string.
+
+    Returns:
+        tuple: (primary URL or None, endpoint, query string including "?")
+    """
+    endpoint, sep, query = url.partition("?")
+    return _mirror_primary.get(endpoint), endpoint, sep + query
+
+
+def _mirrorCandidates(primary, priority):
+    """
+    Orders the endpoints of a mirror set for a request class. Caller must hold the lock.
+
+    Live and interactive requests get the fastest healthy mirror first. Background
+    requests keep that mirror free for zapping when another mirror is answering
+    and go to the next best instead. Ejected mirrors are kept at the end, soonest back first,
+    so that a request still has somewhere to go if everything is down.
+    """
+    now = time.time()
+    records = [_getMirrorHealth(endpoint) for endpoint in _mirrors.get(primary, [primary])]
+    healthy = sorted((record for record in records if record.is_healthy(now)), key=lambda record: record.score())
+    ejected = sorted((record for record in records if not record.is_healthy(now)), key=lambda record: record.ejected_until)
+
+    if priority == PRIORITY_BACKGROUND and len(healthy) > 1 and healthy[1].failures == 0:
+        healthy = healthy[1:] + healthy[:1]
+
+    return [record.proxy for record in healthy + ejected]
+
+
+def selectMirror(url, priority=PRIORITY_INTERACTIVE):
+    """
+    Returns the endpoint a request class should currently use for a portal.
+
+    Args:
+        url (str): Portal URL (load.php endpoint)
+        priority (int): Request class
+
+    Returns:
+        str: Endpoint URL, the given URL if the portal has no mirrors
+    """
+    with _mirror_lock:
+        primary = _mirror_primary.get(url)
+        if not primary:
+            return url
+        return _mirrorCandidates(primary, priority)[0]
+
+
+def recordMirrorResult(endpoint, elapsed, ok):
+    """
+    Records the outcome of a request sent to a mirror endpoint.
+
+    Args:
+        endpoint (str): Load.php endpoint
+        elapsed (float): Request duration in seconds
+        ok (bool): False if the request failed at the connection level or with a 5xx
+    """
+    with _mirror_lock:
+        if endpoint in _mirror_primary:
+            _getMirrorHealth(endpoint).record(elapsed, ok)
+
+
+def probeMirrors(url, proxy=None):
+    """
+    Measures the latency and availability of every endpoint of a portal.
+
+    A plain request to load.php is cheap and answered by any live Stalker backend,
+    so it is used instead of a handshake to keep the MACs out of it.
+
+    Args:
+        url (str): Primary portal URL
+        proxy (str, optional): Proxy URL
+    """
+    with _mirror_lock:
+        endpoints = list(_mirrors.get(url, []))
+    if not endpoints:
+        return
+
+    proxies = {"http": proxy, "https": proxy} if proxy else None
+
+    def probe(endpoint):
+        started = time.monotonic()
+        try:
+            # Probes go through the session, so they keep the mirror's connections warm too
+            response = s.get(endpoint, proxies=proxies, timeout=MIRROR_PROBE_TIMEOUT)
+            ok = response.status_code < 500
+            _last_used[urlparse(endpoint).netloc] = time.monotonic()
+        except requests.RequestException:
+            ok = False
+        recordMirrorResult(endpoint, time.monotonic() - started, ok)
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        list(executor.map(probe, endpoints))
+
+
+# Keep-alive connections are re-opened for hosts idle for longer than this many seconds
+CONNECTION_IDLE_TIME = 60
+
+# Last request time per host: {netloc: time.monotonic()}
+_last_used = {}
+
+
+def warmConnections(urls, proxy=None, idle=CONNECTION_IDLE_TIME):
+    """
+    Resolves portal hosts and opens keep-alive connections to them, so that the
+    next real request skips DNS and the TCP/TLS handshake.
+
+    Hosts that served a request within the idle time are skipped, their
+    connections are still warm.
+
+    Args:
+        urls (list): Load.php endpoints of a portal and its mirrors
+        proxy (str, optional): Proxy URL the portal is reached through
+        idle (float): Minimum idle time in seconds before a host is warmed again
+
+    Returns:
+        int: Number of hosts warmed
+    """
+    now = time.monotonic()
+    targets = [url for url in dict.fromkeys(urls) if url and now - _last_used.get(urlparse(url).netloc, float("-inf")) >= idle]
+    if not targets:
+        return 0
+
+    proxies = {"http": proxy, "https": proxy} if proxy else None
+
+    def warm(url):
+        try:
+            # Reading the body hands the connection back to the session pool
+            s.get(url, proxies=proxies, timeout=MIRROR_PROBE_TIMEOUT).content
+            _last_used[urlparse(url).netloc] = time.monotonic()
+            return True
+        except requests.RequestException as e:
+            logger.debug(f"Warm-up of {url} failed: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+        warmed = sum(executor.map(warm, targets))
+    logger.debug(f"Warmed {warmed}/{len(targets)} portal connections")
+    return warmed
+
+
+def getMirrorStats():
+    """
+    Returns health statistics for all portal mirrors.
+
+    Returns:
+        dict: {primary URL: {endpoint: stats}}
+    """
+    with _mirror_lock:
+        return {
+            primary: {endpoint: _getMirrorHealth(endpoint).stats() for endpoint in endpoints}
+            for primary, endpoints in _mirrors.items()
+        }
+
+
+def _get(url, **kwargs):
+    """
+    Sends a GET request to a portal through the host's scheduler and records
+    the outcome against the proxy used, if any.
+
+    If the portal has mirrors the request goes to the best mirror for its class
+    and fails over to the next one on a connection error or 5xx response.
+
+    Args:
+        url (str): Request URL
+        **kwargs: Passed on to requests.Session.get
+
+    Returns:
+        requests.Response: The response
+    """
+    priority = currentPriority()
+    with _mirror_lock:
+        primary, endpoint, query = _splitEndpoint(url)
+        candidates = _mirrorCandidates(primary, priority) if primary else [endpoint]
+
+    # Mirrors share one backend, so they share the primary host's request budget
+    scheduler = getScheduler(primary or url)
+    for index, candidate in enumerate(candidates):
+        last = index == len(candidates) - 1
+        try:
+            response = _send(scheduler, priority, candidate + query, **kwargs)
+        except requests.RequestException as e:
+            if primary:
+                recordMirrorResult(candidate, 0, False)
+            if last:
+                raise
+            logger.warning(f"Mirror {candidate} failed ({e}), trying next mirror")
+            continue
+
+        if primary:
+            recordMirrorResult(candidate, response.elapsed.total_seconds(), response.status_code < 500)
+        if response.status_code < 500 or last:
+            return response
+        logger.warning(f"Mirror {candidate} returned {response.status_code}, trying next mirror")
+
+
+def _send(scheduler, priority, url, **kwargs):
+    """
+    Sends a single GET request under the scheduler and records the outcome
+    against the proxy used, if any.
+    """
+    proxy = (kwargs.get("proxies") or {}).get("http")
+    if proxy:
+        with _proxy_health_lock:
+            _getProxyHealth(proxy).in_flight += 1
+
+    scheduler.acquire(priority)
+    started = time.monotonic()
+    host = urlparse(url).netloc
+    ok = False
+    try:
+        response = s.get(url, **kwargs)
+        ok = response.status_code < 500
+        return response
+    except requests.ConnectionError:
+        # The host may have moved, look it up again next time
+        clearDnsCache(urlparse(url).hostname)
+        raise
+    finally:
+        _last_used[host] = time.monotonic()
+        scheduler.release()
+        if proxy:
+            with _proxy_health_lock:
+                health = _getProxyHealth(proxy)
+                health.in_flight = max(0, health.in_flight - 1)
+                health.record(time.monotonic() - started, ok)
+
 
 def generate_device_id(mac_address):
     # Example of creating a simple device ID (adjust hashing algorithm if needed)
@@ -45,79 +932,154 @@ def generate_signature(mac_address, token, params):
     return hashlib.sha256(combined.encode()).hexdigest().upper()
 
 
+# Candidate locations of the portal's xpcom.common.js, relative to the base URL
+XPCOM_PATHS = [
+    "/c/xpcom.common.js",
+    "/client/xpcom.common.js",
+    "/c_/xpcom.common.js",
+    "/stalker_portal/c/xpcom.common.js",
+    "/stalker_portal/c_/xpcom.common.js",
+]
+
+# Precompiled patterns used to parse xpcom.common.js
+_PATTERN_RE = re.compile(r"\s*var\s*pattern.*\/(\(http.*)\/;")
+_PROTOCOL_INDEX_RE = re.compile(r"this\.portal_protocol.*(\d).*;")
+_IP_INDEX_RE = re.compile(r"this\.portal_ip.*(\d).*;")
+_PATH_INDEX_RE = re.compile(r"this\.portal_path.*(\d).*;")
+_AJAX_LOADER_RE = re.compile(r"this\.ajax_loader=(.*\.php);")
+
+# Timeouts (connect, read) for a single discovery probe
+DISCOVERY_TIMEOUT = (3, 5)
+# Overall time budget for a discovery run before falling back to the default path
+DISCOVERY_DEADLINE = 10
+
+# Resolved load.php endpoints per base URL: {base_url: (portal_url, expires_at)}
+URL_CACHE_TTL = 24 * 3600
+URL_FALLBACK_TTL = 300
+_url_cache = {}
+_url_cache_lock = threading.Lock()
+
+
+def _parsePortalScript(url, text):
+    """
+    Extracts the load.php endpoint from the contents of xpcom.common.js.
+
+    Args:
+        url (str): URL the script was fetched from
+        text (str): Script contents
+
+    Returns:
+        str: load.php URL, or None if the script could not be parsed
+    """
+    java = text.replace(" ", "").replace("'", "").replace("+", "")
+    try:
+        pattern = _PATTERN_RE.search(text).group(1)
+        result = re.search(pattern, url)
+        protocol = result.group(int(_PROTOCOL_INDEX_RE.search(java).group(1)))
+        ip = result.group(int(_IP_INDEX_RE.search(java).group(1)))
+        path = result.group(int(_PATH_INDEX_RE.search(java).group(1)))
+        portalPatern = _AJAX_LOADER_RE.search(java).group(1)
+        return (
+            portalPatern.replace("this.portal_protocol", protocol)
+            .replace("this.portal_ip", ip)
+            .replace("this.portal_path", path)
+        )
+    except Exception:
+        return None
+
+
+def _probePortalScript(url, proxies):
+    """
+    Fetches and parses a single xpcom.common.js candidate.
+
+    Returns:
+        str: load.php URL, or None if the candidate is not a valid portal script
+    """
+    headers = {"User-Agent": "Mozilla/5.0 (QtEmbedded; U; Linux; C)"}
+    response = requests.get(url, headers=headers, proxies=proxies, timeout=DISCOVERY_TIMEOUT)
+    if response.status_code == 200:
+        return _parsePortalScript(url, response.text)
+    return None
+
+
+def clearUrlCache(url=None):
+    """
+    Forgets resolved portal endpoints.
+
+    Args:
+        url (str, optional): Any URL of the portal to forget. Clears everything if None.
+    """
+    with _url_cache_lock:
+        if url is None:
+            _url_cache.clear()
+        else:
+            _url_cache.pop(urlparse(url).scheme + "://" + urlparse(url).netloc, None)
+
+
 def getUrl(url, proxy=None):
-    def parseResponse(url, data):
-        java = data.text.replace(" ", "").replace("'", "").replace("+", "")
-        try:
-            pattern = re.search(r"\s*var\s*pattern.*\/(\(http.*)\/;", data.text).group(1)
-            result = re.search(pattern, url)
-            protocolIndex = re.search(r"this\.portal_protocol.*(\d).*;", java).group(1)
-            ipIndex = re.search(r"this\.portal_ip.*(\d).*;", java).group(1)
-            pathIndex = re.search(r"this\.portal_path.*(\d).*;", java).group(1)
-            protocol = result.group(int(protocolIndex))
-            ip = result.group(int(ipIndex))
-            path = result.group(int(pathIndex))
-            portalPatern = re.search(r"this\.ajax_loader=(.*\.php);", java).group(1)
-            portal = (
-                portalPatern.replace("this.portal_protocol", protocol)
-                .replace("this.portal_ip", ip)
-                .replace("this.portal_path", path)
-            )
-            return portal
-        except:
-            # If parsing fails, check if we're already at a load.php URL
-            if url.endswith('load.php'):
-                return url
-            # Otherwise try to construct the load.php URL
-            base = urlparse(url).scheme + "://" + urlparse(url).netloc
-            return base + "/stalker_portal/server/load.php"
+    """
+    Discovers the load.php endpoint of a portal.
+
+    All xpcom.common.js candidates are probed concurrently (through the proxy and
+    directly) with short timeouts, and the first one that parses wins. Results are
+    cached per base URL so repeated adds/updates of the same portal skip discovery.
+
+    Args:
+        url (str): Portal URL as entered by the user
+        proxy (str, optional): Proxy URL. Defaults to None.
 
+    Returns:
+        str: load.php URL
+    """
     # If the URL already ends with load.php, return it directly
     if url.endswith('load.php'):
         return url
 
     base_url = urlparse(url).scheme + "://" + urlparse(url).netloc
-    urls = [
-        "/c/xpcom.common.js",
-        "/client/xpcom.common.js",
-        "/c_/xpcom.common.js",
-        "/stalker_portal/c/xpcom.common.js",
-        "/stalker_portal/c_/xpcom.common.js",
-    ]
-
-    proxies = {"http": proxy, "https": proxy} if proxy else None
-    headers = {"User-Agent": "Mozilla/5.0 (QtEmbedded; U; Linux; C)"}
-
-    # First try with proxy
+    fallback = base_url + "/stalker_portal/server/load.php"
+
+    with _url_cache_lock:
+        cached = _url_cache.get(base_url)
+        if cached and cached[1] > time.time():
+            logger.debug(f"Using cached portal endpoint for {base_url}: {cached[0]}")
+            return cached[0]
+
+    # Probe with the proxy first, then directly, all at the same time
+    attempts = []
+    if proxy:
+        attempts.extend((base_url + path, {"http": proxy, "https": proxy}) for path in XPCOM_PATHS)
+    attempts.extend((base_url + path, None) for path in XPCOM_PATHS)
+
+    result = None
+    executor = ThreadPoolExecutor(max_workers=len(attempts), thread_name_prefix="portal-discovery")
     try:
-        for i in urls:
-            try:
-                response = s.get(base_url + i, headers=headers, proxies=proxies)
-                if response and response.status_code == 200:
-                    result = parseResponse(base_url + i, response)
-                    if result:
-                        return result
-            except:
-                continue
-    except:
-        pass
-
-    # Try without proxy
-    try:
-        for i in urls:
-            try:
-                response = s.get(base_url + i, headers=headers)
-                if response and response.status_code == 200:
-                    result = parseResponse(base_url + i, response)
-                    if result:
-                        return result
-            except:
-                continue
-    except:
-        pass
+        futures = [executor.submit(_probePortalScript, candidate, proxies) for candidate, proxies in attempts]
+        try:
+            for future in as_completed(futures, timeout=DISCOVERY_DEADLINE):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.debug(f"Portal discovery probe failed: {e}")
+                    continue
+                if result:
+                    break
+        except FuturesTimeoutError:
+            logger.warning(f"Portal discovery for {base_url} timed out after {DISCOVERY_DEADLINE}s")
+    finally:
+        # Don't wait for blackholed probes, they expire on their own timeouts
+        executor.shutdown(wait=False)
+
+    with _url_cache_lock:
+        if result:
+            logger.info(f"Discovered portal endpoint for {base_url}: {result}")
+            _url_cache[base_url] = (result, time.time() + URL_CACHE_TTL)
+        else:
+            # If all else fails, use the default load.php location, but retry discovery soon
+            logger.warning(f"Could not discover portal endpoint for {base_url}, using {fallback}")
+            result = fallback
+            _url_cache[base_url] = (result, time.time() + URL_FALLBACK_TTL)
 
-    # If all else fails, try to construct the load.php URL
-    return base_url + "/stalker_portal/server/load.php"
+    return result
 
 
 def getToken(url, mac, proxy=None):
@@ -141,7 +1103,7 @@ def getToken(url, mac, proxy=None):
 
     try:
         logger.debug(f"Attempting to get token for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + "?type=stb&action=handshake&token=&JsHttpRequest=1-xml",
             cookies=cookies,
             headers=headers,
@@ -230,7 +1192,7 @@ def getProfile(url, mac, token, device_id, device_id2, signature, timestamp, pro
 
     try:
         logger.debug(f"Attempting to get profile for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + request_url,
             cookies=cookies,
             headers=headers,
@@ -294,7 +1256,7 @@ def getExpires(url, mac, token, proxy=None):
 
     try:
         logger.debug(f"Attempting to get account expiration for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + "?type=account_info&action=get_main_info&JsHttpRequest=1-xml",
             cookies=cookies,
             headers=headers,
@@ -366,7 +1328,7 @@ def getAllChannels(url, mac, token, proxy=None):
 
     try:
         logger.debug(f"Attempting to get all channels for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + "?type=itv&action=get_all_channels&force_ch_link_check=&JsHttpRequest=1-xml",
             cookies=cookies,
             headers=headers,
@@ -430,7 +1392,7 @@ def getGenres(url, mac, token, proxy=None):
 
     try:
         logger.debug(f"Attempting to get genres for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + "?action=get_genres&type=itv&JsHttpRequest=1-xml",
             cookies=cookies,
             headers=headers,
@@ -542,7 +1504,7 @@ def getLink(url, mac, token, cmd, proxy=None):
 
     try:
         logger.debug(f"Attempting to create stream link for channel {cmd} for MAC: {mac}")
-        response = s.get(
+        response = _get(
             url + "?type=itv&action=create_link&cmd=" + cmd + "&series=0&forced_storage=0&disable_ad=0&download=0&force_ch_link_check=0&JsHttpRequest=1-xml",
             cookies=cookies,
             headers=headers,
@@ -594,7 +1556,7 @@ def getEpg(url, mac, token, period, proxy=None):
         "Authorization": "Bearer " + token,
     }
     try:
-        response = s.get(
+        response = _get(
             url
             + "?type=itv&action=get_epg_info&period="
             + str(period)
@@ -610,6 +1572,97 @@ def getEpg(url, mac, token, period, proxy=None):
         pass
 
 
+IMAGE_TIMEOUT = (5, 15)
+IMAGE_MAX_BYTES = 10 * 1024 * 1024  # Larger responses are not images worth caching
+
+
+def getImage(url, proxy=None):
+    """
+    Downloads a poster or logo image. Goes through the host's scheduler like any
+    other portal request, so image traffic respects the portal's request budget.
+
+    Args:
+        url (str): Image URL
+        proxy (str, optional): Proxy to use
+
+    Returns:
+        tuple: (content bytes, content type), or None if the download failed
+    """
+    proxies = {"http": proxy, "https": proxy}
+    headers = {"User-Agent": "Mozilla/5.0 (QtEmbedded; U; Linux; C)"}
+    try:
+        response = _get(url, headers=headers, proxies=proxies, timeout=IMAGE_TIMEOUT, stream=True)
+        with response:
+            content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+            if response.status_code != 200 or not content_type.startswith("image/"):
+                logger.debug(f"Image {url} returned {response.status_code} ({content_type})")
+                return None
+            content = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                content.extend(chunk)
+                if len(content) > IMAGE_MAX_BYTES:
+                    logger.warning(f"Image {url} is larger than {IMAGE_MAX_BYTES} bytes, not cached")
+                    return None
+            return bytes(content), content_type
+    except requests.RequestException as e:
+        logger.debug(f"Error downloading image {url}: {e}")
+        return None
+
+LINK_PROBE_TIMEOUT = (3, 5)
+
+
+def probeLink(url, proxy=None):
+    """
+    Checks whether a resolved stream link still plays with a HEAD request, which
+    doesn't start a playback session on the stream host. Stream hosts are not portal
+    API endpoints, so this bypasses the portal schedulers.
+
+    Args:
+        url (str): Stream URL
+        proxy (str, optional): Proxy to use
+
+    Returns:
+        bool: True if the link works, False if the host rejected it, or None if
+        the host could not be reached (which says nothing about the link).
+    """
+    proxies = {"http": proxy, "https": proxy}
+    headers = {"User-Agent": "Mozilla/5.0 (QtEmbedded; U; Linux; C)"}
+    try:
+        with s.head(url, headers=headers, proxies=proxies, timeout=LINK_PROBE_TIMEOUT) as response:
+            if response.status_code < 400:
+                return True
+            if response.status_code in (401, 403, 404, 410):
+                return False
+            return None # E.g. 405 from hosts that don't support HEAD
+    except requests.RequestException as e:
+        logger.debug(f"Error probing link {url}: {e}")
+        return None
+
+STREAM_TIMEOUT = (5, 30)
+
+
+def openStream(url, range_header=None, proxy=None):
+    """
+    Opens a VOD stream for proxying, forwarding the client's Range header. Like
+    probeLink, this talks to the stream host and bypasses the portal schedulers.
+
+    Args:
+        url (str): Stream URL
+        range_header (str, optional): Value of the client's Range header
+        proxy (str, optional): Proxy to use
+
+    Returns:
+        requests.Response: Streaming response, to be closed by the caller
+
+    Raises:
+        requests.RequestException: If the stream host could not be reached
+    """
+    proxies = {"http": proxy, "https": proxy}
+    headers = {"User-Agent": "Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3"}
+    if range_header:
+        headers["Range"] = range_header
+    return s.get(url, headers=headers, proxies=proxies, timeout=STREAM_TIMEOUT, stream=True)
+
 def getVodCategories(url, mac, token, proxy=None):
     """
     Fetches VOD categories from the portal API.
@@ -644,7 +1697,7 @@ def getVodCategories(url, mac, token, proxy=None):
         for api_url in api_urls:
             try:
                 logger.debug(f"Trying VOD categories URL: {api_url}")
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,
@@ -730,7 +1783,7 @@ def getSeriesCategories(url, mac, token, proxy=None):
         for api_url in api_urls:
             try:
                 logger.debug(f"Trying Series categories URL: {api_url}")
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,
@@ -870,7 +1923,7 @@ def getOrderedList(url, mac, token, proxy=None, content_type=None, category_id=N
             logger.debug(f"Trying API URL: {api_url}")
 
             try:
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,
@@ -1095,7 +2148,7 @@ def getSeriesSeasons(url, mac, token, proxy=None, series_id=None):
             logger.debug(f"Trying API URL for seasons: {api_url}")
 
             try:
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,
@@ -1425,7 +2478,7 @@ def getSeasonEpisodes(url, mac, token, proxy=None, series_id=None, season_id=Non
             logger.debug(f"Trying API URL for episodes: {api_url}")
 
             try:
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,
@@ -1714,7 +2767,7 @@ def getVodSeriesLink(url, mac, token, item_id, content_type, series_info=None, p
             logger.debug(f"Trying API URL for stream link: {api_url}")
 
             try:
-                response = s.get(
+                response = _get(
                     api_url,
                     cookies=cookies,
                     headers=headers,